@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+# Sessions averaged for "avg5" and compared against the five before them
+ROLLING_WINDOW = 5
+# Latest sessions the per-session trend slope is fitted over
+TREND_WINDOW = 10
+# Row keys remembered per user for rows the watermark cannot decide (same completed_at, or none)
+KNOWN_ROWS_LIMIT = 256
+
+
+def _timestamp(value: Any) -> float:
+    """Epoch seconds from an ISO string (Supabase `completed_at`) or a number; NaN if unusable"""
+    if isinstance(value, (int, float)):
+        # Milliseconds (JS Date.now()) vs seconds
+        return float(value) / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return float("nan")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return float("nan")
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _row_key(row: Dict[str, Any]) -> str:
+    if row.get("id") is not None:
+        return str(row["id"])
+    return f"{row.get('activity_type')}|{row.get('completed_at')}|{row.get('score')}"
+
+
+def _rounded(value: Optional[float], digits: int = 1) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+class _GameHistory:
+    """Newest `capacity` sessions of one game, oldest first, as parallel float arrays"""
+
+    __slots__ = ("times", "scores", "accuracy", "sessions")
+
+    def __init__(self):
+        self.times = np.zeros(0)
+        self.scores = np.zeros(0)
+        self.accuracy = np.zeros(0)
+        self.sessions = 0
+
+    def extend(self, times: np.ndarray, scores: np.ndarray, accuracy: np.ndarray, capacity: int) -> None:
+        merged_times = np.concatenate([self.times, times])
+        merged_scores = np.concatenate([self.scores, scores])
+        merged_accuracy = np.concatenate([self.accuracy, accuracy])
+        if len(self.times) and np.nanmin(times, initial=np.inf) < np.nanmax(self.times, initial=-np.inf):
+            # Older rows arrived late (the client widened its window): restore time order
+            order = np.argsort(merged_times, kind="stable")
+            merged_times, merged_scores, merged_accuracy = merged_times[order], merged_scores[order], merged_accuracy[order]
+        self.times, self.scores, self.accuracy = merged_times[-capacity:], merged_scores[-capacity:], merged_accuracy[-capacity:]
+        self.sessions += len(times)
+
+
+class _UserHistory:
+    __slots__ = ("games", "days", "watermark", "known", "patterns", "summary_day", "touched")
+
+    def __init__(self):
+        self.games: Dict[str, _GameHistory] = {}
+        # Distinct UTC day numbers with any activity, ascending
+        self.days = np.zeros(0, dtype=np.int64)
+        # Newest completed_at ingested; anything older has been seen (or fell out of the client's window)
+        self.watermark = float("-inf")
+        self.known: "OrderedDict[str, None]" = OrderedDict()
+        self.patterns: Optional[Dict[str, Any]] = None
+        self.summary_day = -1
+        self.touched = time.monotonic()
+
+
+class ActivityAnalytics:
+    """Per-user game statistics: rolling means, trends, streaks and per-game z-scores.
+
+    The client sends the user's few newest activity rows with every turn. Only
+    rows newer than the user's watermark (the newest completed_at ingested)
+    are appended to bounded per-game NumPy arrays, so the history accumulates
+    here across turns rather than being resent. The summary is recomputed
+    (vectorized over those arrays) only when rows were added or the day
+    changed; an unchanged history costs one timestamp comparison.
+    """
+
+    def __init__(self, max_users: int = 2048, history_per_game: int = 128, ttl_seconds: float = 86400, max_days: int = 366):
+        self.max_users = max_users
+        self.history_per_game = history_per_game
+        self.ttl_seconds = ttl_seconds
+        self.max_days = max_days
+        self._users: "OrderedDict[str, _UserHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "recomputes": 0, "rows_ingested": 0, "evictions": 0, "expirations": 0}
+
+    def patterns(self, user_id: Optional[str], activities: List[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+        """Summary for the user's history after merging `activities` (newest first, as the client sends them)"""
+        if not activities:
+            return {}
+        now = time.time() if now is None else now
+        if not user_id:
+            # No stable identity to cache under: summarize just what was sent
+            history = _UserHistory()
+            self._ingest(history, activities)
+            return self._summarize(history, now)
+
+        today = int(now // SECONDS_PER_DAY)
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is not None and time.monotonic() - history.touched > self.ttl_seconds:
+                del self._users[user_id]
+                self._stats["expirations"] += 1
+                history = None
+            if history is None:
+                history = self._users[user_id] = _UserHistory()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                    self._stats["evictions"] += 1
+            else:
+                self._users.move_to_end(user_id)
+            history.touched = time.monotonic()
+            added = self._ingest(history, activities)
+            if added or history.patterns is None or history.summary_day != today:
+                history.patterns = self._summarize(history, now)
+                history.summary_day = today
+                self._stats["recomputes"] += 1
+            else:
+                self._stats["hits"] += 1
+            return history.patterns
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "users": len(self._users), "history_per_game": self.history_per_game}
+
+    def _ingest(self, history: _UserHistory, activities: List[Dict[str, Any]]) -> int:
+        fresh = []
+        for row in activities:
+            if not isinstance(row, dict):
+                continue
+            if _timestamp(row.get("completed_at")) < history.watermark:
+                # Newest first, so every remaining row is older still
+                break
+            key = _row_key(row)
+            if key in history.known:
+                continue
+            history.known[key] = None
+            fresh.append(row)
+        if not fresh:
+            return 0
+        while len(history.known) > KNOWN_ROWS_LIMIT:
+            history.known.popitem(last=False)
+
+        # Newest-first input: reverse so each game's arrays stay oldest first
+        by_game: Dict[str, List[Dict[str, Any]]] = {}
+        for row in reversed(fresh):
+            by_game.setdefault(str(row.get("activity_type") or "unknown"), []).append(row)
+        for name, rows in by_game.items():
+            times = np.array([_timestamp(row.get("completed_at")) for row in rows])
+            history.watermark = max(history.watermark, np.nanmax(times, initial=-np.inf))
+            scores = np.array([_number(row.get("score")) for row in rows])
+            accuracy = np.array([_number(row.get("accuracy_percentage")) for row in rows])
+            history.games.setdefault(name, _GameHistory()).extend(times, scores, accuracy, self.history_per_game)
+            days = times[~np.isnan(times)] // SECONDS_PER_DAY
+            history.days = np.union1d(history.days, days.astype(np.int64))[-self.max_days:]
+        self._stats["rows_ingested"] += len(fresh)
+        return len(fresh)
+
+    def _summarize(self, history: _UserHistory, now: float) -> Dict[str, Any]:
+        today = int(now // SECONDS_PER_DAY)
+        games: Dict[str, Dict[str, Any]] = {}
+        for name, game in history.games.items():
+            games[name] = self._game_summary(game, now)
+
+        all_times = np.concatenate([game.times for game in history.games.values()]) if history.games else np.zeros(0)
+        all_times = all_times[~np.isnan(all_times)]
+        week_ago = now - 7 * SECONDS_PER_DAY
+        current_streak, best_streak = self._streaks(history.days, today)
+        patterns = {
+            "total_sessions": sum(game.sessions for game in history.games.values()),
+            "sessions_7d": int(np.count_nonzero(all_times >= week_ago)),
+            "sessions_prev_7d": int(np.count_nonzero((all_times < week_ago) & (all_times >= week_ago - 7 * SECONDS_PER_DAY))),
+            "streak_days": current_streak,
+            "best_streak_days": best_streak,
+            "days_since_last": int(today - history.days[-1]) if len(history.days) else None,
+            # Most recently played first
+            "games": dict(sorted(games.items(), key=lambda item: item[1]["days_since_last"] if item[1]["days_since_last"] is not None else 1e9))
+        }
+        patterns["summary_lines"] = self._lines(patterns)
+        return patterns
+
+    def _game_summary(self, game: _GameHistory, now: float) -> Dict[str, Any]:
+        scores = game.scores[~np.isnan(game.scores)]
+        summary: Dict[str, Any] = {"sessions": game.sessions}
+        if len(scores):
+            prior = scores[:-1]
+            spread = prior.std() if len(prior) >= 3 else 0.0
+            recent = scores[-ROLLING_WINDOW:]
+            before = scores[-2 * ROLLING_WINDOW:-ROLLING_WINDOW]
+            tail = scores[-TREND_WINDOW:]
+            slope = None
+            if len(tail) >= 3:
+                x = np.arange(len(tail)) - (len(tail) - 1) / 2
+                slope = float(x @ (tail - tail.mean()) / (x @ x))
+            summary.update({
+                "last_score": _rounded(scores[-1]),
+                # Last session against this user's own earlier sessions of the same game
+                "last_z": _rounded((scores[-1] - prior.mean()) / spread, 2) if spread > 0 else None,
+                "rolling_mean": _rounded(recent.mean()),
+                "rolling_delta": _rounded(recent.mean() - before.mean()) if len(before) else None,
+                "trend_per_session": _rounded(slope, 2)
+            })
+        accuracy = game.accuracy[-ROLLING_WINDOW:]
+        accuracy = accuracy[~np.isnan(accuracy)]
+        summary["accuracy_recent"] = _rounded(accuracy.mean()) if len(accuracy) else None
+        times = game.times[~np.isnan(game.times)]
+        summary["days_since_last"] = int(now // SECONDS_PER_DAY - times.max() // SECONDS_PER_DAY) if len(times) else None
+        return summary
+
+    def _streaks(self, days: np.ndarray, today: int) -> Tuple[int, int]:
+        """(current streak ending today or yesterday, longest streak) in consecutive active days"""
+        if not len(days):
+            return 0, 0
+        breaks = np.flatnonzero(np.diff(days) != 1)
+        lengths = np.diff(np.concatenate([[-1], breaks, [len(days) - 1]]))
+        current = int(lengths[-1]) if days[-1] >= today - 1 else 0
+        return current, int(lengths.max())
+
+    def _lines(self, patterns: Dict[str, Any]) -> List[str]:
+        """Dense prompt lines, overall first; the context planner drops trailing games when over budget"""
+        overview = [f"{patterns['sessions_7d']} sessions in 7d (prev 7d: {patterns['sessions_prev_7d']})"]
+        if patterns["streak_days"]:
+            overview.append(f"streak {patterns['streak_days']}d (best {patterns['best_streak_days']}d)")
+        elif patterns["days_since_last"] is not None:
+            overview.append(f"last active {patterns['days_since_last']}d ago")
+        lines = ["games: " + ", ".join(overview)]
+        for name, game in patterns["games"].items():
+            parts = []
+            if game.get("last_score") is not None:
+                last = f"last {game['last_score']:g}"
+                if game["last_z"] is not None:
+                    last += f" (z {game['last_z']:+.1f})"
+                parts.append(last)
+                avg = f"avg{ROLLING_WINDOW} {game['rolling_mean']:g}"
+                if game["rolling_delta"] is not None:
+                    avg += f" ({game['rolling_delta']:+g} vs prior)"
+                parts.append(avg)
+                if game["trend_per_session"] is not None:
+                    parts.append(f"trend {game['trend_per_session']:+g}/session")
+            if game["accuracy_recent"] is not None:
+                parts.append(f"acc {game['accuracy_recent']:g}%")
+            parts.append(f"{game['sessions']} play" + ("s" if game["sessions"] != 1 else ""))
+            if game["days_since_last"] is not None:
+                parts.append("today" if game["days_since_last"] == 0 else f"{game['days_since_last']}d ago")
+            lines.append(f"{name.replace('_', ' ')}: " + ", ".join(parts))
+        return lines
@@ -0,0 +1,211 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Turn priorities (lower is served first)
+PRIORITY_URGENT = 0
+PRIORITY_ELEVATED = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+PRIORITY_NAMES = {PRIORITY_URGENT: "urgent", PRIORITY_ELEVATED: "elevated", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+_INTERVENTION_PRIORITIES = {"immediate": PRIORITY_URGENT, "supportive": PRIORITY_NORMAL, "long-term": PRIORITY_LOW}
+_HIGH_STRESS_LEVELS = {"high", "very high", "severe", "critical"}
+# Local risk triage of the current message (risk_triage.py) sets a floor on the priority
+_RISK_PRIORITIES = {"critical": PRIORITY_URGENT, "high": PRIORITY_URGENT, "elevated": PRIORITY_ELEVATED}
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def turn_priority(
+    previous_analysis: Optional[Dict[str, Any]],
+    voice_analysis: Optional[Dict[str, Any]],
+    risk_level: Optional[str] = None
+) -> int:
+    """Priority from the session's last intervention_priority, raised one level for high voice stress
+    and to at least the current message's risk triage level"""
+    priority = PRIORITY_NORMAL
+    if previous_analysis:
+        level = str(previous_analysis.get("intervention_priority", "")).strip().lower()
+        priority = next((p for name, p in _INTERVENTION_PRIORITIES.items() if name in level), PRIORITY_NORMAL)
+    stress = str((voice_analysis or {}).get("stress_level", "")).strip().lower()
+    if stress in _HIGH_STRESS_LEVELS:
+        priority = max(priority - 1, PRIORITY_URGENT)
+    return min(priority, _RISK_PRIORITIES.get(risk_level or "", PRIORITY_LOW))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn is shed; callers should answer 503 with Retry-After"""
+
+    def __init__(self, reason: str, retry_after: float = 2.0):
+        super().__init__(f"Chat turn rejected ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded in-flight limit with a priority queue in front of the workflow.
+
+    Waiting turns are ordered by (priority, the user's turns already in flight or
+    queued, arrival), so urgent users go first and one chatty user cannot crowd
+    out everyone else at the same priority. Overload is handled in steps: turns
+    that start while ``degrade_queue_depth`` or more are still waiting run in
+    degraded mode (no Agent 1 call) unless they are urgent/elevated; a full queue
+    evicts its lowest-priority waiter for a more urgent arrival, or rejects;
+    turns waiting longer than ``queue_timeout_seconds`` are rejected.
+
+    Thread-safe, so it also works for the sync wrappers that run their own loop.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 256,
+        degrade_queue_depth: int = 16,
+        queue_timeout_seconds: float = 20.0
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.degrade_queue_depth = degrade_queue_depth
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._lock = threading.Lock()
+        self._queue = []  # heap of [priority, user_load, seq, waiter]
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._per_user: Dict[str, int] = {}
+        self._counters = {"admitted": 0, "queued": 0, "degraded": 0, "rejected_queue_full": 0,
+                          "rejected_timeout": 0, "evicted": 0}
+        self._queue_wait = {name: deque(maxlen=512) for name in PRIORITY_NAMES.values()}
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, priority: int) -> AsyncIterator[Dict[str, Any]]:
+        """Wait for a slot; yields the ticket {"priority", "queue_wait_ms", "degraded"}"""
+        enqueued_at = time.perf_counter()
+        waiter = None
+        with self._lock:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            if self._in_flight < self.max_in_flight and not self._queue:
+                self._in_flight += 1
+                degraded = False
+            else:
+                waiter = self._enqueue(user_id, priority)
+                # Slots may be free with only withdrawn waiters left in the heap
+                self._grant_next()
+
+        if waiter is not None:
+            try:
+                degraded = await asyncio.wait_for(asyncio.shield(waiter["future"]), self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter, timed_out=True):
+                    raise AdmissionRejected("queue_timeout")
+                degraded = waiter["degraded"]
+            except asyncio.CancelledError:
+                # Client went away while queued: give back the slot if it was granted meanwhile
+                if self._abandon(waiter, timed_out=False):
+                    with self._lock:
+                        self._in_flight -= 1
+                        self._leave(user_id)
+                        self._grant_next()
+                raise
+
+        queue_wait_ms = round((time.perf_counter() - enqueued_at) * 1000, 1)
+        with self._lock:
+            self._counters["admitted"] += 1
+            self._counters["degraded"] += degraded
+            self._queue_wait[PRIORITY_NAMES[priority]].append(queue_wait_ms)
+        try:
+            yield {"priority": PRIORITY_NAMES[priority], "queue_wait_ms": queue_wait_ms, "degraded": degraded}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._leave(user_id)
+                self._grant_next()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": sum(1 for entry in self._queue if not entry[3]["cancelled"]),
+                **self._counters,
+                "queue_wait_ms": {
+                    name: {"p50": _percentile(samples, 0.5), "p95": _percentile(samples, 0.95), "count": len(samples)}
+                    for name, samples in self._queue_wait.items()
+                }
+            }
+
+    def _abandon(self, waiter: Dict[str, Any], timed_out: bool) -> bool:
+        """Withdraw a waiter; returns True if it had already been granted a slot"""
+        with self._lock:
+            if waiter["granted"]:
+                return True
+            waiter["cancelled"] = True
+            self._leave(waiter["user_id"])
+            if timed_out:
+                self._counters["rejected_timeout"] += 1
+            return False
+
+    def _enqueue(self, user_id: str, priority: int) -> Dict[str, Any]:
+        """Queue a waiter, shedding the least important one if full (caller holds lock)"""
+        live = [entry for entry in self._queue if not entry[3]["cancelled"]]
+        key = [priority, self._per_user[user_id] - 1, next(self._seq)]
+        if len(live) >= self.max_queue:
+            worst = max(live, key=lambda entry: entry[:3])
+            if worst[:3] <= key:
+                self._leave(user_id)
+                self._counters["rejected_queue_full"] += 1
+                raise AdmissionRejected("queue_full")
+            worst[3]["cancelled"] = True
+            self._leave(worst[3]["user_id"])
+            self._counters["evicted"] += 1
+            self._resolve(worst[3], AdmissionRejected("evicted"))
+        loop = asyncio.get_running_loop()
+        waiter = {"user_id": user_id, "priority": priority, "loop": loop, "future": loop.create_future(),
+                  "cancelled": False, "granted": False, "degraded": False}
+        heapq.heappush(self._queue, key + [waiter])
+        self._counters["queued"] += 1
+        return waiter
+
+    def _grant_next(self) -> None:
+        """Hand free slots to the best waiting turns (caller holds lock)"""
+        while self._in_flight < self.max_in_flight and self._queue:
+            waiter = heapq.heappop(self._queue)[3]
+            if waiter["cancelled"]:
+                continue
+            self._in_flight += 1
+            waiting = sum(1 for entry in self._queue if not entry[3]["cancelled"])
+            waiter["granted"] = True
+            waiter["degraded"] = waiting >= self.degrade_queue_depth and waiter["priority"] >= PRIORITY_NORMAL
+            self._resolve(waiter, waiter["degraded"])
+
+    def _leave(self, user_id: str) -> None:
+        remaining = self._per_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+
+    @staticmethod
+    def _resolve(waiter: Dict[str, Any], outcome: Any) -> None:
+        future = waiter["future"]
+
+        def settle():
+            if future.done():
+                return
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+        waiter["loop"].call_soon_threadsafe(settle)
@@ -0,0 +1,157 @@
+import copy
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+_APOSTROPHES = re.compile(r"['\u2019]")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_REPEATS = re.compile(r"(.)\1{2,}")
+
+# Approximate hits must agree on these, so "stressed" never matches "not stressed"
+NEGATION_WORDS = {"not", "no", "never", "nothing", "dont", "cant", "wont", "isnt", "nahi", "nahin", "na", "mat"}
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop apostrophes/punctuation, squeeze elongations ("sooo" -> "soo") and whitespace"""
+    text = _PUNCTUATION.sub(" ", _APOSTROPHES.sub("", message.lower()))
+    text = _REPEATS.sub(r"\1\1", text)
+    return " ".join(text.split())
+
+
+def context_fingerprint(*context_parts: str) -> str:
+    """Stable short hash of the exact context strings the analyst prompt was built from"""
+    digest = hashlib.sha1("\x1f".join(context_parts).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def hashed_ngram_vector(text: str, dims: int, ngram: int = 3) -> np.ndarray:
+    """L2-normalised bag of hashed character n-grams + words (crc32, so stable across processes)"""
+    padded = f" {text} "
+    features = [padded[i:i + ngram] for i in range(max(len(padded) - ngram + 1, 1))]
+    features.extend(text.split())
+    indices = np.fromiter((zlib.crc32(f.encode("utf-8")) % dims for f in features), dtype=np.int64, count=len(features))
+    vector = np.bincount(indices, minlength=dims).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnalysisCache:
+    """Exact + approximate-nearest-neighbour cache of PsychologicalAnalysis results.
+
+    Entries are keyed by (context fingerprint, normalised message). Approximate
+    lookups only compare messages that share the same context fingerprint, so a
+    cached analysis is never reused under different conversation context.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.9,
+        dims: int = 512
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.dims = dims
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "approximate_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def lookup(self, message: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Return {"analysis", "match", "similarity"} on a hit, None on a miss"""
+        normalized = normalize_message(message)
+        key = f"{fingerprint}:{normalized}"
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry["stored_at"] > self.ttl_seconds:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                self._stats["exact_hits"] += 1
+                return {"analysis": copy.deepcopy(entry["analysis"]), "match": "exact", "similarity": 1.0}
+
+            best_key, similarity = self._nearest(fingerprint, normalized, now)
+            if best_key is not None and similarity >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self._stats["approximate_hits"] += 1
+                analysis = self._entries[best_key]["analysis"]
+                return {"analysis": copy.deepcopy(analysis), "match": "approximate", "similarity": round(similarity, 4)}
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, message: str, fingerprint: str, analysis: Dict[str, Any]) -> None:
+        normalized = normalize_message(message)
+        key = f"{fingerprint}:{normalized}"
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "analysis": copy.deepcopy(analysis),
+                "fingerprint": fingerprint,
+                "vector": hashed_ngram_vector(normalized, self.dims),
+                "negations": NEGATION_WORDS.intersection(normalized.split()),
+                "stored_at": time.monotonic()
+            }
+            bucket = self._buckets.setdefault(fingerprint, {"keys": [], "matrix": None})
+            bucket["keys"].append(key)
+            bucket["matrix"] = None
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["exact_hits"] + self._stats["approximate_hits"] + self._stats["misses"]
+            hits = self._stats["exact_hits"] + self._stats["approximate_hits"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold
+            }
+
+    def _nearest(self, fingerprint: str, normalized: str, now: float):
+        bucket = self._buckets.get(fingerprint)
+        if not bucket or not bucket["keys"]:
+            return None, 0.0
+        if bucket["matrix"] is None:
+            bucket["matrix"] = np.stack([self._entries[k]["vector"] for k in bucket["keys"]])
+
+        scores = bucket["matrix"] @ hashed_ngram_vector(normalized, self.dims)
+        negations = NEGATION_WORDS.intersection(normalized.split())
+        # Walk candidates best-first; skip expired entries and negation mismatches
+        for index in np.argsort(scores)[::-1][:8]:
+            score = float(scores[index])
+            if score < self.similarity_threshold:
+                break
+            key = bucket["keys"][index]
+            entry = self._entries[key]
+            if now - entry["stored_at"] > self.ttl_seconds or entry["negations"] != negations:
+                continue
+            return key, score
+        return None, 0.0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(entry["fingerprint"])
+        if bucket:
+            bucket["keys"].remove(key)
+            bucket["matrix"] = None
+            if not bucket["keys"]:
+                del self._buckets[entry["fingerprint"]]
@@ -0,0 +1,672 @@
+"""Offline load-generation and replay benchmark for the MindMate chat service.
+
+Drives whole conversations through the workflow, either in-process
+(``aprocess_user_chat`` / ``astream_user_chat``) or over HTTP against the
+FastAPI app (in-process ASGI transport by default, or a running server with
+``--url``), and reports end-to-end and per-node latency percentiles,
+throughput, cache growth and background-thread counts as JSON.
+
+Runs fully offline: unless ``--backend gemini`` is given, the model is the
+deterministic fake backend (``MINDMATE_LLM_BACKEND=fake``) with the latency
+model from ``--latency``.
+
+Examples:
+    python benchmark.py --sessions 20 --turns 6 --concurrency 8
+    python benchmark.py --workload conversations.jsonl --target http --rate 10 --output run.json
+    python benchmark.py --sessions 50 --latency lognormal:800:0.5 --compare baseline.json --max-regression 10
+    python benchmark.py --triage --output triage.json
+
+``--triage`` skips the conversations and times the local risk triage alone
+(risk_triage.py) on messages from ~100 to ~100k characters.
+
+Workload JSONL: one user turn per line, grouped into sessions by
+``session_id`` in file order. ``user_message`` (or ``content`` on a
+``role: user`` line, so exported message logs replay as-is) is required;
+``user_id``, ``voice_analysis``, ``user_activities``, ``conversation_summary``,
+``workflow_mode`` and ``think_time_ms`` are optional. Assistant lines are
+skipped: history is rebuilt from the replies the benchmark actually gets.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Client-side history window, like the web app sends
+HISTORY_WINDOW = 20
+THREAD_SAMPLE_INTERVAL_SECONDS = 0.1
+SUMMARIZATION_DRAIN_TIMEOUT_SECONDS = 30
+
+_SHORT_TURNS = ["hi", "ok", "thanks yaar", "hmm", "okay", "haan", "thank you", "cool", "bye", "hello"]
+_OPENERS = [
+    "I have my boards in two weeks and I can't focus at all",
+    "My parents keep comparing me with my cousin who got into IIT",
+    "I feel really lonely in my hostel, nobody talks to me",
+    "Yaar kuch samajh nahi aa raha, placement ka pressure bahut hai",
+    "I couldn't sleep again last night, my mind just keeps racing",
+    "Everyone on instagram seems so happy and I feel left behind",
+    "I had a big fight with my best friend and now I feel empty",
+    "Papa wants me to do engineering but I want to study design"
+]
+_FOLLOW_UPS = [
+    "I tried that but it didn't really help",
+    "Maybe, but I don't know where to even start",
+    "Honestly I just feel tired of everything",
+    "That actually makes sense, I'll try the breathing thing",
+    "Mummy says I am overthinking but it feels real to me",
+    "I studied for 3 hours today but still feel behind",
+    "What if I fail and disappoint everyone?",
+    "Sometimes I feel like nobody would notice if I disappeared"
+]
+_VOICE_TONES = [("calm", "low", "normal"), ("anxious", "high", "fast"), ("sad", "moderate", "slow"),
+                ("frustrated", "high", "fast")]
+_ACTIVITY_TYPES = ["memory_game", "breathing_exercise", "journaling", "mood_checkin"]
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _distribution(samples: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 2) if samples else None,
+        "p50": _percentile(samples, 0.5),
+        "p95": _percentile(samples, 0.95),
+        "p99": _percentile(samples, 0.99),
+        "max": max(samples) if samples else None
+    }
+
+
+def load_workload(path: str, max_turns: int = 0) -> List[Dict[str, Any]]:
+    """Group a JSONL replay file into sessions: [{"session_id", "user_id", "turns": [...]}]"""
+    sessions: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            turn = json.loads(line)
+            if turn.get("role", "user") != "user":
+                continue
+            message = turn.get("user_message") or turn.get("content")
+            if not message:
+                raise ValueError(f"{path}:{line_number}: turn has no user_message")
+            session_id = str(turn.get("session_id") or turn.get("user_id") or "replay")
+            session = sessions.setdefault(session_id, {
+                "session_id": session_id,
+                "user_id": str(turn.get("user_id") or session_id),
+                "turns": []
+            })
+            if not max_turns or len(session["turns"]) < max_turns:
+                session["turns"].append({**turn, "user_message": message})
+    return list(sessions.values())
+
+
+def synthetic_workload(sessions: int, turns: int, seed: int = 0, voice_share: float = 0.3) -> List[Dict[str, Any]]:
+    """Seeded mix of distress openers, follow-ups and short acknowledgements (fast-path turns)"""
+    rng = random.Random(seed)
+    workload = []
+    for i in range(sessions):
+        session_turns = []
+        for t in range(turns):
+            if t == 0:
+                message = rng.choice(_OPENERS)
+            elif rng.random() < 0.25:
+                message = rng.choice(_SHORT_TURNS)
+            else:
+                message = rng.choice(_FOLLOW_UPS)
+            turn: Dict[str, Any] = {"user_message": message}
+            if rng.random() < voice_share:
+                tone, stress, pace = rng.choice(_VOICE_TONES)
+                turn["voice_analysis"] = {"emotional_tone": tone, "stress_level": stress, "speech_pace": pace,
+                                          "confidence_score": round(rng.uniform(0.6, 0.95), 2)}
+            if t == 0:
+                turn["user_activities"] = [
+                    {"activity_type": rng.choice(_ACTIVITY_TYPES), "score": rng.randint(40, 100),
+                     "accuracy_percentage": rng.randint(50, 100)}
+                    for _ in range(rng.randint(0, 3))
+                ]
+            session_turns.append(turn)
+        workload.append({"session_id": f"bench-session-{i}", "user_id": f"bench-user-{i}", "turns": session_turns})
+    return workload
+
+
+def save_workload(workload: List[Dict[str, Any]], path: str) -> None:
+    """Write sessions back out as turn-per-line JSONL, replayable with --workload"""
+    with open(path, "w", encoding="utf-8") as f:
+        for session in workload:
+            for turn in session["turns"]:
+                line = {"session_id": session["session_id"], "user_id": session["user_id"], **turn}
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def _thread_group(name: str) -> str:
+    """Collapse pool thread names (summarizer_0, batch-analyst_3, ...) into one group"""
+    return re.sub(r"[-_ ]?\d+(?:\s*\(.*\))?$", "", name) or name
+
+
+def _thread_snapshot() -> Dict[str, Any]:
+    names = [thread.name for thread in threading.enumerate()]
+    return {"count": len(names), "groups": dict(sorted(Counter(_thread_group(name) for name in names).items()))}
+
+
+def _max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _cache_growth(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    growth = {}
+    for name, stats in after.items():
+        if not isinstance(stats, dict) or "entries" not in stats:
+            continue
+        start = before.get(name) or {}
+        growth[name] = {
+            "entries": stats["entries"] - start.get("entries", 0),
+            "bytes": stats.get("bytes", 0) - start.get("bytes", 0) if "bytes" in stats else None,
+            "evictions": stats.get("evictions", 0) - start.get("evictions", 0)
+        }
+    return growth
+
+
+def _logging_overhead(before: Dict[str, Any], after: Dict[str, Any], turns: int) -> Optional[Dict[str, Any]]:
+    """Logging cost of the run per turn: time on the request path and CPU on the handler thread"""
+    if not after or not turns:
+        return None
+    before = before or {}
+
+    def events(outcome: str, stats: Dict[str, Any]) -> float:
+        return sum((stats.get("events") or {}).get(outcome, {}).values())
+
+    return {
+        "queued": after.get("queued"),
+        "sample_rate": after.get("sample_rate"),
+        "events_per_turn": round((events("emitted", after) - events("emitted", before)) / turns, 2),
+        "dropped": events("dropped", after) - events("dropped", before),
+        "call_us_per_turn": round((after["call_seconds"] - before.get("call_seconds", 0)) * 1e6 / turns, 1),
+        "handler_cpu_us_per_turn": round((after["handler_cpu_seconds"] - before.get("handler_cpu_seconds", 0)) * 1e6 / turns, 1)
+    }
+
+
+class BenchmarkRunner:
+    """Runs sessions as virtual users: turns within a session are sequential, sessions run concurrently.
+
+    ``concurrency`` bounds the number of active sessions; ``rate`` (turns per
+    second across all sessions, 0 = unlimited) paces turn starts so a run can be
+    closed-loop or fixed-arrival.
+    """
+
+    def __init__(
+        self,
+        target: str = "inprocess",
+        concurrency: int = 8,
+        rate: float = 0.0,
+        stream: bool = False,
+        workflow_mode: Optional[str] = None,
+        url: Optional[str] = None,
+        think_time_ms: float = 0.0
+    ):
+        self.target = target
+        self.concurrency = concurrency
+        self.rate = rate
+        self.stream = stream
+        self.workflow_mode = workflow_mode
+        self.url = url
+        self.think_time = think_time_ms / 1000
+        self.turns: List[Dict[str, Any]] = []
+        self._next_start = 0.0
+        self._pace_lock = asyncio.Lock()
+        self._client = None
+        self._threads_peak = {"count": 0, "groups": {}}
+
+    async def run(self, workload: List[Dict[str, Any]]) -> Dict[str, Any]:
+        import httpx
+
+        if self.target == "http":
+            if self.url:
+                self._client = httpx.AsyncClient(base_url=self.url, timeout=180)
+            else:
+                from main import app
+                self._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=180)
+
+        caches_before = await self._server_stats("cache")
+        logging_before = await self._server_stats("logging")
+        threads_before = _thread_snapshot()
+        sampler = asyncio.create_task(self._sample_threads())
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def run_session(session):
+            async with slots:
+                await self._run_session(session)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(run_session(session) for session in workload))
+            duration = time.perf_counter() - started
+            summarization_drained = await self._drain_summarization()
+        finally:
+            sampler.cancel()
+
+        report = {
+            "duration_seconds": round(duration, 3),
+            "summarization_drained": summarization_drained,
+            "caches_before": caches_before,
+            "caches_after": await self._server_stats("cache"),
+            "threads": {"before": threads_before, "peak": self._threads_peak, "after_run": _thread_snapshot()},
+            "summarization": await self._server_stats("summarization"),
+            "llm": await self._server_stats("llm"),
+            "admission": await self._server_stats("admission"),
+            "batching": await self._server_stats("batching"),
+            "logging_before": logging_before,
+            "logging": await self._server_stats("logging")
+        }
+        if self._client is not None:
+            await self._client.aclose()
+        return report
+
+    async def _run_session(self, session: Dict[str, Any]) -> None:
+        history: List[Dict[str, Any]] = []
+        for index, turn in enumerate(session["turns"]):
+            await self._pace()
+            record = await self._run_turn(session, turn, history)
+            record.update({"session_id": session["session_id"], "turn": index})
+            self.turns.append(record)
+            if record["status"] == "ok":
+                now = datetime.now().isoformat()
+                history.extend([
+                    {"role": "user", "content": turn["user_message"], "created_at": now},
+                    {"role": "assistant", "content": record.pop("message"), "created_at": now}
+                ])
+                del history[:-HISTORY_WINDOW]
+            think_time = turn.get("think_time_ms", self.think_time * 1000) / 1000
+            if think_time > 0:
+                await asyncio.sleep(think_time)
+
+    async def _pace(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._pace_lock:
+            now = time.perf_counter()
+            start = max(now, self._next_start)
+            self._next_start = start + 1 / self.rate
+        await asyncio.sleep(start - now)
+
+    async def _run_turn(self, session: Dict[str, Any], turn: Dict[str, Any], history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        request = {
+            "user_message": turn["user_message"],
+            "recent_messages": list(history),
+            "conversation_summary": turn.get("conversation_summary") or {},
+            "user_activities": turn.get("user_activities") or [],
+            "user_patterns": turn.get("user_patterns") or {},
+            "voice_analysis": turn.get("voice_analysis") or {},
+            "user_id": session["user_id"],
+            "session_id": session["session_id"],
+            "workflow_mode": turn.get("workflow_mode") or self.workflow_mode
+        }
+        started = time.perf_counter()
+        try:
+            if self.target == "http":
+                result, first_token = await self._http_turn(request, started)
+            else:
+                result, first_token = await self._inprocess_turn(request, started)
+        except Exception as e:
+            return {"status": _failure_status(e), "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "error": str(e)[:200]}
+
+        metrics = (result.get("session_insights") or {}).get("performance_metrics") or {}
+        return {
+            "status": "ok",
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "ttft_ms": round(first_token * 1000, 2) if first_token is not None else None,
+            "node_timings_ms": metrics.get("node_timings_ms", {}),
+            "route": (metrics.get("router") or {}).get("route"),
+            "input_tokens": metrics.get("input_tokens", {}),
+            "message": result.get("message", "")
+        }
+
+    async def _inprocess_turn(self, request: Dict[str, Any], started: float):
+        from workflow import aprocess_user_chat, astream_user_chat
+
+        if not self.stream:
+            return await aprocess_user_chat(**request), None
+        first_token = None
+        async for event, data in astream_user_chat(**request):
+            if event == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif event == "done":
+                return data, first_token
+        raise RuntimeError("Stream ended without a done event")
+
+    async def _http_turn(self, request: Dict[str, Any], started: float):
+        if not self.stream:
+            response = await self._client.post("/chat", json=request)
+            _raise_for_status(response.status_code, response.text)
+            return response.json(), None
+
+        first_token = None
+        async with self._client.stream("POST", "/chat/stream", json=request) as response:
+            if response.status_code != 200:
+                _raise_for_status(response.status_code, (await response.aread()).decode("utf-8", "replace"))
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    data = json.loads(line[6:])
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event == "done":
+                        return data, first_token
+                    elif event == "error":
+                        raise RuntimeError(data.get("detail", "stream error"))
+        raise RuntimeError("Stream ended without a done event")
+
+    async def _server_stats(self, name: str) -> Dict[str, Any]:
+        """The /stats/<name> payload, read directly when the workflow runs in this process"""
+        if self.target == "http" and self.url:
+            response = await self._client.get(f"/stats/{name}")
+            return response.json() if response.status_code == 200 else {}
+        if name == "logging":
+            from structured_logging import logging_stats
+            return logging_stats()
+        from workflow import get_workflow_instance
+        return getattr(get_workflow_instance(), f"{name}_stats")()
+
+    async def _drain_summarization(self) -> bool:
+        """Wait for queued background summaries so cache growth includes them"""
+        deadline = time.monotonic() + SUMMARIZATION_DRAIN_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            stats = await self._server_stats("summarization")
+            if not stats.get("queue_depth") and not stats.get("running"):
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def _sample_threads(self) -> None:
+        while True:
+            snapshot = _thread_snapshot()
+            if snapshot["count"] >= self._threads_peak["count"]:
+                self._threads_peak = snapshot
+            await asyncio.sleep(THREAD_SAMPLE_INTERVAL_SECONDS)
+
+
+class _HTTPStatusError(Exception):
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.body = body
+
+
+def _raise_for_status(status_code: int, body: str) -> None:
+    if status_code != 200:
+        raise _HTTPStatusError(status_code, body)
+
+
+def _failure_status(error: Exception) -> str:
+    """shed (admission), unavailable (model circuit/quota) or error"""
+    if isinstance(error, _HTTPStatusError):
+        if error.status_code == 503:
+            return "shed" if "Server busy" in error.body else "unavailable"
+        return "error"
+    name = type(error).__name__
+    if name == "AdmissionRejected":
+        return "shed"
+    if name in ("LLMUnavailable", "CircuitOpenError"):
+        return "unavailable"
+    return "error"
+
+
+def summarize(turns: List[Dict[str, Any]], report: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Machine-readable results: config, latency/throughput summary, per-node percentiles, resources"""
+    ok = [turn for turn in turns if turn["status"] == "ok"]
+    node_samples: Dict[str, List[float]] = {}
+    stage_tokens: Dict[str, List[float]] = {}
+    for turn in ok:
+        for node, ms in turn["node_timings_ms"].items():
+            node_samples.setdefault(node, []).append(ms)
+        for stage, tokens in turn["input_tokens"].items():
+            stage_tokens.setdefault(stage, []).append(tokens)
+
+    duration = report["duration_seconds"]
+    ttft = [turn["ttft_ms"] for turn in ok if turn.get("ttft_ms") is not None]
+    return {
+        "benchmark_version": 1,
+        "created_at": datetime.now().isoformat(),
+        "config": config,
+        "summary": {
+            "turns": len(turns),
+            "sessions": len({turn["session_id"] for turn in turns}),
+            "status": dict(Counter(turn["status"] for turn in turns)),
+            "duration_seconds": duration,
+            "throughput_turns_per_second": round(len(ok) / duration, 3) if duration else None,
+            "latency_ms": _distribution([turn["latency_ms"] for turn in ok]),
+            "ttft_ms": _distribution(ttft) if ttft else None,
+            "routes": dict(Counter(turn["route"] for turn in ok if turn.get("route")))
+        },
+        "nodes": {node: _distribution(samples) for node, samples in sorted(node_samples.items())},
+        "input_tokens": {stage: _distribution(samples) for stage, samples in sorted(stage_tokens.items())},
+        "resources": {
+            "max_rss_mb": _max_rss_mb(),
+            "cache_growth": _cache_growth(report["caches_before"], report["caches_after"]),
+            "threads": report["threads"],
+            "summarization_drained": report["summarization_drained"],
+            "logging": _logging_overhead(report["logging_before"], report["logging"], len(turns))
+        },
+        "server_stats": {
+            "caches": report["caches_after"],
+            "summarization": report["summarization"],
+            "llm": report["llm"],
+            "admission": report["admission"],
+            "batching": report["batching"]
+        },
+        "errors": [turn["error"] for turn in turns if turn["status"] != "ok"][:20]
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression_pct: float) -> List[str]:
+    """Lines describing latency/throughput changes vs a baseline run; regressions beyond the limit are flagged"""
+    rows = [("throughput", baseline["summary"]["throughput_turns_per_second"],
+             results["summary"]["throughput_turns_per_second"], True)]
+    for quantile in ("p50", "p95", "p99"):
+        rows.append((f"latency {quantile}", baseline["summary"]["latency_ms"][quantile],
+                     results["summary"]["latency_ms"][quantile], False))
+    for node, stats in results["nodes"].items():
+        if node in baseline.get("nodes", {}):
+            rows.append((f"{node} p95", baseline["nodes"][node]["p95"], stats["p95"], False))
+
+    lines = []
+    for label, before, after, higher_is_better in rows:
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        regressed = (-change if higher_is_better else change) > max_regression_pct
+        lines.append(f"{'REGRESSION ' if regressed else ''}{label}: {before} -> {after} ({change:+.1f}%)")
+    return lines
+
+
+# Message lengths (chars) for --triage; the longest stands in for a pasted document
+TRIAGE_LENGTHS = (100, 1_000, 10_000, 100_000)
+
+
+def triage_benchmark(seed: int = 0, repeats: int = 200) -> Dict[str, Any]:
+    """Risk triage latency per message length: clean text vs the same text with a risk phrase at the end"""
+    from risk_triage import RiskTriage
+
+    rng = random.Random(seed)
+    # Reload checks off: this measures matching, not the rules file stat()
+    triage = RiskTriage(reload_seconds=0)
+    sentences = _OPENERS + _FOLLOW_UPS[:-1] + _SHORT_TURNS
+    results: Dict[str, Any] = {"rules_version": triage.matcher.version, "patterns": len(triage.matcher.patterns), "lengths": {}}
+    for length in TRIAGE_LENGTHS:
+        parts: List[str] = []
+        while sum(len(part) + 1 for part in parts) < length:
+            parts.append(rng.choice(sentences))
+        clean = " ".join(parts)[:length]
+        cases = {"clean": clean, "flagged": clean + " " + _FOLLOW_UPS[-1]}
+        runs = max(repeats * 100 // length, 5)
+        entry: Dict[str, Any] = {"chars": len(clean)}
+        for name, text in cases.items():
+            samples = []
+            level = None
+            for _ in range(runs):
+                started = time.perf_counter()
+                level = triage.assess(text)["level"]
+                samples.append((time.perf_counter() - started) * 1_000_000)
+            p50 = _percentile(samples, 0.5)
+            entry[name] = {"level": level, "runs": runs, "p50_us": round(p50, 1),
+                           "p99_us": round(_percentile(samples, 0.99), 1), "chars_per_us": round(len(text) / p50, 1)}
+        results["lengths"][str(length)] = entry
+    return results
+
+
+def _configure_environment(args: argparse.Namespace) -> None:
+    """Must run before workflow is imported: its settings are read at import time"""
+    if args.backend == "fake":
+        os.environ["MINDMATE_LLM_BACKEND"] = "fake"
+        os.environ["MINDMATE_FAKE_LLM_LATENCY"] = args.latency
+        os.environ["MINDMATE_FAKE_LLM_FAILURE_RATE"] = str(args.failure_rate)
+        os.environ["MINDMATE_FAKE_LLM_SEED"] = str(args.seed)
+    os.environ["MINDMATE_LOG_LEVEL"] = "INFO" if args.verbose else "WARNING"
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        os.environ[key] = value
+
+
+def _print_summary(results: Dict[str, Any]) -> None:
+    summary = results["summary"]
+    latency = summary["latency_ms"]
+    print(f"turns={summary['turns']} sessions={summary['sessions']} status={summary['status']}")
+    print(f"throughput={summary['throughput_turns_per_second']} turns/s over {summary['duration_seconds']}s")
+    print(f"latency ms p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    if summary["ttft_ms"]:
+        print(f"ttft ms p50={summary['ttft_ms']['p50']} p95={summary['ttft_ms']['p95']}")
+    for node, stats in results["nodes"].items():
+        print(f"  {node:<30} n={stats['count']:<5} p50={stats['p50']} p95={stats['p95']} p99={stats['p99']}")
+    threads = results["resources"]["threads"]
+    print(f"threads before={threads['before']['count']} peak={threads['peak']['count']} after={threads['after_run']['count']}"
+          f" max_rss_mb={results['resources']['max_rss_mb']}")
+    for name, growth in results["resources"]["cache_growth"].items():
+        size = f", +{growth['bytes']} bytes" if growth["bytes"] is not None else ""
+        print(f"  cache {name:<22} +{growth['entries']} entries{size}")
+    log = results["resources"].get("logging")
+    if log:
+        print(f"logging events/turn={log['events_per_turn']} request-path us/turn={log['call_us_per_turn']}"
+              f" handler cpu us/turn={log['handler_cpu_us_per_turn']} dropped={log['dropped']} queued={log['queued']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load/replay benchmark for the MindMate chat workflow")
+    parser.add_argument("--target", choices=["inprocess", "http"], default="inprocess",
+                        help="call the workflow directly, or go through the FastAPI app")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process ASGI app (http target)")
+    parser.add_argument("--stream", action="store_true",
+                        help="use the streaming entry points and record time to first token "
+                             "(the in-process ASGI transport buffers bodies; use --url for HTTP TTFT)")
+    parser.add_argument("--workload", help="JSONL replay file (default: synthetic sessions)")
+    parser.add_argument("--sessions", type=int, default=20, help="synthetic sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per synthetic session / max turns per replayed session")
+    parser.add_argument("--save-workload", help="write the synthetic workload as replayable JSONL")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrently active sessions")
+    parser.add_argument("--rate", type=float, default=0.0, help="max turn starts per second (0 = closed loop)")
+    parser.add_argument("--think-time-ms", type=float, default=0.0, help="pause between turns of a session")
+    parser.add_argument("--workflow-mode", choices=["two_agent", "fused"], help="per-request workflow_mode override")
+    parser.add_argument("--backend", choices=["fake", "gemini"], default="fake", help="model backend (fake runs offline)")
+    parser.add_argument("--latency", default="lognormal:400:0.4", help="fake model latency spec, e.g. fixed:800, replay:timings.txt")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fake model injected failure rate")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic workload and fake model")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra MINDMATE_* settings for this run")
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="percent change that fails --compare")
+    parser.add_argument("--verbose", action="store_true", help="keep the workflow's INFO logs (and measure their cost)")
+    parser.add_argument("--triage", action="store_true", help="only time the local risk triage on long messages")
+    args = parser.parse_args(argv)
+
+    if args.triage:
+        results = triage_benchmark(args.seed)
+        if args.output == "-":
+            print(json.dumps(results, indent=2))
+            return 0
+        print(f"risk rules {results['rules_version']} ({results['patterns']} patterns)")
+        for length, entry in results["lengths"].items():
+            for name in ("clean", "flagged"):
+                stats = entry[name]
+                print(f"  {length:>7} chars {name:<8} level={stats['level']:<9} p50={stats['p50_us']}us"
+                      f" p99={stats['p99_us']}us {stats['chars_per_us']} chars/us")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    _configure_environment(args)
+    import workflow
+
+    if args.workload:
+        workload = load_workload(args.workload, args.turns)
+    else:
+        workload = synthetic_workload(args.sessions, args.turns, args.seed)
+    if args.save_workload:
+        save_workload(workload, args.save_workload)
+
+    runner = BenchmarkRunner(
+        target=args.target, concurrency=args.concurrency, rate=args.rate, stream=args.stream,
+        workflow_mode=args.workflow_mode, url=args.url, think_time_ms=args.think_time_ms
+    )
+    report = asyncio.run(runner.run(workload))
+
+    config = {
+        "target": args.target, "url": args.url, "stream": args.stream,
+        "workload": args.workload or "synthetic", "sessions": len(workload), "turns_per_session": args.turns,
+        "concurrency": args.concurrency, "rate": args.rate, "think_time_ms": args.think_time_ms,
+        "workflow_mode": args.workflow_mode or workflow.DEFAULT_WORKFLOW_MODE, "backend": args.backend,
+        "latency": args.latency if args.backend == "fake" else None, "failure_rate": args.failure_rate,
+        "seed": args.seed, "env": args.env
+    }
+    results = summarize(runner.turns, report, config)
+
+    if not args.url:
+        workflow.shutdown_workflow_instance()
+        results["resources"]["threads"]["after_shutdown"] = _thread_snapshot()
+
+    if args.output == "-":
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        _print_summary(results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, default=str)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            lines = compare(results, json.load(f), args.max_regression)
+        print("\n".join(lines), file=sys.stderr if args.output == "-" else sys.stdout)
+        if any(line.startswith("REGRESSION") for line in lines):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
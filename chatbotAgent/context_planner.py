@@ -0,0 +1,146 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+# Sections are packed in ascending priority order; lower numbers win the budget first
+PRIORITY_CRITICAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_MEDIUM = 2
+PRIORITY_LOW = 3
+
+KEEP_NEWEST = "newest"
+KEEP_FIRST = "first"
+
+_ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate without a tokenizer round-trip.
+
+    Latin script averages ~4 characters per token; Devanagari and other
+    multi-byte scripts tokenize far denser, so non-ASCII characters (counted
+    from the extra UTF-8 bytes) are charged at ~2 characters per token.
+    """
+    if not text:
+        return 0
+    extra_bytes = len(text.encode("utf-8")) - len(text)
+    non_ascii = extra_bytes // 2
+    return (len(text) - non_ascii + 3) // 4 + (non_ascii + 1) // 2
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, on a word boundary when one is close"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    keep = max(int(len(text) * max_tokens / tokens) - 1, 1)
+    cut = text[:keep]
+    space = cut.rfind(" ")
+    if space > keep * 0.8:
+        cut = cut[:space]
+    return cut.rstrip() + _ELLIPSIS
+
+
+def compact_fields(data: Dict[str, Any], labels: Dict[str, str]) -> str:
+    """Single-line `label=value; ...` rendering (lists joined with ', '), skipping empty fields.
+
+    Much cheaper in tokens than pretty-printed JSON and just as readable to the model.
+    """
+    parts = []
+    for key, label in labels.items():
+        value = data.get(key)
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(item) for item in value if item)
+        if value in (None, "", "N/A"):
+            continue
+        parts.append(f"{label}={value}")
+    return "; ".join(parts)
+
+
+class ContextPlanner:
+    """Packs prompt sections into one stage's token budget, highest priority first.
+
+    Each section is a list of items (e.g. one line per message). Items are taken
+    newest-first or first-first until the budget runs out; a section that cannot
+    fit even its first item gets that item truncated into whatever budget is left.
+    Any single item is capped at ``item_max_tokens`` and a section can be capped
+    at ``max_tokens`` so one long message or a long history cannot starve the
+    lower-priority sections. Rendered sections keep their original order.
+    """
+
+    def __init__(self, stage: str, budget_tokens: int, item_max_tokens: Optional[int] = None):
+        self.stage = stage
+        self.budget_tokens = budget_tokens
+        self.item_max_tokens = item_max_tokens or max(budget_tokens // 3, 1)
+        self._sections: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        name: str,
+        items: Iterable[str],
+        priority: int = PRIORITY_MEDIUM,
+        keep: str = KEEP_NEWEST,
+        header: str = "",
+        separator: str = "\n",
+        max_tokens: Optional[int] = None
+    ) -> "ContextPlanner":
+        self._sections.append({
+            "name": name,
+            "items": [item for item in items if item],
+            "priority": priority,
+            "keep": keep,
+            "header": header,
+            "separator": separator,
+            "max_tokens": max_tokens
+        })
+        return self
+
+    def pack(self) -> Dict[str, Any]:
+        """Returns {"sections": {name: text}, "usage": {...}}; dropped sections render as ''"""
+        remaining = self.budget_tokens
+        rendered: Dict[str, str] = {}
+        section_tokens: Dict[str, int] = {}
+        dropped_items = 0
+
+        for section in sorted(self._sections, key=lambda s: s["priority"]):
+            items = [truncate_to_tokens(item, self.item_max_tokens) for item in section["items"]]
+            order = range(len(items) - 1, -1, -1) if section["keep"] == KEEP_NEWEST else range(len(items))
+            header_cost = estimate_tokens(section["header"])
+            available = remaining if section["max_tokens"] is None else min(remaining, section["max_tokens"])
+            taken: Dict[int, str] = {}
+            used = 0
+
+            for index in order:
+                cost = estimate_tokens(items[index]) + 1 + (header_cost if not taken else 0)
+                if cost <= available - used:
+                    taken[index] = items[index]
+                    used += cost
+                    continue
+                if not taken:
+                    # Nothing from this section fits whole: keep a truncated first pick if it is worth it
+                    room = available - used - header_cost - 1
+                    if room >= 8:
+                        taken[index] = truncate_to_tokens(items[index], room)
+                        used += estimate_tokens(taken[index]) + 1 + header_cost
+                break
+
+            dropped_items += len(items) - len(taken)
+            remaining -= used
+            section_tokens[section["name"]] = used
+            if taken:
+                body = section["separator"].join(taken[i] for i in sorted(taken))
+                rendered[section["name"]] = f"{section['header']}{body}"
+            else:
+                rendered[section["name"]] = ""
+
+        ordered = {section["name"]: rendered[section["name"]] for section in self._sections}
+        return {
+            "sections": ordered,
+            "usage": {
+                "stage": self.stage,
+                "budget": self.budget_tokens,
+                "context_tokens": self.budget_tokens - remaining,
+                "sections": section_tokens,
+                "dropped_items": dropped_items
+            }
+        }
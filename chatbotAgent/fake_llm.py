@@ -0,0 +1,223 @@
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import typing
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+# Share of the simulated latency spent before the first streamed token
+TIME_TO_FIRST_TOKEN_SHARE = 0.3
+# Prompts whose attempt count is remembered (the count restarts for all of them past this)
+MAX_TRACKED_PROMPTS = 65536
+
+_REPLIES = [
+    "Hey, I hear you. That sounds like a lot to carry right now, yaar. What part of it is weighing on you the most today?",
+    "That makes so much sense, honestly. Exams plus everyone's expectations can feel really heavy. Want to try breaking tonight into one small, doable step?",
+    "Thank you for telling me this. It's okay to feel tired of it all sometimes. What usually helps you feel even a little lighter?",
+    "Arre, that sounds exhausting. You don't have to figure everything out at once. Shall we take a slow breath together and look at just one thing?",
+    "I'm really glad you reached out. Feeling this way doesn't mean you're failing, it means you're human. How have you been sleeping lately?"
+]
+_EMOTIONS = ["anxious and overwhelmed", "tired but hopeful", "frustrated", "low and withdrawn", "calm and reflective"]
+_STRESS = ["Academic", "Family", "Social", "Emotional", "Identity", "Career"]
+_APPROACHES = ["CBT", "ACT", "MBCT"]
+_PRIORITIES = ["supportive", "supportive", "long-term", "immediate"]
+_LANGUAGE = ["casual", "hindi-mixed", "formal"]
+_INSIGHTS = [
+    "Frames worth through academic results", "Avoids sharing feelings with family", "Sleep is affected by worry",
+    "Responds well to small concrete steps", "Compares self with peers on social media", "Has a supportive friend"
+]
+_ACTIVITIES = ["4-7-8 breathing", "Short evening walk", "Gratitude journaling", "Pomodoro study blocks", "Memory game break"]
+
+
+class FakeLLMError(RuntimeError):
+    """Injected backend failure"""
+
+
+class LatencyModel:
+    """Per-call latency in seconds: fixed, lognormal, or replayed from recorded timings.
+
+    Specs (milliseconds): ``fixed:800``, ``lognormal:800:0.5`` (median, sigma),
+    ``replay:/path/timings.txt`` (one ms value per line, or JSONL with latency_ms),
+    cycled in order. Sampling uses the caller's per-call RNG (see
+    FakeChatModel._rng), so a run replays with the same latencies.
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self._replay: List[float] = []
+        self._cursor = itertools.count()
+        if kind == "fixed":
+            self.value_ms = float(args or 0)
+        elif kind == "lognormal":
+            median, _, sigma = args.partition(":")
+            self.mu = math.log(float(median))
+            self.sigma = float(sigma or 0.5)
+        elif kind == "replay":
+            with open(args, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self._replay.append(float(json.loads(line)["latency_ms"]) if line.startswith("{") else float(line))
+            if not self._replay:
+                raise ValueError(f"No timings found in {args}")
+        else:
+            raise ValueError(f"Unknown latency model '{spec}' (use fixed:, lognormal: or replay:)")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.value_ms / 1000
+        if self.kind == "lognormal":
+            return rng.lognormvariate(self.mu, self.sigma) / 1000
+        return self._replay[next(self._cursor) % len(self._replay)] / 1000
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic offline stand-in for the Gemini chat model.
+
+    Replies, structured outputs, latency and injected failures are all derived
+    from ``seed``, the prompt text and how many times that prompt was sent
+    before, so a replayed workload behaves the same on every run while a retry
+    or hedge of the same prompt draws fresh latency and failures. Supports invoke/ainvoke, token streaming and
+    ``with_structured_output`` for any of the workflow's pydantic schemas.
+    """
+
+    latency: Any = None
+    failure_rate: float = 0.0
+    none_rate: float = 0.0
+    seed: int = 0
+    max_tokens: int = 300
+
+    _attempts: Dict[int, int] = PrivateAttr(default_factory=dict)
+    _attempts_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "mindmate-fake"
+
+    def _rng(self, messages: Any) -> random.Random:
+        text = messages if isinstance(messages, str) else "".join(
+            getattr(m, "content", "") if isinstance(getattr(m, "content", ""), str) else "" for m in messages
+        )
+        digest = zlib.crc32(text.encode("utf-8"))
+        with self._attempts_lock:
+            if len(self._attempts) >= MAX_TRACKED_PROMPTS:
+                self._attempts.clear()
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{digest}:{attempt}:{self.seed}")
+
+    def _latency(self, rng: random.Random) -> float:
+        return self.latency.sample(rng) if self.latency else 0.0
+
+    def _maybe_fail(self, rng: random.Random) -> None:
+        if rng.random() < self.failure_rate:
+            raise FakeLLMError("Injected fake LLM failure")
+
+    def _reply(self, rng: random.Random) -> str:
+        words = rng.choice(_REPLIES).split()
+        return " ".join(words[:self.max_tokens])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        rng = self._rng(messages)
+        time.sleep(self._latency(rng))
+        self._maybe_fail(rng)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(rng)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        rng = self._rng(messages)
+        await asyncio.sleep(self._latency(rng))
+        self._maybe_fail(rng)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(rng)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        rng = self._rng(messages)
+        latency = self._latency(rng)
+        self._maybe_fail(rng)
+        tokens = self._tokens(rng)
+        time.sleep(latency * TIME_TO_FIRST_TOKEN_SHARE)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(latency * (1 - TIME_TO_FIRST_TOKEN_SHARE) / len(tokens))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        rng = self._rng(messages)
+        latency = self._latency(rng)
+        self._maybe_fail(rng)
+        tokens = self._tokens(rng)
+        await asyncio.sleep(latency * TIME_TO_FIRST_TOKEN_SHARE)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(latency * (1 - TIME_TO_FIRST_TOKEN_SHARE) / len(tokens))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _tokens(self, rng: random.Random) -> List[str]:
+        words = self._reply(rng).split(" ")
+        return [words[0]] + [f" {word}" for word in words[1:]]
+
+    def with_structured_output(self, schema: Any, **kwargs) -> RunnableLambda:
+        """Runnable returning a valid `schema` instance (or None at `none_rate`), like Gemini's structured output"""
+
+        def build(messages: Any):
+            rng = self._rng(messages)
+            time.sleep(self._latency(rng))
+            return self._structured(schema, rng)
+
+        async def abuild(messages: Any):
+            rng = self._rng(messages)
+            await asyncio.sleep(self._latency(rng))
+            return self._structured(schema, rng)
+
+        return RunnableLambda(build, afunc=abuild, name=f"fake_structured_{schema.__name__}")
+
+    def _structured(self, schema: Any, rng: random.Random) -> Any:
+        self._maybe_fail(rng)
+        if rng.random() < self.none_rate:
+            return None
+        return schema(**{name: self._field_value(name, field.annotation, rng) for name, field in schema.model_fields.items()})
+
+    def _field_value(self, name: str, annotation: Any, rng: random.Random) -> Any:
+        if typing.get_origin(annotation) in (list, List):
+            pool = {"stress_categories": _STRESS, "activity_recommendations": _ACTIVITIES}.get(name, _INSIGHTS)
+            return rng.sample(pool, 2)
+        picks = {
+            "emotional_state": _EMOTIONS,
+            "therapeutic_approach": _APPROACHES,
+            "intervention_priority": _PRIORITIES,
+            "language_style": _LANGUAGE,
+            "response": _REPLIES
+        }
+        if name in picks:
+            return rng.choice(picks[name])
+        return f"{name.replace('_', ' ').capitalize()}: {rng.choice(_INSIGHTS).lower()}"
+
+
+_lock = threading.Lock()
+_latency_models = {}
+
+
+def create_fake_llm(max_tokens: int, latency_spec: str, failure_rate: float, none_rate: float, seed: int) -> FakeChatModel:
+    """Fake model sharing one LatencyModel per spec (so replayed timings are consumed in order)"""
+    with _lock:
+        if latency_spec not in _latency_models:
+            _latency_models[latency_spec] = LatencyModel(latency_spec)
+        latency = _latency_models[latency_spec]
+    return FakeChatModel(latency=latency, failure_rate=failure_rate, none_rate=none_rate, seed=seed, max_tokens=max_tokens)
@@ -0,0 +1,381 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from context_planner import estimate_tokens
+from metrics import LLM_CALL_SECONDS, LLM_INPUT_TOKENS, LLM_OUTPUT_TOKENS, current_stage
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Absolute time.monotonic() deadline for LLM calls made in the current node (set by node_deadline)
+_call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_call_deadline", default=None)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _output_tokens(result: Any) -> int:
+    """Completion size: message text, or the JSON of a structured-output object"""
+    if result is None:
+        return 0
+    content = getattr(result, "content", None)
+    if isinstance(content, str):
+        return estimate_tokens(content)
+    if hasattr(result, "model_dump_json"):
+        return estimate_tokens(result.model_dump_json())
+    return estimate_tokens(str(result))
+
+
+class LLMUnavailable(Exception):
+    """Base class for calls the client layer refused or gave up on"""
+
+    retry_after = 1.0
+
+
+class CircuitOpenError(LLMUnavailable):
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(LLMUnavailable):
+    def __init__(self, stage: str):
+        super().__init__(f"LLM deadline exceeded ({stage})")
+
+
+class QuotaExhausted(DeadlineExceeded):
+    """Local quota could not be granted before the deadline; the call was never sent"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage}: quota wait")
+
+
+@contextmanager
+def node_deadline(turn_deadline: Optional[float], share: float = 1.0) -> Iterator[Optional[float]]:
+    """Give the LLM calls inside this block `share` of the time left until turn_deadline"""
+    if turn_deadline is None:
+        yield None
+        return
+    now = time.monotonic()
+    deadline = now + max(turn_deadline - now, 0.0) * share
+    token = _call_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _call_deadline.reset(token)
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve first and then sleep off any deficit (FIFO-fair)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """Take `amount` now; returns how long to wait before using it, or None if that exceeds max_wait"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(amount - self._tokens, 0.0) / self.rate
+            if wait > max_wait:
+                return None
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; one probe call is let through after `reset_seconds`"""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened_count = 0
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self.state == CIRCUIT_OPEN and remaining <= 0:
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def record(self, success: Optional[bool]) -> None:
+        """Outcome of an allowed call; None only releases a half-open probe (call was cancelled)"""
+        with self._lock:
+            self._probe_in_flight = False
+            if success is None:
+                return
+            if success:
+                self._failures = 0
+                self.state = CIRCUIT_CLOSED
+                return
+            self._failures += 1
+            if self.state == CIRCUIT_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != CIRCUIT_OPEN:
+                    self.opened_count += 1
+                    logger.warning(f"⚡ LLM circuit opened after {self._failures} consecutive failures")
+                self.state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+
+
+class LLMClient:
+    """Shared outbound policy for every model call: quota buckets, circuit breaker, deadlines, hedging.
+
+    One instance per provider/process; ``wrap`` returns a drop-in replacement for
+    a chat model or structured-output runnable (invoke/ainvoke) that applies it.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        default_timeout_seconds: float = 30.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        hedge_percentile: Optional[float] = 0.95,
+        hedge_min_samples: int = 20
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.default_timeout_seconds = default_timeout_seconds
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.models: Dict[str, "GuardedLLM"] = {}
+
+    def wrap(self, runnable: Any, name: str, max_output_tokens: int = 300, hedge: bool = True) -> "GuardedLLM":
+        guarded = GuardedLLM(self, runnable, name, max_output_tokens, hedge and self.hedge_percentile is not None)
+        self.models[name] = guarded
+        return guarded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened_count,
+            "requests_per_minute": self.request_bucket.capacity if self.request_bucket else None,
+            "tokens_per_minute": self.token_bucket.capacity if self.token_bucket else None,
+            "models": {name: model.stats() for name, model in self.models.items()}
+        }
+
+    def _deadline(self) -> float:
+        return _call_deadline.get() or time.monotonic() + self.default_timeout_seconds
+
+    def _reserve(self, tokens: int, max_wait: float) -> Optional[float]:
+        """Reserve quota for one attempt; returns seconds to wait first, or None (nothing held) if over max_wait"""
+        reserved = []
+        wait = 0.0
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket is None:
+                continue
+            bucket_wait = bucket.reserve(amount, max_wait)
+            if bucket_wait is None:
+                for held_bucket, held in reserved:
+                    held_bucket.refund(held)
+                return None
+            reserved.append((bucket, amount))
+            wait = max(wait, bucket_wait)
+        return wait
+
+
+class GuardedLLM:
+    """One model behind an LLMClient (see LLMClient.wrap)"""
+
+    def __init__(self, client: LLMClient, runnable: Any, name: str, max_output_tokens: int, hedge: bool):
+        self.client = client
+        self.runnable = runnable
+        self.name = name
+        self.max_output_tokens = max_output_tokens
+        self.hedge = hedge
+        self._latency = deque(maxlen=256)
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "failures": 0, "deadline_exceeded": 0, "quota_exhausted": 0,
+                          "circuit_rejected": 0, "hedged": 0, "hedge_wins": 0, "quota_wait_ms": 0.0}
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        with tracer.span("llm_call", model=self.name):
+            deadline = self.client._deadline()
+            started = time.monotonic()
+            self._before_call(started)
+            tokens = self._estimate_tokens(input)
+            try:
+                await self._acquire_async(tokens, deadline)
+                primary = asyncio.ensure_future(self.runnable.ainvoke(input, config, **kwargs))
+                attempts = [primary]
+                hedge_after = self._hedge_delay()
+                if hedge_after is not None and hedge_after < deadline - time.monotonic():
+                    done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+                    if not done and self._try_hedge(tokens, deadline):
+                        attempts.append(asyncio.ensure_future(self.runnable.ainvoke(input, config, **kwargs)))
+                result, winner = await self._first_success(attempts, deadline)
+                if winner > 0:
+                    self._count("hedge_wins")
+                    tracer.annotate(hedge_won=True)
+            except BaseException as e:
+                self._after_call(started, e)
+                raise
+            self._after_call(started, None, input, result)
+            return result
+
+    def invoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """Sync path (background summarizer threads): quota, breaker and latency tracking, no hedging"""
+        with tracer.span("llm_call", model=self.name):
+            deadline = self.client._deadline()
+            started = time.monotonic()
+            self._before_call(started)
+            try:
+                wait = self.client._reserve(self._estimate_tokens(input), max(deadline - time.monotonic(), 0.0))
+                if wait is None:
+                    raise QuotaExhausted(self.name)
+                if wait:
+                    self._count("quota_wait_ms", wait * 1000)
+                    tracer.annotate(quota_wait_ms=round(wait * 1000, 1))
+                    time.sleep(wait)
+                result = self.runnable.invoke(input, config, **kwargs)
+            except BaseException as e:
+                self._after_call(started, e)
+                raise
+            self._after_call(started, None, input, result)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        hedge_after = self._hedge_delay()
+        with self._lock:
+            latency = list(self._latency)
+            return {
+                **self._counters,
+                "quota_wait_ms": round(self._counters["quota_wait_ms"], 1),
+                "hedging": self.hedge,
+                "latency_ms": {"p50": _percentile(latency, 0.5), "p95": _percentile(latency, 0.95)},
+                "hedge_after_ms": round(hedge_after * 1000, 1) if hedge_after is not None else None
+            }
+
+    def _estimate_tokens(self, input: Any) -> int:
+        """Quota reservation: prompt plus the full output allowance"""
+        return self._prompt_tokens(input) + self.max_output_tokens
+
+    def _prompt_tokens(self, input: Any) -> int:
+        messages = input if isinstance(input, list) else [input]
+        text = "".join(getattr(m, "content", m) if isinstance(getattr(m, "content", m), str) else "" for m in messages)
+        return estimate_tokens(text)
+
+    def _before_call(self, started: float) -> None:
+        self._count("calls")
+        try:
+            self.client.breaker.before_call()
+        except CircuitOpenError:
+            self._count("circuit_rejected")
+            LLM_CALL_SECONDS.labels(self.name, "circuit_open").observe(time.monotonic() - started)
+            raise
+
+    def _after_call(self, started: float, error: Optional[BaseException], input: Any = None, result: Any = None) -> None:
+        if isinstance(error, CircuitOpenError):
+            return
+        elapsed = time.monotonic() - started
+        if isinstance(error, QuotaExhausted):
+            # Our own rate limiter refused before dispatch: a local burst must not open the circuit
+            self._count("quota_exhausted")
+            LLM_CALL_SECONDS.labels(self.name, "quota_exhausted").observe(elapsed)
+            self.client.breaker.record(None)
+            return
+        if isinstance(error, asyncio.CancelledError):
+            # Caller gave up (client disconnect, losing hedge): says nothing about backend health
+            LLM_CALL_SECONDS.labels(self.name, "cancelled").observe(elapsed)
+            self.client.breaker.record(None)
+            return
+        if error is None:
+            with self._lock:
+                self._latency.append(round(elapsed * 1000, 1))
+            LLM_CALL_SECONDS.labels(self.name, "ok").observe(elapsed)
+            stage = current_stage(self.name)
+            prompt_tokens, output_tokens = self._prompt_tokens(input), _output_tokens(result)
+            LLM_INPUT_TOKENS.labels(stage).inc(prompt_tokens)
+            LLM_OUTPUT_TOKENS.labels(stage).inc(output_tokens)
+            tracer.annotate(prompt_tokens=prompt_tokens, output_tokens=output_tokens, empty_result=result is None)
+        else:
+            deadline = isinstance(error, DeadlineExceeded)
+            self._count("deadline_exceeded" if deadline else "failures")
+            LLM_CALL_SECONDS.labels(self.name, "deadline_exceeded" if deadline else "error").observe(elapsed)
+        self.client.breaker.record(error is None)
+
+    async def _acquire_async(self, tokens: int, deadline: float) -> None:
+        wait = self.client._reserve(tokens, max(deadline - time.monotonic(), 0.0))
+        if wait is None:
+            raise QuotaExhausted(self.name)
+        if wait:
+            self._count("quota_wait_ms", wait * 1000)
+            tracer.annotate(quota_wait_ms=round(wait * 1000, 1))
+            await asyncio.sleep(wait)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latency) < self.client.hedge_min_samples:
+                return None
+            return _percentile(list(self._latency), self.client.hedge_percentile) / 1000
+
+    def _try_hedge(self, tokens: int, deadline: float) -> bool:
+        """Only hedge with quota available right now; never queue behind the limiter for a hedge"""
+        if self.client._reserve(tokens, 0.0) is None:
+            return False
+        self._count("hedged")
+        tracer.annotate(hedged=True)
+        return True
+
+    async def _first_success(self, attempts: list, deadline: float):
+        """Result of the first attempt to succeed (index too); cancels the rest. Raises the last error."""
+        pending = set(attempts)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded(self.name)
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(self.name)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), attempts.index(task)
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[key] += amount
@@ -1,15 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
-import logging
-from workflow import process_user_chat
+from typing import Dict, Any, Optional, List, Literal
+import asyncio
+import time
+from startup import StartupState
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Readiness and startup timings (the workflow module is most of this worker's import time)
+startup = StartupState()
+with startup.phase("import_workflow"):
+    from workflow import aprocess_user_chat, astream_user_chat, aget_workflow_instance, shutdown_workflow_instance, WARMUP_MODE
+from admission import AdmissionRejected
+from llm_client import LLMUnavailable
+from streaming import format_sse_event
+from metrics import REGISTRY, CONTENT_TYPE, HTTP_REQUESTS, HTTP_REQUEST_SECONDS
+from tracing import TRACE_HEADER, bind_trace_id, new_trace_id, valid_trace_id
+from structured_logging import configure_logging, logging_stats
+from voice_features import VoiceAnalysisStream, VoiceInputError, VoiceTooLong
 
-app = FastAPI(title="MindMate Chatbot Agent", version="1.0.0")
+# Turn outcomes (incl. shed/unavailable/failed) are logged once per turn by the workflow entry points
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build and warm up the workflow before traffic, in the background so /health answers meanwhile
+    startup_task = asyncio.create_task(startup.run(aget_workflow_instance, WARMUP_MODE))
+    yield
+    startup.stopping()
+    startup_task.cancel()
+    # Let queued background summaries finish instead of losing them with the worker
+    await asyncio.to_thread(shutdown_workflow_instance)
+
+app = FastAPI(title="MindMate Chatbot Agent", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,8 +42,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Request/error rates and time-to-headers per route template (bounded label cardinality)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        if path != "/metrics":
+            HTTP_REQUESTS.labels(request.method, path, status).inc()
+            HTTP_REQUEST_SECONDS.labels(request.method, path).observe(time.perf_counter() - started)
+
+@app.middleware("http")
+async def assign_trace_id(request: Request, call_next):
+    """One trace ID per request (the caller's X-Trace-Id if valid), echoed back in the response header"""
+    trace_id = valid_trace_id(request.headers.get(TRACE_HEADER)) or new_trace_id()
+    with bind_trace_id(trace_id):
+        response = await call_next(request)
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
 class ChatRequest(BaseModel):
     user_message: str
     recent_messages: Optional[List[Dict[str, Any]]] = []
@@ -29,6 +79,7 @@ class ChatRequest(BaseModel):
     voice_analysis: Optional[Dict[str, Any]] = {}  # Add voice analysis support
     user_id: Optional[str] = "anonymous"
     session_id: Optional[str] = None
+    workflow_mode: Optional[Literal["two_agent", "fused"]] = None  # Per-request override of MINDMATE_WORKFLOW_MODE
 
 class ChatResponse(BaseModel):
     message: str
@@ -44,23 +95,62 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "mindmate-agent"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness (vs /health liveness): 503 until the graphs and model clients are built and warmed up"""
+    stats = startup.stats()
+    if not startup.ready:
+        return JSONResponse(status_code=503, content=stats)
+    return stats
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Per-worker cache sizes, memory estimates and hit/eviction counters"""
+    # Shared-state namespaces are counted in SQLite, so keep that off the event loop
+    return await asyncio.to_thread((await aget_workflow_instance()).cache_stats)
+
+@app.get("/stats/summarization")
+async def summarization_stats():
+    """Background summarization pool: queue depth, coalesced/rejected jobs, latency"""
+    return (await aget_workflow_instance()).summarization_stats()
+
+@app.get("/stats/llm")
+async def llm_stats():
+    """Outbound LLM client: circuit state, quota waits, hedged attempts, latency per model"""
+    return (await aget_workflow_instance()).llm_stats()
+
+@app.get("/stats/admission")
+async def admission_stats():
+    """Admission control: in-flight/queued turns, degraded and shed counts, queue wait per priority"""
+    return (await aget_workflow_instance()).admission_stats()
+
+@app.get("/stats/risk")
+async def risk_stats():
+    """Local risk triage: turns checked/flagged, loaded rules version, rule reloads and failures"""
+    return (await aget_workflow_instance()).risk_stats()
+
+@app.get("/stats/batching")
+async def batching_stats():
+    """Micro-batched LLM calls: batch-size histogram, queue wait, batch latency"""
+    return (await aget_workflow_instance()).batching_stats()
+
+@app.get("/stats/logging")
+async def log_stats():
+    """Log events kept/sampled out/dropped, time spent logging on request threads vs the handler thread"""
+    return logging_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition: node/LLM latency histograms, token and fallback counters, queue and cache gauges"""
+    # Collectors call the stats() methods, some of which take locks or query SQLite
+    body = await asyncio.to_thread(REGISTRY.render)
+    return Response(content=body, media_type=CONTENT_TYPE)
+
 @app.post("/chat")
 async def process_chat(request: ChatRequest):
     try:
-        logger.info(f"🚀 [MAIN] Processing chat request for user: {request.user_id}")
-        logger.info(f"📊 [MAIN] Context received:")
-        logger.info(f"  - User activities: {len(request.user_activities or [])}")
-        logger.info(f"  - Recent messages: {len(request.recent_messages or [])}")
-        logger.info(f"  - Voice analysis: {'✅ Provided' if request.voice_analysis else '❌ Not provided'}")
-        
-        if request.voice_analysis:
-            logger.info(f"🎤 [MAIN] Voice analysis details:")
-            logger.info(f"  - Emotional tone: {request.voice_analysis.get('emotional_tone', 'unknown')}")
-            logger.info(f"  - Stress level: {request.voice_analysis.get('stress_level', 'unknown')}")
-            logger.info(f"  - Confidence score: {request.voice_analysis.get('confidence_score', 'unknown')}")
-        
         # Process with the workflow including voice analysis
-        result = process_user_chat(
+        result = await aprocess_user_chat(
             user_message=request.user_message,
             recent_messages=request.recent_messages or [],
             conversation_summary=request.conversation_summary or {},
@@ -68,17 +158,89 @@ async def process_chat(request: ChatRequest):
             user_patterns=request.user_patterns or {},
             voice_analysis=request.voice_analysis or {},  # Pass voice analysis
             user_id=request.user_id,
-            session_id=request.session_id
+            session_id=request.session_id,
+            workflow_mode=request.workflow_mode
         )
-        
-        logger.info(f"✅ [MAIN] Chat processing completed successfully")
-        logger.info(f"📝 [MAIN] Response length: {len(result.get('message', ''))} characters")
         return result
         
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503, detail=f"Server busy ({e.reason}), please retry",
+            headers={"Retry-After": str(int(e.retry_after))}
+        )
+    except LLMUnavailable as e:
+        raise HTTPException(
+            status_code=503, detail=f"Model temporarily unavailable: {e}",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
     except Exception as e:
-        logger.error(f"❌ [MAIN] Error processing chat: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+@app.post("/chat/stream")
+async def stream_chat(request: ChatRequest):
+    """Server-Sent Events variant of /chat: `token` events with reply text, then one `done` event"""
+    events = astream_user_chat(
+        user_message=request.user_message,
+        recent_messages=request.recent_messages or [],
+        conversation_summary=request.conversation_summary or {},
+        user_activities=request.user_activities or [],
+        user_patterns=request.user_patterns or {},
+        voice_analysis=request.voice_analysis or {},
+        user_id=request.user_id,
+        session_id=request.session_id,
+        workflow_mode=request.workflow_mode
+    )
+    
+    # Wait for the first event before sending headers, so a shed turn can still get a real 503
+    try:
+        first_event = await events.__anext__()
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503, detail=f"Server busy ({e.reason}), please retry",
+            headers={"Retry-After": str(int(e.retry_after))}
+        )
+    except LLMUnavailable as e:
+        raise HTTPException(
+            status_code=503, detail=f"Model temporarily unavailable: {e}",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
+    except Exception as e:
+        first_event = e
+    
+    async def event_source():
+        try:
+            if isinstance(first_event, Exception):
+                raise first_event
+            yield format_sse_event(*first_event)
+            async for event, data in events:
+                yield format_sse_event(event, data)
+        except Exception as e:
+            # Headers are already sent, so failures are reported in-band
+            yield format_sse_event("error", {"detail": f"Chat processing failed: {str(e)}"})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/voice/analyze")
+async def analyze_voice(request: Request, sample_rate: int = 16000, channels: int = 1):
+    """Prosodic voice features for a recording (WAV, or raw 16-bit LE PCM at `sample_rate`), analysed as it uploads.
+
+    Returns a `voice_analysis` dict to send along with the transcript to /chat.
+    """
+    stream = VoiceAnalysisStream(sample_rate=sample_rate, channels=channels)
+    try:
+        async for chunk in request.stream():
+            # ~2 ms of NumPy per second of audio; off the event loop all the same
+            await asyncio.to_thread(stream.feed, chunk)
+        return stream.finish()
+    except VoiceTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except VoiceInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
@@ -0,0 +1,209 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_cache import hashed_ngram_vector, normalize_message
+
+# Function words (English + Hinglish) carry most of the shared trigrams between unrelated
+# messages; dropping them before hashing leaves the topic words ("riya", "placement", "bruno")
+STOPWORDS = frozenset("""
+a an the and or but if so to of in on at for from with about as by is am are was were be been being
+i me my mine we our you your he him his she her they them their it its this that these those
+what which who whom do does did have has had will would can could should just really very much too
+not no also then than there here when where how why all any some more most im ive dont cant didnt
+doesnt isnt wasnt thing things get got go going went make made feel feeling felt like know think
+now still even ever again back one keep keeps kept thinking want wanted need tell told say said time day days lot
+main mera meri mere mujhe mai hai hain tha thi ho hoon hun ka ki ke ko se me mein par aur ya bhi
+toh kya nahi na yaar bhai ab abhi kuch bahut
+""".split())
+
+# Messages with fewer content words than this ("ok", "thanks yaar") are not worth a row
+MIN_CONTENT_WORDS = 2
+# Stored text per chunk; the context planner truncates further to the prompt budget
+CHUNK_MAX_CHARS = 400
+
+
+def content_text(text: str) -> str:
+    """Normalized text with stopwords and 1-2 letter words removed (what gets embedded)"""
+    return " ".join(word for word in normalize_message(text).split() if len(word) > 2 and word not in STOPWORDS)
+
+
+def chunk_key(role: str, text: str) -> int:
+    """Content key: the same message arriving again in a later client window is indexed once"""
+    return zlib.crc32(f"{role}\x1f{' '.join(text.lower().split())}".encode("utf-8"))
+
+
+class _UserIndex:
+    """One user's chunks: an over-allocated float32 matrix plus parallel metadata lists"""
+
+    __slots__ = ("matrix", "size", "chunks", "keys", "touched")
+
+    def __init__(self, dims: int, capacity: int = 64):
+        self.matrix = np.zeros((capacity, dims), dtype=np.float32)
+        self.size = 0
+        self.chunks: List[Dict[str, Any]] = []
+        self.keys: Dict[int, None] = {}
+        self.touched = time.monotonic()
+
+
+class MemoryIndex:
+    """Per-user retrieval index over past messages and summary insights.
+
+    Each chunk is embedded locally as a hashed character n-gram vector of its
+    content words and appended as one row of the user's matrix (capacity
+    doubles, so appends are amortized O(1)). A query is one matrix-vector
+    product plus an argpartition for the top k, about 1 ms at 10k rows.
+    Searches work on a snapshot of (matrix, size): appends only write rows past
+    it and growth or trimming swaps in new arrays, so the product runs outside
+    the lock.
+
+    Bounded per user (the oldest quarter is dropped when full) and in total
+    rows across users (least recently used users are dropped first).
+    """
+
+    def __init__(
+        self,
+        dims: int = 256,
+        max_rows_per_user: int = 20000,
+        max_total_rows: int = 200000,
+        max_users: int = 4096,
+        min_similarity: float = 0.2
+    ):
+        self.dims = dims
+        self.max_rows_per_user = max_rows_per_user
+        self.max_total_rows = max_total_rows
+        self.max_users = max_users
+        self.min_similarity = min_similarity
+        self._users: "OrderedDict[str, _UserIndex]" = OrderedDict()
+        self._total_rows = 0
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "hits": 0, "added": 0, "duplicates": 0, "skipped_short": 0,
+                       "trimmed": 0, "evicted_users": 0}
+
+    def add(self, user_id: str, items: Iterable[Dict[str, Any]]) -> int:
+        """Index {"text", "role", "kind"[, "timestamp"]} items; returns how many were new"""
+        fresh: List[Tuple[int, Dict[str, Any], str]] = []
+        seen = set()
+        with self._lock:
+            index = self._users.get(user_id)
+            known = index.keys if index is not None else {}
+            for item in items:
+                text = " ".join(str(item.get("text") or "").split())
+                role = item.get("role", "user")
+                key = chunk_key(role, text)
+                if key in known or key in seen:
+                    self._stats["duplicates"] += 1
+                    continue
+                content = content_text(text)
+                if len(content.split()) < MIN_CONTENT_WORDS:
+                    self._stats["skipped_short"] += 1
+                    continue
+                chunk = {"text": text[:CHUNK_MAX_CHARS], "role": role, "kind": item.get("kind", "message"),
+                         "timestamp": item.get("timestamp") or time.time()}
+                fresh.append((key, chunk, content))
+                seen.add(key)
+        if not fresh:
+            return 0
+
+        # Embedding is the expensive part; done outside the lock
+        vectors = np.stack([hashed_ngram_vector(content, self.dims) for _, _, content in fresh])
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                index = self._users[user_id] = _UserIndex(self.dims)
+            else:
+                self._users.move_to_end(user_id)
+            index.touched = time.monotonic()
+            added = 0
+            for (key, chunk, _), vector in zip(fresh, vectors):
+                if key in index.keys:
+                    continue
+                self._append(index, key, chunk, vector)
+                added += 1
+            self._stats["added"] += added
+            self._enforce_bounds(user_id)
+            return added
+
+    def search(
+        self, user_id: str, query: str, k: int = 4, exclude: Optional[Iterable[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k past chunks by cosine similarity to `query`, best first, skipping `exclude` items"""
+        content = content_text(query)
+        with self._lock:
+            self._stats["searches"] += 1
+            index = self._users.get(user_id)
+            if index is None or not content:
+                return []
+            index.touched = time.monotonic()
+            matrix, size, chunks = index.matrix, index.size, index.chunks
+        if not size:
+            return []
+
+        scores = matrix[:size] @ hashed_ngram_vector(content, self.dims)
+        # Messages already in the prompt's recent window (and the message itself) are not worth repeating
+        skip = {chunk_key(item.get("role", "user"), item.get("text") or "") for item in (exclude or ())}
+        skip.add(chunk_key("user", query))
+        wanted = min(k + len(skip), size)
+        candidates = np.argpartition(-scores, wanted - 1)[:wanted] if wanted < size else np.arange(size)
+        hits = []
+        for row in candidates[np.argsort(-scores[candidates])]:
+            score = float(scores[row])
+            if score < self.min_similarity or len(hits) >= k:
+                break
+            chunk = chunks[row]
+            if chunk["key"] in skip:
+                continue
+            hits.append({"text": chunk["text"], "role": chunk["role"], "kind": chunk["kind"],
+                         "timestamp": chunk["timestamp"], "score": round(score, 3)})
+        with self._lock:
+            self._stats["hits"] += len(hits)
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "users": len(self._users),
+                "entries": self._total_rows,
+                "bytes": sum(index.matrix.nbytes for index in self._users.values()),
+                "dims": self.dims
+            }
+
+    def _append(self, index: _UserIndex, key: int, chunk: Dict[str, Any], vector: np.ndarray) -> None:
+        if index.size == len(index.matrix):
+            # New array, so searches still reading the old one are unaffected
+            grown = np.zeros((len(index.matrix) * 2, self.dims), dtype=np.float32)
+            grown[:index.size] = index.matrix[:index.size]
+            index.matrix = grown
+        index.matrix[index.size] = vector
+        index.chunks.append({**chunk, "key": key})
+        index.keys[key] = None
+        index.size += 1
+        self._total_rows += 1
+
+    def _enforce_bounds(self, user_id: str) -> None:
+        index = self._users[user_id]
+        if index.size > self.max_rows_per_user:
+            self._trim(index, index.size - self.max_rows_per_user * 3 // 4)
+        while len(self._users) > self.max_users or (self._total_rows > self.max_total_rows and len(self._users) > 1):
+            oldest_id, oldest = next(iter(self._users.items()))
+            if oldest_id == user_id:
+                break
+            del self._users[oldest_id]
+            self._total_rows -= oldest.size
+            self._stats["evicted_users"] += 1
+
+    def _trim(self, index: _UserIndex, drop: int) -> None:
+        """Drop the `drop` oldest chunks (a quarter at a time, so trimming stays amortized)"""
+        keep = index.size - drop
+        matrix = np.zeros((max(keep * 2, 64), self.dims), dtype=np.float32)
+        matrix[:keep] = index.matrix[drop:index.size]
+        for chunk in index.chunks[:drop]:
+            index.keys.pop(chunk["key"], None)
+        index.matrix, index.chunks, index.size = matrix, index.chunks[drop:], keep
+        self._total_rows -= drop
+        self._stats["trimmed"] += drop
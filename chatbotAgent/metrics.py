@@ -0,0 +1,273 @@
+import bisect
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers the sub-millisecond router up to a timed-out 30s model call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Graph node currently executing in this task (set by the workflow's node wrapper); labels LLM token counters
+_current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("metrics_stage", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def current_stage(default: str) -> str:
+    return _current_stage.get() or default
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Shards:
+    """Per-thread value arrays: each writer thread only touches its own list, so updates take no lock.
+
+    A scrape sums all shards; it may miss an increment racing with it, which a
+    monotonically increasing counter catches up on at the next scrape. Shards of
+    finished threads are kept so counts never go backwards.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self._local = threading.local()
+        self._all: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def mine(self) -> List[float]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0.0] * self.width
+            with self._lock:
+                self._all.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._all)
+        return [sum(column) for column in zip(*shards)] if shards else [0.0] * self.width
+
+
+class _CounterChild:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shards.mine()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "_shards")
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        # One slot per bucket, one for +Inf, then the running sum
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        shard = self._shards.mine()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Tuple[List[float], float]:
+        """(cumulative bucket counts incl. +Inf, sum)"""
+        totals = self._shards.totals()
+        cumulative, running = [], 0.0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Any:
+        """Child for one label combination; creation is the only locked step"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def _items(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            children = list(self._children.items())
+        return [(dict(zip(self.labelnames, key)), child) for key, child in children]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def values(self) -> List[Tuple[Dict[str, str], float]]:
+        return [(labels, child.value()) for labels, child in self._items()]
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.value())}" for labels, child in self._items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, child in self._items():
+            cumulative, total = child.snapshot()
+            for bound, count in zip(self.buckets + (float("inf"),), cumulative):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {_format_value(count)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(cumulative[-1])}")
+        return lines
+
+
+# A scrape-time family produced by a collector: (name, kind, documentation, [(labels, value), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class MetricsRegistry:
+    """Metrics rendered in the Prometheus text format.
+
+    Hot-path metrics (counters, histograms) are updated lock-free on per-thread
+    shards. Point-in-time values that components already track (queue depths,
+    cache sizes, circuit state) are not duplicated: collectors registered under a
+    name read them from the existing ``stats()`` methods at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Family]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, name: str, collect: Callable[[], Iterable[Family]]) -> None:
+        """Add (or replace, e.g. for a re-created workflow) a scrape-time collector"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in collectors:
+            for name, kind, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+# HTTP layer
+HTTP_REQUESTS = REGISTRY.counter("mindmate_http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("mindmate_http_request_duration_seconds", "Time to response headers by route", ("method", "route"))
+
+# Chat turns (entry points, so streamed and non-streamed turns are both covered end to end)
+TURNS = REGISTRY.counter("mindmate_turns_total", "Chat turns by entry point and outcome (ok/shed/unavailable/error)", ("entry", "outcome"))
+TURN_SECONDS = REGISTRY.histogram("mindmate_turn_duration_seconds", "End-to-end chat turn latency", ("entry",))
+
+# Graph nodes and model calls
+NODE_SECONDS = REGISTRY.histogram("mindmate_node_duration_seconds", "LangGraph node latency", ("node",))
+NODE_ERRORS = REGISTRY.counter("mindmate_node_errors_total", "LangGraph nodes that raised", ("node",))
+LLM_CALL_SECONDS = REGISTRY.histogram("mindmate_llm_call_duration_seconds", "Model call latency incl. quota wait and hedging", ("model", "outcome"))
+LLM_INPUT_TOKENS = REGISTRY.counter("mindmate_llm_input_tokens_total", "Estimated prompt tokens sent, by stage", ("stage",))
+LLM_OUTPUT_TOKENS = REGISTRY.counter("mindmate_llm_output_tokens_total", "Estimated completion tokens received, by stage", ("stage",))
+STRUCTURED_OUTPUT_FAILURES = REGISTRY.counter(
+    "mindmate_structured_output_failures_total", "Structured-output calls that returned no usable object", ("stage",)
+)
+FALLBACKS = REGISTRY.counter("mindmate_fallbacks_total", "Degraded paths taken instead of the normal one", ("stage", "reason"))
+
+# Local risk triage of each message before any model call (see risk_triage.py)
+RISK_TRIAGE_SECONDS = REGISTRY.histogram(
+    "mindmate_risk_triage_duration_seconds", "Risk phrase matching time per message",
+    buckets=(1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3)
+)
+RISK_FLAGS = REGISTRY.counter("mindmate_risk_flags_total", "Messages flagged by risk triage, by level and rule category", ("level", "category"))
+
+# Logging overhead (see structured_logging.py)
+LOG_EVENTS = REGISTRY.counter("mindmate_log_events_total", "Log events by level and outcome: emitted, sampled_out, or dropped by a full handler queue (also counted as emitted)", ("level", "outcome"))
+LOG_CALL_SECONDS = REGISTRY.counter("mindmate_log_call_seconds_total", "Time spent in log_event on the calling (request) thread")
+LOG_HANDLER_CPU_SECONDS = REGISTRY.counter("mindmate_log_handler_cpu_seconds_total", "CPU time the log handler spent formatting and writing")
+
+
+def samples(stats: Dict[str, Any], keys: Iterable[str], labels: Dict[str, str]) -> List[Tuple[Dict[str, str], float]]:
+    """(labels, value) pairs for the numeric keys present in a stats() dict"""
+    return [(labels, stats[key]) for key in keys if isinstance(stats.get(key), (int, float))]
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class MicroBatcher:
+    """Collects concurrent calls to one runnable and sends them through ``runnable.batch``.
+
+    A dispatcher thread opens a batch on the first queued call and closes it after
+    ``max_wait_ms`` or ``max_batch`` calls, whichever comes first. At most
+    ``max_concurrency`` batches are in flight; while they are, new calls keep
+    accumulating, so batches grow with load and stay at size 1 when idle. Each
+    caller gets its own result (or exception) back via a Future, from sync code
+    (``invoke``) or async code (``ainvoke``) alike, so it is a drop-in for the
+    structured-output runnables.
+    """
+
+    def __init__(
+        self,
+        runnable: Any,
+        name: str,
+        max_batch: int = 8,
+        max_wait_ms: float = 5.0,
+        max_concurrency: int = 4
+    ):
+        self.runnable = runnable
+        self.name = name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self._queue: "deque[tuple]" = deque()  # (input, future, enqueued_at)
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"batch-{name}")
+        self._stopping = False
+        self._batch_sizes: Dict[int, int] = {}
+        self._queue_wait = deque(maxlen=512)
+        self._batch_latency = deque(maxlen=512)
+        self._counters = {"calls": 0, "batches": 0, "errors": 0, "cancelled": 0}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name=f"batcher-{name}", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, input: Any) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError(f"MicroBatcher '{self.name}' is shut down")
+            self._queue.append((input, future, time.perf_counter()))
+            self._counters["calls"] += 1
+            self._cond.notify()
+        return future
+
+    def invoke(self, input: Any, config: Optional[Dict[str, Any]] = None) -> Any:
+        return self.submit(input).result()
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None) -> Any:
+        return await asyncio.wrap_future(self.submit(input))
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Stop accepting calls, flush what is queued and wait for in-flight batches"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._dispatcher.join(timeout=timeout)
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queue_wait = list(self._queue_wait)
+            latency = list(self._batch_latency)
+            batches = self._counters["batches"]
+            return {
+                "name": self.name,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": len(self._queue),
+                **self._counters,
+                "mean_batch_size": round(self._counters["calls"] / batches, 2) if batches else None,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_ms": {"p50": _percentile(queue_wait, 0.5), "p95": _percentile(queue_wait, 0.95)},
+                "batch_latency_ms": {"p50": _percentile(latency, 0.5), "p95": _percentile(latency, 0.95)}
+            }
+
+    def _collect(self) -> List[tuple]:
+        """Block for the first call, then gather more until the batch is full or max_wait passes"""
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch and not self._stopping:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+            return [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            # Wait for a free slot first: calls arriving meanwhile join the next batch
+            self._slots.acquire()
+            batch = self._collect()
+            if not batch:
+                self._slots.release()
+                return
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]) -> None:
+        started = time.perf_counter()
+        errors = 0
+        # Callers that gave up while queued (deadline, losing hedge, disconnect) are dropped; the rest
+        # are marked running, so a later cancel can no longer make set_result raise
+        live = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        try:
+            if not live:
+                return
+            inputs = [item[0] for item in live]
+            try:
+                results = self.runnable.batch(
+                    inputs, config={"max_concurrency": len(inputs)}, return_exceptions=True
+                )
+            except Exception as e:
+                results = [e] * len(live)
+
+            for (_, future, _), result in zip(live, results):
+                if isinstance(result, Exception):
+                    errors += 1
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            with self._cond:
+                self._counters["batches"] += 1
+                self._counters["errors"] += errors
+                self._counters["cancelled"] += len(batch) - len(live)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._queue_wait.extend(round((started - item[2]) * 1000, 2) for item in batch)
+                self._batch_latency.append(round((time.perf_counter() - started) * 1000, 1))
+            self._slots.release()
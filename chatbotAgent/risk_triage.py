@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+# Triage levels; anything above none keeps the turn off the fast path
+RISK_NONE = "none"
+RISK_ELEVATED = "elevated"
+RISK_HIGH = "high"
+RISK_CRITICAL = "critical"
+RISK_SEVERITY = {RISK_NONE: 0, RISK_ELEVATED: 1, RISK_HIGH: 2, RISK_CRITICAL: 3}
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_rules.json")
+
+# Matched phrases reported per turn (the level comes from all of them)
+MAX_REPORTED_MATCHES = 5
+
+_TOKEN = re.compile("[a-z0-9\u0900-\u097f]+")
+_LATIN_MARKS = re.compile("[\u0300-\u036f]")
+# Devanagari: drop the nukta (ज़ = ज), chandrabindu -> anusvara (हूँ = हूं)
+_DEVANAGARI_FOLD = str.maketrans({"\u093c": None, "\u0901": "\u0902"})
+# Hinglish spelling variants: zindagi/jindagi, wo/vo, qatal/katal (applied to input and rules alike)
+_LATIN_FOLD = str.maketrans({"z": "j", "w": "v", "q": "k", "'": None, "\u2019": None})
+_ELONGATION = re.compile(r"(.)\1{2,}")
+_DOUBLE = re.compile(r"(.)\1")
+# Long vowels spelled doubled inside a word: "jeena" -> "jina", "hoon" -> "hun" (a trailing "dieee" stays "die")
+_LONG_E = re.compile(r"ee(?=[a-z])")
+_LONG_O = re.compile(r"oo(?=[a-z])")
+
+# Folded tokens per whitespace-separated chunk; words repeat a lot, so most chunks skip the regex passes
+_FOLD_CACHE_SIZE = 50_000
+_folded: Dict[str, Tuple[str, ...]] = {}
+
+
+def _fold(chunk: str) -> Tuple[str, ...]:
+    """Tokens of one chunk, folded: "can't," -> ("cant",), "maaaarna" -> ("marna",), "self-harm" -> ("self", "harm")"""
+    tokens = []
+    for token in _TOKEN.findall(chunk.translate(_LATIN_FOLD)):
+        token = _LONG_O.sub("u", _LONG_E.sub("i", _ELONGATION.sub(r"\1\1", token)))
+        tokens.append(_DOUBLE.sub(r"\1", token.replace("ph", "f")))
+    if len(_folded) >= _FOLD_CACHE_SIZE:
+        _folded.clear()
+    folded = _folded[chunk] = tuple(tokens)
+    return folded
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercased, transliteration-folded word tokens"""
+    text = text.lower()
+    if not text.isascii():
+        text = _LATIN_MARKS.sub("", unicodedata.normalize("NFKD", text)).translate(_DEVANAGARI_FOLD)
+    folded = _folded
+    tokens: List[str] = []
+    for chunk in text.split():
+        parts = folded.get(chunk)
+        tokens.extend(parts if parts is not None else _fold(chunk))
+    return tokens
+
+
+class RiskMatcher:
+    """Aho-Corasick automaton over normalized word tokens, compiled from one rule set.
+
+    Phrases match on whole tokens (so "skill" never matches "kill"). Input
+    tokens are mapped to ids through one dict lookup, with aliases ("sucide",
+    "nhi", "khtm") expanding to their canonical tokens; a token that appears in
+    no rule resets the automaton, so ordinary text costs a lookup per word.
+    Immutable once built: a reload compiles a new matcher and swaps it in.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        self.version = str(rules.get("version", "unversioned"))
+        vocabulary: Dict[str, int] = {}
+        # Per pattern: (phrase as written, category, level)
+        self.patterns: List[Tuple[str, str, str]] = []
+        sequences: List[Tuple[int, ...]] = []
+        # Single-token spellings -> canonical tokens ("selfharm" -> "self harm")
+        aliases: Dict[str, List[str]] = {}
+        for key, value in (rules.get("aliases") or {}).items():
+            key_tokens = normalize_tokens(key)
+            if len(key_tokens) != 1:
+                raise ValueError(f"Risk rule alias {key!r} must be a single word")
+            aliases[key_tokens[0]] = normalize_tokens(value)
+        for rule in rules.get("rules", []):
+            level = rule.get("level")
+            if level not in RISK_SEVERITY or level == RISK_NONE:
+                raise ValueError(f"Risk rule {rule.get('category')!r} has invalid level {level!r}")
+            for phrase in rule.get("phrases", []):
+                tokens = [part for token in normalize_tokens(phrase) for part in aliases.get(token, [token])]
+                if not tokens:
+                    continue
+                sequences.append(tuple(vocabulary.setdefault(token, len(vocabulary)) for token in tokens))
+                self.patterns.append((phrase, rule.get("category", "unspecified"), level))
+
+        # Input token -> token ids; -1 marks alias parts that appear in no rule
+        self.lexicon: Dict[str, Tuple[int, ...]] = {token: (index,) for token, index in vocabulary.items()}
+        for alias, tokens in aliases.items():
+            self.lexicon[alias] = tuple(vocabulary.get(token, -1) for token in tokens)
+        self._compile(sequences)
+
+    def _compile(self, sequences: List[Tuple[int, ...]]) -> None:
+        self.goto: List[Dict[int, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for pattern_index, sequence in enumerate(sequences):
+            state = 0
+            for token_id in sequence:
+                nxt = self.goto[state].get(token_id)
+                if nxt is None:
+                    nxt = self.goto[state][token_id] = len(self.goto)
+                    self.goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(pattern_index)
+
+        # Breadth-first failure links; each state's output includes its failure chain's
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token_id, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and token_id not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                candidate = self.goto[fallback].get(token_id, 0)
+                self.fail[nxt] = candidate if candidate != nxt else 0
+                outputs[nxt].extend(outputs[self.fail[nxt]])
+        self.outputs = [tuple(output) for output in outputs]
+
+    def match(self, tokens: List[str]) -> List[int]:
+        """Indices into `patterns` of every phrase occurring in the token stream"""
+        lexicon, goto, fail, outputs = self.lexicon, self.goto, self.fail, self.outputs
+        hits: List[int] = []
+        state = 0
+        for token in tokens:
+            ids = lexicon.get(token)
+            if ids is None:
+                state = 0
+                continue
+            for token_id in ids:
+                if token_id < 0:
+                    state = 0
+                    continue
+                while state and token_id not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token_id, 0)
+                if outputs[state]:
+                    hits.extend(outputs[state])
+        return hits
+
+
+class RiskTriage:
+    """Local, pre-LLM risk triage of a user message against the phrase rules file.
+
+    The rules file (JSON) is re-checked at most every ``reload_seconds`` and
+    recompiled when its mtime or size changes; a file that fails to load or
+    compile is logged and the previous matcher stays in use.
+    """
+
+    def __init__(self, rules_path: str = DEFAULT_RULES_PATH, reload_seconds: float = 5.0):
+        self.rules_path = rules_path
+        self.reload_seconds = reload_seconds
+        self._signature: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._stats = {"turns": 0, "flagged": 0, "reloads": 0, "reload_failures": 0}
+        self.matcher = self._load()
+
+    def assess(self, text: str) -> Dict[str, Any]:
+        """{"level", "categories", "matches", "rules_version", "elapsed_us"} for one message"""
+        started = time.perf_counter()
+        if self.reload_seconds > 0 and started >= self._next_check:
+            self._maybe_reload(started)
+        matcher = self.matcher
+        hits = matcher.match(normalize_tokens(text)) if text else []
+        level, categories, matches = RISK_NONE, [], []
+        for index in sorted(set(hits), key=lambda i: -RISK_SEVERITY[matcher.patterns[i][2]]):
+            phrase, category, pattern_level = matcher.patterns[index]
+            if RISK_SEVERITY[pattern_level] > RISK_SEVERITY[level]:
+                level = pattern_level
+            if category not in categories:
+                categories.append(category)
+            if len(matches) < MAX_REPORTED_MATCHES:
+                matches.append(phrase)
+        self._stats["turns"] += 1
+        if level != RISK_NONE:
+            self._stats["flagged"] += 1
+        return {
+            "level": level,
+            "categories": categories,
+            "matches": matches,
+            "rules_version": matcher.version,
+            "elapsed_us": round((time.perf_counter() - started) * 1_000_000, 1)
+        }
+
+    def reload(self) -> bool:
+        """Recompile from the rules file now; False (old rules kept) if it does not load"""
+        try:
+            matcher = self._load()
+        except Exception as e:
+            self._stats["reload_failures"] += 1
+            log_event(logger, "risk_rules.reload_failed", logging.ERROR, path=self.rules_path,
+                      error=f"{type(e).__name__}: {e}"[:300], rules_version=self.matcher.version)
+            return False
+        self.matcher = matcher
+        self._stats["reloads"] += 1
+        log_event(logger, "risk_rules.reloaded", path=self.rules_path, rules_version=matcher.version,
+                  patterns=len(matcher.patterns))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "rules_path": self.rules_path,
+            "rules_version": self.matcher.version,
+            "patterns": len(self.matcher.patterns),
+            "states": len(self.matcher.goto)
+        }
+
+    def _maybe_reload(self, now: float) -> None:
+        # One request per interval pays for the stat(); the rest keep matching with the current rules
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.reload_seconds
+            try:
+                stat = os.stat(self.rules_path)
+            except OSError:
+                return
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature != self._signature:
+                # Remember it even if the reload fails, so a broken file is reported once, not every interval
+                self._signature = signature
+                self.reload()
+        finally:
+            self._reload_lock.release()
+
+    def _load(self) -> RiskMatcher:
+        stat = os.stat(self.rules_path)
+        with open(self.rules_path, encoding="utf-8") as f:
+            matcher = RiskMatcher(json.load(f))
+        self._signature = (stat.st_mtime_ns, stat.st_size)
+        return matcher
@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    total_chars INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    summarized_count INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteSessionStore:
+    """Append-only per-session message log with rolling counters, backed by SQLite (WAL).
+
+    Messages are addressed by (session_id, seq), so reading the latest window or
+    everything after a given position is an index range scan whose cost depends
+    on the rows returned, not on how long the session is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def load_context(self, session_id: str, window: int) -> Dict[str, Any]:
+        """Latest `window` messages (oldest first), rolling counters and the stored summary"""
+        conn = self._connection()
+        session = conn.execute(
+            "SELECT message_count, total_chars, summary, summarized_count FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if session is None:
+            return {"recent_messages": [], "message_count": 0, "total_chars": 0, "summary": {}, "summarized_count": 0}
+
+        rows = conn.execute(
+            "SELECT role, content, created_at FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+            (session_id, max(session["message_count"] - window, 0))
+        ).fetchall()
+        return {
+            "recent_messages": [dict(row) for row in rows],
+            "message_count": session["message_count"],
+            "total_chars": session["total_chars"],
+            "summary": json.loads(session["summary"]) if session["summary"] else {},
+            "summarized_count": session["summarized_count"]
+        }
+
+    def append_messages(self, session_id: str, user_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Append messages to the session log; returns the new message_count"""
+        conn = self._connection()
+        now = datetime.now().isoformat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            start = row["message_count"] if row else 0
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (session_id, start + i, msg.get("role", "user"), msg.get("content", ""), msg.get("created_at") or now)
+                    for i, msg in enumerate(messages)
+                ]
+            )
+            added_chars = sum(len(msg.get("content", "")) for msg in messages)
+            conn.execute(
+                """INSERT INTO sessions (session_id, user_id, message_count, total_chars, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET
+                       message_count = message_count + excluded.message_count,
+                       total_chars = total_chars + excluded.total_chars,
+                       user_id = excluded.user_id,
+                       updated_at = excluded.updated_at""",
+                (session_id, user_id, len(messages), added_chars, time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return start + len(messages)
+
+    def messages_since(self, session_id: str, seq: int, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """Up to `limit` most recent messages with position >= seq; returns (first_seq, messages)"""
+        rows = self._connection().execute(
+            "SELECT seq, role, content, created_at FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq DESC LIMIT ?",
+            (session_id, seq, limit)
+        ).fetchall()
+        rows.reverse()
+        first_seq = rows[0]["seq"] if rows else seq
+        return first_seq, [{"role": r["role"], "content": r["content"], "created_at": r["created_at"]} for r in rows]
+
+    def save_summary(self, session_id: str, summary: Dict[str, Any], summarized_count: int) -> None:
+        self._connection().execute(
+            "UPDATE sessions SET summary = ?, summarized_count = ?, updated_at = ? WHERE session_id = ?",
+            (json.dumps(summary, ensure_ascii=False), summarized_count, time.time(), session_id)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._connection().execute(
+            "SELECT COUNT(*) AS sessions, COALESCE(SUM(message_count), 0) AS messages FROM sessions"
+        ).fetchone()
+        return {"backend": "sqlite", "path": self.path, "sessions": row["sessions"], "messages": row["messages"]}
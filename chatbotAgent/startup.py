@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+STOPPING = "stopping"
+
+
+class StartupState:
+    """Readiness of this worker, separate from liveness (/health).
+
+    The app's lifespan runs ``run()`` in the background: the port is open and
+    /health answers while the workflow is built and warmed up, and /ready only
+    turns true once the graphs and model clients exist. A failed build is
+    retried every ``retry_seconds`` and the worker stays unready meanwhile;
+    shutdown flips it back to unready so load balancers drain it first.
+    """
+
+    def __init__(self):
+        self.status = STARTING
+        self.error: Optional[str] = None
+        # Seconds per startup phase (import, build, warmup)
+        self.phases: Dict[str, float] = {}
+        self.build_timings: Dict[str, float] = {}
+        self.warmup: Optional[Dict[str, Any]] = None
+        self._created = time.perf_counter()
+        self.ready_after_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 3)
+
+    async def run(self, build: Callable[[], Awaitable[Any]], warmup_mode: str = "none", retry_seconds: float = 5.0) -> None:
+        while True:
+            try:
+                with self.phase("build"):
+                    workflow = await build()
+                self.build_timings = dict(getattr(workflow, "build_timings", {}))
+                if warmup_mode != "none":
+                    self.status = WARMING
+                    with self.phase("warmup"):
+                        self.warmup = await workflow.warmup(warmup_mode)
+                break
+            except Exception as e:
+                self.status = FAILED
+                self.error = f"{type(e).__name__}: {e}"[:500]
+                log_event(logger, "startup.failed", logging.ERROR, error=self.error, phases=self.phases,
+                          retry_seconds=retry_seconds)
+                await asyncio.sleep(retry_seconds)
+        self.status = READY
+        self.error = None
+        self.ready_after_seconds = round(time.perf_counter() - self._created, 3)
+        log_event(logger, "startup.ready", ready_after_seconds=self.ready_after_seconds, phases=self.phases,
+                  build_ms=self.build_timings, warmup=self.warmup)
+
+    def stopping(self) -> None:
+        self.status = STOPPING
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "error": self.error,
+            "ready_after_seconds": self.ready_after_seconds,
+            "phases_seconds": self.phases,
+            "build_ms": self.build_timings,
+            "warmup": self.warmup
+        }
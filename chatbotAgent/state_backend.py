@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional
+
+from ttl_cache import BoundedTTLCache
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS kv_expiry ON kv (namespace, expires_at);
+
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+_MISSING = object()
+
+
+class InProcessStateBackend:
+    """Default backend: every worker keeps its own bounded in-memory caches"""
+
+    name = "memory"
+
+    def cache(self, name: str, max_entries: int, max_bytes: int, ttl_seconds: float) -> BoundedTTLCache:
+        return BoundedTTLCache(name, max_entries, max_bytes, ttl_seconds)
+
+    def acquire_lease(self, key: str, ttl_seconds: float) -> bool:
+        # A single process always owns its users
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class SQLiteStateBackend:
+    """Host-wide shared state for several uvicorn workers, backed by one SQLite file in WAL mode"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = f"{os.getpid()}"
+        self._local = threading.local()
+        conn = self.connection()
+        conn.executescript(_SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def cache(self, name: str, max_entries: int, max_bytes: int, ttl_seconds: float) -> "SQLiteSharedCache":
+        return SQLiteSharedCache(self, name, max_entries, ttl_seconds)
+
+    def acquire_lease(self, key: str, ttl_seconds: float) -> bool:
+        """user_id affinity: the first worker to claim a key keeps it until the lease lapses"""
+        now = time.time()
+        cursor = self.connection().execute(
+            """INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+               WHERE leases.owner = excluded.owner OR leases.expires_at < ?""",
+            (key, self.owner, now + ttl_seconds, now)
+        )
+        return cursor.rowcount > 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "path": self.path, "owner": self.owner}
+
+
+class SQLiteSharedCache:
+    """BoundedTTLCache-compatible view of one namespace in the shared SQLite state file.
+
+    Values are stored as JSON and expire on wall-clock time (monotonic clocks are
+    per-process). Hit/miss counters are local to this worker.
+    """
+
+    def __init__(self, backend: SQLiteStateBackend, name: str, max_entries: int, ttl_seconds: float):
+        self.backend = backend
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._writes = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        row = self.backend.connection().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (self.name, str(key), time.time())
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return default
+            self._hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        self.backend.connection().execute(
+            """INSERT INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(namespace, key) DO UPDATE SET
+                   value = excluded.value, expires_at = excluded.expires_at, updated_at = excluded.updated_at""",
+            (self.name, str(key), json.dumps(value, ensure_ascii=False, default=str),
+             now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds), now)
+        )
+        self._after_write()
+
+    def advance(self, key: Hashable, value: int) -> bool:
+        """Atomically raise a counter to `value`; False if another worker already got there"""
+        now = time.time()
+        cursor = self.backend.connection().execute(
+            """INSERT INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(namespace, key) DO UPDATE SET
+                   value = excluded.value, expires_at = excluded.expires_at, updated_at = excluded.updated_at
+               WHERE kv.expires_at <= ? OR CAST(kv.value AS INTEGER) < CAST(excluded.value AS INTEGER)""",
+            (self.name, str(key), json.dumps(value), now + self.ttl_seconds, now, now)
+        )
+        self._after_write()
+        return cursor.rowcount > 0
+
+    def compare_and_set(self, key: Hashable, expected: Any, value: Any) -> bool:
+        """Atomically set `value` only while the key still holds `expected` (e.g. undo only our own claim)"""
+        now = time.time()
+        cursor = self.backend.connection().execute(
+            """UPDATE kv SET value = ?, expires_at = ?, updated_at = ?
+               WHERE namespace = ? AND key = ? AND value = ? AND expires_at > ?""",
+            (json.dumps(value, ensure_ascii=False, default=str), now + self.ttl_seconds, now,
+             self.name, str(key), json.dumps(expected, ensure_ascii=False, default=str), now)
+        )
+        self._after_write()
+        return cursor.rowcount > 0
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self.get(key, _MISSING)
+        self.backend.connection().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (self.name, str(key)))
+        return default if value is _MISSING else value
+
+    def __contains__(self, key: Hashable) -> bool:
+        row = self.backend.connection().execute(
+            "SELECT 1 FROM kv WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (self.name, str(key), time.time())
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self.backend.connection().execute(
+            "SELECT COUNT(*) FROM kv WHERE namespace = ?", (self.name,)
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self.backend.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM kv WHERE namespace = ? AND expires_at > ?",
+            (self.name, time.time())
+        ).fetchone()
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "backend": "sqlite",
+                "entries": entries,
+                "bytes": size,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions
+            }
+
+    def _after_write(self) -> None:
+        # Prune every so often rather than on every write: drop expired rows, then the oldest overflow
+        with self._lock:
+            self._writes += 1
+            if self._writes % 100:
+                return
+        conn = self.backend.connection()
+        conn.execute("DELETE FROM kv WHERE namespace = ? AND expires_at <= ?", (self.name, time.time()))
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                """DELETE FROM kv WHERE namespace = ? AND key IN (
+                       SELECT key FROM kv WHERE namespace = ? ORDER BY updated_at LIMIT ?)""",
+                (self.name, self.name, overflow)
+            )
+            with self._lock:
+                self._evictions += overflow
+
+
+def create_state_backend(kind: str, path: str):
+    """Factory for MINDMATE_STATE_BACKEND ("memory" or "sqlite")"""
+    if kind == "memory":
+        return InProcessStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(path)
+    raise ValueError(f"MINDMATE_STATE_BACKEND must be 'memory' or 'sqlite', got '{kind}'")
@@ -0,0 +1,68 @@
+import json
+from typing import Any, Callable, Dict, List
+
+
+class StreamingResponseCleaner:
+    """Incremental counterpart of MindMateWorkflow._clean_response for token streams.
+
+    Leading whitespace is dropped as it arrives and trailing whitespace is held
+    back until more text shows up. Replies that open with a quote or start like
+    JSON are buffered and cleaned in one go at the end: whether the opening
+    quote is stripped depends on how the reply ends (``"Exams" are not
+    everything`` keeps it), and emitted text cannot be taken back. The full
+    cleaned reply is always available from ``text``.
+    """
+
+    def __init__(self, clean_fn: Callable[[str], str]):
+        self._clean_fn = clean_fn
+        self._raw_parts: List[str] = []
+        self._pending = ""
+        self._checked_opening = False
+        self._started = False
+        self._buffer_all = False
+
+    def feed(self, chunk: str) -> str:
+        """Add a raw model chunk and return the cleaned text that is safe to emit now"""
+        if not chunk:
+            return ""
+        self._raw_parts.append(chunk)
+        if self._buffer_all:
+            return ""
+
+        text = self._pending + chunk
+        self._pending = ""
+
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            if not self._checked_opening:
+                self._checked_opening = True
+                if text[0] in '{["':
+                    # Quoted or JSON-looking reply: can only be unwrapped once complete
+                    self._buffer_all = True
+                    return ""
+            self._started = True
+
+        # Hold back trailing whitespace until we know it is not the end
+        stripped = text.rstrip()
+        self._pending = text[len(stripped):]
+        return stripped
+
+    def finish(self) -> str:
+        """Flush at end of stream; returns any remaining text to emit"""
+        if self._buffer_all:
+            return self._clean_fn("".join(self._raw_parts))
+        # Whatever is still pending is trailing whitespace
+        self._pending = ""
+        return ""
+
+    @property
+    def text(self) -> str:
+        """Full reply cleaned exactly like the non-streaming path"""
+        return self._clean_fn("".join(self._raw_parts))
+
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Serialize one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
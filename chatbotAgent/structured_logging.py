@@ -0,0 +1,230 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from metrics import LOG_EVENTS, LOG_CALL_SECONDS, LOG_HANDLER_CPU_SECONDS
+from tracing import tracer
+
+
+def _read_settings() -> None:
+    """MINDMATE_LOG_* settings; re-read by configure_logging, so values from a .env loaded after import apply"""
+    global LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_REDACT, LOG_QUEUE_ENABLED, LOG_QUEUE_SIZE
+    LOG_LEVEL = os.getenv("MINDMATE_LOG_LEVEL", "INFO").upper()
+    # text (logfmt-style `event key=value ...`) or json (one object per line)
+    LOG_FORMAT = os.getenv("MINDMATE_LOG_FORMAT", "text")
+    # Share of turns whose INFO events are kept; warnings and errors are always logged
+    LOG_SAMPLE_RATE = float(os.getenv("MINDMATE_LOG_SAMPLE_RATE", "1.0"))
+    # Replace message/reply text with its length so user content never reaches the logs
+    LOG_REDACT = os.getenv("MINDMATE_LOG_REDACT", "true").lower() == "true"
+    # Format and write on a listener thread instead of the request path
+    LOG_QUEUE_ENABLED = os.getenv("MINDMATE_LOG_QUEUE", "true").lower() == "true"
+    LOG_QUEUE_SIZE = int(os.getenv("MINDMATE_LOG_QUEUE_SIZE", "10000"))
+
+
+_read_settings()
+
+# Event fields that carry user or model text
+CONTENT_FIELDS = frozenset({"message", "user_message", "reply", "response", "content", "preview", "matches"})
+
+# Per-turn sampling decision, so a kept turn keeps all of its events
+_turn_sampled: contextvars.ContextVar[Optional[bool]] = contextvars.ContextVar("log_turn_sampled", default=None)
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """Emit one structured event; fields are only rendered if the event is kept, and off the request thread"""
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING and not _keep():
+        _event_counter(level, "sampled_out").inc()
+        return
+    started = time.perf_counter()
+    if LOG_REDACT:
+        for key in CONTENT_FIELDS.intersection(fields):
+            fields[key] = _redact(fields[key])
+    if not fields.get("trace_id"):
+        trace_id = tracer.current_trace_id()
+        if trace_id:
+            fields["trace_id"] = trace_id
+        else:
+            fields.pop("trace_id", None)
+    # makeRecord + handle instead of logger.log(): skips the caller-frame walk (file/line are never rendered)
+    logger.handle(logger.makeRecord(logger.name, level, "", 0, event, None, None, extra={"event": event, "fields": fields}))
+    _event_counter(level, "emitted").inc()
+    _CALL_SECONDS.inc(time.perf_counter() - started)
+
+
+@contextmanager
+def sampled_turn(rate: Optional[float] = None) -> Iterator[bool]:
+    """Decide once per turn whether its INFO events are logged"""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    keep = rate >= 1.0 or random.random() < rate
+    previous = _turn_sampled.get()
+    _turn_sampled.set(keep)
+    try:
+        yield keep
+    finally:
+        # set() rather than reset(): a streamed turn may finish in a different context than it started
+        _turn_sampled.set(previous)
+
+
+_CALL_SECONDS = LOG_CALL_SECONDS.labels()
+_event_counters: Dict[Tuple[int, str], Any] = {}
+
+
+def _event_counter(level: int, outcome: str) -> Any:
+    key = (level, outcome)
+    counter = _event_counters.get(key)
+    if counter is None:
+        counter = _event_counters[key] = LOG_EVENTS.labels(logging.getLevelName(level), outcome)
+    return counter
+
+
+def _keep() -> bool:
+    decision = _turn_sampled.get()
+    if decision is None:
+        return LOG_SAMPLE_RATE >= 1.0 or random.random() < LOG_SAMPLE_RATE
+    return decision
+
+
+def _redact(value: Any) -> Any:
+    if isinstance(value, str):
+        return f"<redacted {len(value)} chars>"
+    if isinstance(value, (list, tuple)):
+        return f"<redacted {len(value)} items>"
+    return value
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders log_event records (and plain log lines) as logfmt-style text or JSON"""
+
+    def __init__(self, fmt_kind: str = "text"):
+        super().__init__()
+        self.fmt_kind = fmt_kind
+
+    def format(self, record: logging.LogRecord) -> str:
+        # None means "not applicable to this turn" (no voice data, no summary job): leave it out
+        fields = {key: value for key, value in (getattr(record, "fields", None) or {}).items() if value is not None}
+        event = getattr(record, "event", None) or record.getMessage()
+        if self.fmt_kind == "json":
+            payload = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "event": event,
+                **fields
+            }
+            if record.exc_info:
+                payload["exc"] = self.formatException(record.exc_info)
+            return json.dumps(payload, ensure_ascii=False, default=str)
+        parts = [f"{self.formatTime(record)} {record.levelname} {record.name}: {event}"]
+        parts.extend(f"{key}={_text_value(value)}" for key, value in fields.items())
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def _text_value(value: Any) -> str:
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":"))
+    text = str(value)
+    return json.dumps(text, ensure_ascii=False) if (" " in text or not text) else text
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener as-is (no formatting here) and drops instead of blocking when full.
+
+    Uses a lock-free ``SimpleQueue``; the size bound is checked with ``qsize()``
+    and may overshoot by a few records under contention.
+    """
+
+    def __init__(self, log_queue: "queue.SimpleQueue[logging.LogRecord]", max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            _event_counter(record.levelno, "dropped").inc()
+            return
+        self.queue.put_nowait(record)
+
+
+class _MeasuredStreamHandler(logging.StreamHandler):
+    """Counts the CPU the handler thread spends formatting and writing"""
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        started = time.thread_time()
+        try:
+            return super().handle(record)
+        finally:
+            LOG_HANDLER_CPU_SECONDS.inc(time.thread_time() - started)
+
+
+def configure_logging() -> None:
+    """Install the root handler once (idempotent; replaces the old per-module basicConfig calls)"""
+    global _configured, _listener
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        _read_settings()
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        if root.handlers:
+            # Host (e.g. uvicorn --log-config, pytest) already configured logging: only add our formatting
+            for handler in root.handlers:
+                handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+            return
+        stream_handler = _MeasuredStreamHandler(sys.stderr)
+        stream_handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+        if not LOG_QUEUE_ENABLED:
+            root.addHandler(stream_handler)
+            return
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root.addHandler(_NonBlockingQueueHandler(log_queue, LOG_QUEUE_SIZE))
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _configure_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def logging_stats() -> Dict[str, Any]:
+    """Events kept/sampled out/dropped and logging time on the request path vs the handler thread"""
+    events: Dict[str, Dict[str, float]] = {}
+    for labels, value in LOG_EVENTS.values():
+        events.setdefault(labels["outcome"], {})[labels["level"]] = value
+    return {
+        "level": LOG_LEVEL,
+        "format": LOG_FORMAT,
+        "sample_rate": LOG_SAMPLE_RATE,
+        "redact": LOG_REDACT,
+        "queued": _listener is not None,
+        "events": events,
+        "call_seconds": round(sum(value for _, value in LOG_CALL_SECONDS.values()), 6),
+        "handler_cpu_seconds": round(sum(value for _, value in LOG_HANDLER_CPU_SECONDS.values()), 6)
+    }
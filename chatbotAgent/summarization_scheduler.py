@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# submit() outcomes
+JOB_QUEUED = "queued"
+JOB_COALESCED = "coalesced"
+JOB_REJECTED = "rejected"
+# Not submitted: another worker already claimed this pass (shared state / affinity)
+JOB_SKIPPED = "skipped"
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class SummarizationScheduler:
+    """Fixed-size worker pool for background summaries with per-user coalescing.
+
+    At most one job per user is pending: a newer submission replaces the older
+    pending payload (keeping its queue position), and a user's job never runs
+    concurrently with another job for the same user. When ``max_pending`` users
+    are already waiting, new users are rejected instead of queueing without bound.
+    """
+
+    def __init__(self, run_job: Callable[[Dict[str, Any]], None], workers: int = 2, max_pending: int = 256):
+        self._run_job = run_job
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._accepting = True
+        self._stopping = False
+        self._counters = {"submitted": 0, "coalesced": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self._queue_wait = deque(maxlen=512)
+        self._run_time = deque(maxlen=512)
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"summarizer-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, user_id: str, payload: Dict[str, Any]) -> str:
+        """Queue a summarization job under `user_id` (or session id: jobs for one key coalesce); returns queued/coalesced/rejected"""
+        with self._cond:
+            if not self._accepting:
+                self._counters["rejected"] += 1
+                return JOB_REJECTED
+            if user_id in self._pending:
+                # Only the newest job per user matters; keep its place in line
+                self._pending[user_id]["payload"] = payload
+                self._counters["coalesced"] += 1
+                return JOB_COALESCED
+            if len(self._pending) >= self.max_pending:
+                self._counters["rejected"] += 1
+                return JOB_REJECTED
+            self._pending[user_id] = {"payload": payload, "enqueued_at": time.perf_counter()}
+            self._counters["submitted"] += 1
+            self._cond.notify()
+            return JOB_QUEUED
+
+    def shutdown(self, drain: bool = True, timeout: float = 30.0) -> bool:
+        """Stop accepting jobs; optionally wait for pending ones. Returns True if fully drained."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._accepting = False
+            if not drain:
+                self._pending.clear()
+            while (self._pending or self._running) and time.monotonic() < deadline:
+                self._cond.wait(timeout=max(deadline - time.monotonic(), 0.01))
+            drained = not self._pending and not self._running
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=max(deadline - time.monotonic(), 0.1))
+        if not drained:
+            logger.warning(f"⚠️ Summarization scheduler shut down with {len(self._pending)} pending, {len(self._running)} running jobs")
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queue_wait = list(self._queue_wait)
+            run_time = list(self._run_time)
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": len(self._pending),
+                "running": len(self._running),
+                **self._counters,
+                "queue_wait_ms": {
+                    "p50": _percentile(queue_wait, 0.5),
+                    "p95": _percentile(queue_wait, 0.95),
+                    "max": max(queue_wait) if queue_wait else None
+                },
+                "job_latency_ms": {
+                    "p50": _percentile(run_time, 0.5),
+                    "p95": _percentile(run_time, 0.95),
+                    "max": max(run_time) if run_time else None
+                }
+            }
+
+    def _next_job(self):
+        """Pop the oldest pending job whose user is not already being summarized (caller holds lock)"""
+        for user_id in self._pending:
+            if user_id not in self._running:
+                return user_id, self._pending.pop(user_id)
+        return None, None
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                user_id, job = self._next_job()
+                while job is None and not self._stopping:
+                    self._cond.wait()
+                    user_id, job = self._next_job()
+                if job is None:
+                    return
+                self._running.add(user_id)
+                started = time.perf_counter()
+                self._queue_wait.append(round((started - job["enqueued_at"]) * 1000, 1))
+
+            failed = False
+            try:
+                self._run_job(job["payload"])
+            except Exception as e:
+                failed = True
+                logger.error(f"❌ Summarization job failed for user {user_id}: {e}")
+
+            with self._cond:
+                self._running.discard(user_id)
+                self._run_time.append(round((time.perf_counter() - started) * 1000, 1))
+                self._counters["failed" if failed else "completed"] += 1
+                # Wake workers waiting on this user's next job and any shutdown waiter
+                self._cond.notify_all()
@@ -0,0 +1,56 @@
+from activity_analytics import SECONDS_PER_DAY, ActivityAnalytics
+
+NOW = 1_790_000_000.0
+
+
+def _rows(count, game="memory_game", start_score=50):
+    """`count` sessions an hour apart ending an hour before NOW, newest first (as the client sends them)"""
+    rows = [{"id": f"{game}-{i}", "activity_type": game, "score": start_score + i, "accuracy_percentage": 80,
+             "completed_at": NOW - (count - i) * 3600} for i in range(count)]
+    return rows[::-1]
+
+
+def test_history_accumulates_from_small_windows():
+    analytics = ActivityAnalytics()
+    rows = _rows(20)
+    # Each turn the client sends its newest 5 rows; two sessions were played in between
+    for seen in range(5, 21, 2):
+        patterns = analytics.patterns("user", rows[20 - seen:][:5], NOW)
+    assert patterns["total_sessions"] == 19
+    game = patterns["games"]["memory_game"]
+    assert (game["last_score"], game["rolling_mean"], game["trend_per_session"]) == (68, 66, 1)
+
+
+def test_unchanged_window_is_a_cache_hit():
+    analytics = ActivityAnalytics()
+    window = _rows(5)
+    first = analytics.patterns("user", window, NOW)
+    assert analytics.patterns("user", window, NOW) is first
+    stats = analytics.stats()
+    assert (stats["rows_ingested"], stats["recomputes"], stats["hits"]) == (5, 1, 1)
+
+
+def test_rows_older_than_the_watermark_are_ignored():
+    analytics = ActivityAnalytics()
+    rows = _rows(10)
+    analytics.patterns("user", rows[:5], NOW)
+    # Rows from before the watermark (e.g. a wider window after a reload) are not ingested again or late
+    assert analytics.patterns("user", rows, NOW)["total_sessions"] == 5
+    assert analytics.stats()["rows_ingested"] == 5
+
+
+def test_new_row_at_the_watermark_is_kept_once():
+    analytics = ActivityAnalytics()
+    window = _rows(3)
+    analytics.patterns("user", window, NOW)
+    tie = dict(window[0], id="same-time", score=10)
+    assert analytics.patterns("user", [tie] + window, NOW)["total_sessions"] == 4
+    assert analytics.patterns("user", [tie] + window, NOW)["total_sessions"] == 4
+
+
+def test_day_change_recomputes_streaks():
+    analytics = ActivityAnalytics()
+    window = _rows(3)
+    assert analytics.patterns("user", window, NOW)["streak_days"] >= 1
+    later = analytics.patterns("user", window, NOW + 5 * SECONDS_PER_DAY)
+    assert (later["streak_days"], later["days_since_last"]) == (0, 5)
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from admission import PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_URGENT, AdmissionController, AdmissionRejected
+
+
+async def _settle():
+    """Let queued tasks reach their await points (grants are delivered via call_soon)"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _turn(controller, user_id, priority, served, release):
+    async with controller.admit(user_id, priority) as ticket:
+        served.append((user_id, ticket["priority"]))
+        await release.wait()
+
+
+def test_full_queue_evicts_lowest_priority_waiter():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=2, degrade_queue_depth=99)
+        served, release = [], asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "holder", PRIORITY_NORMAL, served, release))
+        await _settle()
+        low = asyncio.create_task(_turn(controller, "low", PRIORITY_LOW, served, release))
+        normal = asyncio.create_task(_turn(controller, "normal", PRIORITY_NORMAL, served, release))
+        await _settle()
+        urgent = asyncio.create_task(_turn(controller, "urgent", PRIORITY_URGENT, served, release))
+        await _settle()
+
+        # The low-priority waiter made room for the urgent arrival
+        with pytest.raises(AdmissionRejected) as evicted:
+            await low
+        assert evicted.value.reason == "evicted"
+
+        # A full queue of more important turns rejects a new low-priority one outright
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit("late", PRIORITY_LOW):
+                pass
+        assert rejected.value.reason == "queue_full"
+
+        release.set()
+        await asyncio.gather(holder, normal, urgent)
+        assert [user for user, _ in served] == ["holder", "urgent", "normal"]
+        stats = controller.stats()
+        assert (stats["evicted"], stats["rejected_queue_full"], stats["in_flight"]) == (1, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_equal_priority_users_are_interleaved():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, degrade_queue_depth=99)
+        served, release = [], asyncio.Event()
+        release.set()
+        gate = asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "holder", PRIORITY_NORMAL, [], gate))
+        await _settle()
+        # One user sends a burst before another user's single turn arrives
+        tasks = [asyncio.create_task(_turn(controller, "chatty", PRIORITY_NORMAL, served, release)) for _ in range(3)]
+        await _settle()
+        tasks.append(asyncio.create_task(_turn(controller, "quiet", PRIORITY_NORMAL, served, release)))
+        await _settle()
+
+        gate.set()
+        await asyncio.gather(holder, *tasks)
+        # The quiet user goes ahead of the chatty user's queued backlog
+        assert [user for user, _ in served] == ["chatty", "quiet", "chatty", "chatty"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_withdrawn():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, degrade_queue_depth=99)
+        served, release = [], asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "holder", PRIORITY_NORMAL, served, release))
+        await _settle()
+        gone = asyncio.create_task(_turn(controller, "gone", PRIORITY_URGENT, served, release))
+        waiting = asyncio.create_task(_turn(controller, "waiting", PRIORITY_NORMAL, served, release))
+        await _settle()
+
+        gone.cancel()
+        await _settle()
+        assert gone.cancelled()
+        assert controller.stats()["queue_depth"] == 1
+
+        release.set()
+        await asyncio.gather(holder, waiting)
+        assert [user for user, _ in served] == ["holder", "waiting"]
+        stats = controller.stats()
+        assert (stats["in_flight"], stats["queue_depth"], stats["admitted"]) == (0, 0, 2)
+        assert controller._per_user == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancel_after_grant_hands_the_slot_on():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, degrade_queue_depth=99)
+        served, release = [], asyncio.Event()
+        release.set()
+        async with controller.admit("holder", PRIORITY_NORMAL):
+            gone = asyncio.create_task(_turn(controller, "gone", PRIORITY_URGENT, served, release))
+            waiting = asyncio.create_task(_turn(controller, "waiting", PRIORITY_NORMAL, served, release))
+            await _settle()
+
+        # Leaving the block granted the slot to "gone"; its client disconnects before the grant is delivered
+        gone.cancel()
+        await asyncio.gather(gone, waiting, return_exceptions=True)
+
+        assert gone.cancelled()
+        assert [user for user, _ in served] == ["waiting"]
+        stats = controller.stats()
+        assert (stats["in_flight"], stats["queue_depth"]) == (0, 0)
+        assert controller._per_user == {}
+
+    asyncio.run(scenario())
+
+
+def test_turns_started_behind_a_deep_queue_are_degraded_unless_urgent():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, degrade_queue_depth=2)
+        served, release = [], asyncio.Event()
+        tickets = []
+
+        async def turn(user_id, priority):
+            async with controller.admit(user_id, priority) as ticket:
+                tickets.append((user_id, ticket["degraded"]))
+                await release.wait()
+
+        holder = asyncio.create_task(_turn(controller, "holder", PRIORITY_NORMAL, served, release))
+        await _settle()
+        tasks = [asyncio.create_task(turn(user, priority)) for user, priority in
+                 (("urgent", PRIORITY_URGENT), ("a", PRIORITY_NORMAL), ("b", PRIORITY_NORMAL), ("c", PRIORITY_NORMAL))]
+        await _settle()
+
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        # Each grant sees how many turns are still waiting behind it
+        assert tickets == [("urgent", False), ("a", True), ("b", False), ("c", False)]
+
+    asyncio.run(scenario())
@@ -0,0 +1,62 @@
+from memory_index import MemoryIndex
+
+
+def _messages(count, prefix="placement interview"):
+    return [{"text": f"{prefix} round number{i} went badly", "role": "user"} for i in range(count)]
+
+
+def test_duplicates_and_short_messages_are_not_indexed():
+    index = MemoryIndex()
+    items = [{"text": "Riya stopped talking to me after the fight", "role": "user"}, {"text": "ok thanks", "role": "user"}]
+    assert index.add("user", items) == 1
+    # The same message in a later client window (different spacing/case) is skipped by content key
+    assert index.add("user", [{"text": "riya  stopped talking to me after the FIGHT", "role": "user"}]) == 0
+    stats = index.stats()
+    assert (stats["entries"], stats["duplicates"], stats["skipped_short"]) == (1, 1, 1)
+
+
+def test_search_returns_the_related_chunk_and_skips_excluded_ones():
+    index = MemoryIndex()
+    index.add("user", [
+        {"text": "Bruno my dog has been sick all week", "role": "user"},
+        {"text": "Physics boards syllabus is still unfinished", "role": "user"},
+        {"text": "Riya stopped talking to me after the fight", "role": "user"}
+    ])
+    hits = index.search("user", "is bruno the dog any better")
+    assert hits and hits[0]["text"].startswith("Bruno")
+    recent = [{"text": "Bruno my dog has been sick all week", "role": "user"}]
+    assert all(not hit["text"].startswith("Bruno") for hit in index.search("user", "is bruno the dog any better", exclude=recent))
+    assert index.search("someone_else", "bruno dog") == []
+
+
+def test_full_user_index_drops_its_oldest_quarter():
+    index = MemoryIndex(max_rows_per_user=40)
+    index.add("user", _messages(41))
+    stats = index.stats()
+    assert (stats["entries"], stats["trimmed"]) == (30, 11)
+    texts = {hit["text"] for hit in index.search("user", "placement interview round went badly", k=40)}
+    assert "placement interview round number0 went badly" not in texts
+    assert "placement interview round number40 went badly" in texts
+    # Trimmed chunks are forgotten, so they can be indexed again
+    assert index.add("user", _messages(1)) == 1
+
+
+def test_least_recently_used_users_are_evicted():
+    index = MemoryIndex(max_users=2, max_total_rows=1000)
+    index.add("a", _messages(2))
+    index.add("b", _messages(2))
+    index.search("a", "placement interview")
+    index.add("a", _messages(1, prefix="exam results"))
+    index.add("c", _messages(2))
+    assert index.search("b", "placement interview") == []
+    assert index.search("a", "placement interview") and index.search("c", "placement interview")
+    assert index.stats()["evicted_users"] == 1
+
+
+def test_total_row_budget_evicts_other_users_but_never_the_one_adding():
+    index = MemoryIndex(max_total_rows=5)
+    index.add("a", _messages(3))
+    index.add("b", _messages(4))
+    assert index.stats()["users"] == 1 and index.search("b", "placement interview")
+    index.add("b", _messages(3, prefix="exam results"))
+    assert index.stats()["entries"] == 7
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class _Echo:
+    """Runnable stand-in: echoes inputs (ValueError for "boom"), held at `gate` so tests can act mid-batch"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.batches = []
+
+    def batch(self, inputs, config=None, return_exceptions=False):
+        self.gate.wait(timeout=2)
+        self.batches.append(list(inputs))
+        return [ValueError(item) if item == "boom" else item.upper() for item in inputs]
+
+
+def test_calls_are_batched_and_errors_stay_per_caller():
+    runnable = _Echo()
+    runnable.gate.set()
+    batcher = MicroBatcher(runnable, "test", max_batch=3, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.ainvoke(item) for item in ("a", "boom", "c")), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    batcher.shutdown()
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
+    assert runnable.batches == [["a", "boom", "c"]]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["errors"], stats["batch_size_histogram"]) == (1, 1, {3: 1})
+
+
+def test_cancelled_caller_does_not_strand_the_rest_of_its_batch():
+    runnable = _Echo()
+    batcher = MicroBatcher(runnable, "test", max_batch=3, max_wait_ms=20)
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(batcher.ainvoke(item)) for item in ("a", "b", "c")]
+        # Let the batch reach the runnable, then give up on the first call mid-flight
+        await asyncio.sleep(0.1)
+        tasks[0].cancel()
+        await asyncio.sleep(0.05)
+        runnable.gate.set()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=2)
+
+    results = asyncio.run(scenario())
+    batcher.shutdown()
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ["B", "C"]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["errors"]) == (1, 0)
+    assert stats["batch_latency_ms"]["p50"] is not None
+
+
+def test_caller_cancelled_while_queued_is_not_sent():
+    runnable = _Echo()
+    batcher = MicroBatcher(runnable, "test", max_batch=2, max_wait_ms=20, max_concurrency=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(batcher.ainvoke("first"))
+        await asyncio.sleep(0.1)
+        # The only slot is busy, so these two wait in the queue; one of them gives up
+        queued = [asyncio.ensure_future(batcher.ainvoke(item)) for item in ("gone", "kept")]
+        await asyncio.sleep(0.05)
+        queued[0].cancel()
+        runnable.gate.set()
+        return await asyncio.wait_for(asyncio.gather(first, *queued, return_exceptions=True), timeout=2)
+
+    results = asyncio.run(scenario())
+    batcher.shutdown()
+    assert results[0] == "FIRST" and results[2] == "KEPT"
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert runnable.batches == [["first"], ["kept"]]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["cancelled"]) == (2, 1)
+
+
+def test_shutdown_flushes_queued_calls_and_refuses_new_ones():
+    runnable = _Echo()
+    runnable.gate.set()
+    batcher = MicroBatcher(runnable, "test", max_batch=8, max_wait_ms=1000)
+    futures = [batcher.submit(item) for item in ("a", "b")]
+    batcher.shutdown()
+    assert [future.result(timeout=1) for future in futures] == ["A", "B"]
+    with pytest.raises(RuntimeError):
+        batcher.submit("late")
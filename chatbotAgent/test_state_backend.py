@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from state_backend import InProcessStateBackend, SQLiteStateBackend, create_state_backend
+from ttl_cache import BoundedTTLCache
+
+
+def _workers(tmp_path):
+    """Two backends on one state file, as two uvicorn workers on the host would have"""
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteStateBackend(path), SQLiteStateBackend(path)
+    second.owner = "other-worker"
+    return first, second
+
+
+def test_factory_picks_the_backend():
+    assert isinstance(create_state_backend("memory", ""), InProcessStateBackend)
+    assert isinstance(InProcessStateBackend().cache("c", 10, 1000, 60), BoundedTTLCache)
+    with pytest.raises(ValueError):
+        create_state_backend("redis", "")
+
+
+def test_values_are_shared_between_workers(tmp_path):
+    first, second = _workers(tmp_path)
+    first.cache("summaries", 100, 0, 60).set("session", {"key_themes": ["exams"]})
+    assert second.cache("summaries", 100, 0, 60).get("session") == {"key_themes": ["exams"]}
+    assert second.cache("other", 100, 0, 60).get("session") is None
+
+
+def test_expired_rows_are_misses(tmp_path):
+    first, _ = _workers(tmp_path)
+    cache = first.cache("summaries", 100, 0, 60)
+    cache.set("session", 1, ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("session", "missing") == "missing" and "session" not in cache
+
+
+def test_only_one_worker_claims_a_counter_value(tmp_path):
+    first, second = _workers(tmp_path)
+    mine, theirs = first.cache("counts", 100, 0, 60), second.cache("counts", 100, 0, 60)
+    assert mine.advance("session", 20)
+    assert not theirs.advance("session", 20)
+    assert theirs.advance("session", 30)
+    assert mine.get("session") == 30
+
+
+def test_compare_and_set_leaves_another_workers_advance_alone(tmp_path):
+    first, second = _workers(tmp_path)
+    mine, theirs = first.cache("counts", 100, 0, 60), second.cache("counts", 100, 0, 60)
+    assert mine.advance("session", 20)
+    assert theirs.advance("session", 30)
+    # Rolling back our rejected claim of 20 must not undo the other worker's 30
+    assert not mine.compare_and_set("session", 20, 10)
+    assert mine.get("session") == 30
+    assert theirs.compare_and_set("session", 30, 10)
+    assert mine.get("session") == 10
+
+
+def test_lease_stays_with_its_owner_until_it_lapses(tmp_path):
+    first, second = _workers(tmp_path)
+    assert first.acquire_lease("summary:user", 0.05)
+    assert first.acquire_lease("summary:user", 0.05)
+    assert not second.acquire_lease("summary:user", 0.05)
+    time.sleep(0.06)
+    assert second.acquire_lease("summary:user", 0.05)
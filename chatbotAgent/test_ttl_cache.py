@@ -0,0 +1,55 @@
+import time
+
+from ttl_cache import BoundedTTLCache
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = BoundedTTLCache("test", max_entries=2, max_bytes=10_000, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert ("a" in cache, "b" in cache, "c" in cache) == (True, False, True)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_evicts_until_it_fits():
+    cache = BoundedTTLCache("test", max_entries=100, max_bytes=100, ttl_seconds=60, size_fn=len)
+    cache.set("a", "x" * 40)
+    cache.set("b", "x" * 40)
+    cache.set("c", "x" * 40)
+    assert "a" not in cache and len(cache) == 2
+    assert cache.stats()["bytes"] == 80
+    # Replacing a key releases its old size first
+    cache.set("c", "x" * 10)
+    assert cache.stats()["bytes"] == 50
+
+
+def test_expired_entries_miss_and_are_counted():
+    cache = BoundedTTLCache("test", max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    cache.set("short", 1, ttl_seconds=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+    assert cache.get("short", "missing") == "missing"
+    assert "short" not in cache and cache.get("long") == 2
+    stats = cache.stats()
+    assert (stats["expirations"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_advance_only_moves_a_counter_forward():
+    cache = BoundedTTLCache("test", max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    assert cache.advance("user", 10)
+    assert not cache.advance("user", 10)
+    assert not cache.advance("user", 5)
+    assert cache.advance("user", 20)
+    assert cache.get("user") == 20
+
+
+def test_compare_and_set_only_replaces_the_expected_value():
+    cache = BoundedTTLCache("test", max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    cache.set("user", 20)
+    # Another claim moved the counter on: rolling back our claim of 10 must not touch it
+    assert not cache.compare_and_set("user", 10, 0)
+    assert cache.compare_and_set("user", 20, 10)
+    assert cache.get("user") == 10
+    assert not cache.compare_and_set("absent", 0, 1) and "absent" not in cache
@@ -0,0 +1,65 @@
+import pytest
+
+from turn_router import (
+    ANALYSIS_DELTA,
+    ANALYSIS_FULL,
+    ANALYSIS_REUSED,
+    ROUTE_ANALYST,
+    ROUTE_FAST_PATH,
+    classify_turn,
+    plan_analysis_update
+)
+
+PREVIOUS = {"intervention_priority": "supportive", "stress_categories": ["Academic"]}
+
+
+@pytest.mark.parametrize("message", ["i'm not okay", "help me please", "he hit me", "not good", "nobody gets it"])
+def test_short_concerning_messages_go_to_the_analyst(message):
+    # Triage rates these "none"; being short must not be enough to skip the analyst
+    decision = classify_turn(message, PREVIOUS, risk_level="none")
+    assert decision["route"] == ROUTE_ANALYST
+
+
+@pytest.mark.parametrize("message,reason", [
+    ("ok", "acknowledgement"), ("hmm", "acknowledgement"), ("lol", "acknowledgement"),
+    ("thanks yaar", "gratitude"), ("hi", "greeting"), ("what is 2+2", "trivial_question")
+])
+def test_allow_listed_messages_take_the_fast_path(message, reason):
+    decision = classify_turn(message, PREVIOUS, risk_level="none")
+    assert (decision["route"], decision["reason"]) == (ROUTE_FAST_PATH, reason)
+
+
+def test_short_unlisted_message_is_substantive():
+    assert classify_turn("kal milte", PREVIOUS)["reason"] == "substantive"
+
+
+def test_risk_and_context_override_the_fast_path():
+    assert classify_turn("ok", PREVIOUS, risk_level="elevated")["reason"] == "risk_elevated"
+    assert classify_turn("ok", {"intervention_priority": "immediate"})["route"] == ROUTE_ANALYST
+    assert classify_turn("ok", PREVIOUS, {"stress_level": "high"})["route"] == ROUTE_ANALYST
+
+
+CACHED = {"intervention_priority": "supportive", "stress_categories": ["Academic", "Family"]}
+
+
+@pytest.mark.parametrize("message", [
+    "nobody cares about me",
+    "I feel like nobody cares about me anymore honestly",
+    "i guess",
+    "my exams went okay"
+])
+def test_follow_ups_outside_the_allow_list_get_a_delta(message):
+    assert plan_analysis_update(message, CACHED, 1)["mode"] == ANALYSIS_DELTA
+
+
+@pytest.mark.parametrize("message", ["ok", "thanks yaar", "hmm"])
+def test_allow_listed_follow_ups_reuse_the_analysis(message):
+    assert plan_analysis_update(message, CACHED, 1) == {"mode": ANALYSIS_REUSED, "reason": "no_new_signal"}
+
+
+def test_plan_escalates_before_reuse():
+    assert plan_analysis_update("ok", None, 0)["mode"] == ANALYSIS_FULL
+    assert plan_analysis_update("ok", CACHED, 6)["reason"] == "periodic_refresh"
+    assert plan_analysis_update("ok", CACHED, 1, risk_level="high")["reason"] == "risk_signal"
+    assert plan_analysis_update("I have boards and mummy keeps shouting", CACHED, 1)["reason"] == "follow_up"
+    assert plan_analysis_update("my girlfriend left", CACHED, 1)["new_topics"] == ["Social"]
@@ -0,0 +1,229 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TRACE_HEADER = "X-Trace-Id"
+
+_TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Innermost open span of this task/thread; spans opened inside it become its children
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+# Trace ID the next root span should use (bound per HTTP request before the workflow runs)
+_bound_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("bound_trace_id", default=None)
+
+# (trace_id, span_id) handed to work that runs outside the request's context, e.g. background summaries
+TraceContext = Tuple[str, str]
+
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def valid_trace_id(value: Optional[str]) -> Optional[str]:
+    """Accept a caller-supplied trace ID only if it is 32 lowercase hex chars"""
+    value = (value or "").strip().lower()
+    return value if _TRACE_ID_PATTERN.match(value) else None
+
+
+@contextmanager
+def bind_trace_id(trace_id: str) -> Iterator[str]:
+    token = _bound_trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _bound_trace_id.reset(token)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_time", "end_time", "attributes", "status", "error", "_started")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return round((self.end_time - self.start_time) * 1000, 3)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"[:500]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+    def _finish(self) -> None:
+        # Wall-clock start plus a monotonic duration, so spans stay ordered across clock adjustments
+        self.end_time = self.start_time + (time.perf_counter() - self._started)
+
+
+class _NoopSpan:
+    """Stand-in while no exporter is configured: same surface, records nothing"""
+
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class InMemorySpanExporter:
+    """Keeps the most recent finished spans in memory (tests, /debug tooling)"""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def flush(self) -> None:
+        pass
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [span for span in self._spans if trace_id is None or span["trace_id"] == trace_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JSONLSpanExporter:
+    """Appends one JSON object per finished span to a local file; flushed when a root span ends"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def create_span_exporter(kind: str, path: str = "traces.jsonl") -> Optional[Any]:
+    """Exporter from MINDMATE_TRACE_EXPORTER: none (spans not recorded), memory or jsonl"""
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return InMemorySpanExporter()
+    if kind == "jsonl":
+        return JSONLSpanExporter(path)
+    raise ValueError(f"MINDMATE_TRACE_EXPORTER must be 'none', 'memory' or 'jsonl', got '{kind}'")
+
+
+class Tracer:
+    """Minimal span tracer over contextvars, so spans nest across awaits and LangGraph node tasks.
+
+    ``span()`` opens a child of the current span, or a new trace (using the ID
+    bound by ``bind_trace_id`` if any) when there is none. Work handed to
+    another thread carries ``context()`` and passes it back as ``parent=``.
+    Finished spans go to the exporter; with no exporter, spans are no-ops.
+    """
+
+    def __init__(self, exporter: Optional[Any] = None):
+        self.exporter = exporter
+
+    def set_exporter(self, exporter: Optional[Any]) -> None:
+        previous, self.exporter = self.exporter, exporter
+        if previous is not None and previous is not exporter:
+            previous.shutdown()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[TraceContext] = None, **attributes: Any) -> Iterator[Any]:
+        exporter = self.exporter
+        if exporter is None:
+            yield _NOOP_SPAN
+            return
+        current = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent
+        elif current is not None:
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id = _bound_trace_id.get() or new_trace_id(), None
+        span = Span(name, trace_id, parent_id, attributes)
+        _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            # set() rather than reset(): a streamed turn may finish in a different context than it started
+            _current_span.set(current)
+            span._finish()
+            exporter.export(span)
+            if parent_id is None or parent is not None:
+                exporter.flush()
+
+    def annotate(self, **attributes: Any) -> None:
+        """Add attributes to the current span (no-op outside a span)"""
+        span = _current_span.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def context(self) -> Optional[TraceContext]:
+        span = _current_span.get()
+        return (span.trace_id, span.span_id) if span is not None else None
+
+    def current_trace_id(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span is not None else _bound_trace_id.get()
+
+
+# Process-wide tracer; the workflow installs the configured exporter
+tracer = Tracer()
@@ -0,0 +1,150 @@
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate in-memory footprint of a cached value in bytes (serialized length)"""
+    try:
+        return len(json.dumps(value, default=str, separators=(",", ":")).encode("utf-8"))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class BoundedTTLCache:
+    """Thread-safe LRU cache bounded by entry count and approximate bytes, with per-entry TTL.
+
+    Expiry uses time.monotonic(), so it is immune to wall-clock changes. Expired
+    entries are dropped lazily on access and opportunistically on writes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        size_fn: Callable[[Any], int] = estimate_size
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._size_fn = size_fn
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        # Full expiry sweeps are O(n), so run them at most this often
+        self._sweep_interval = min(max(ttl_seconds / 4, 1.0), 60.0)
+        self._next_sweep = time.monotonic() + self._sweep_interval
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self._misses += 1
+                return default
+            value, expires_at, _ = item
+            if time.monotonic() >= expires_at:
+                self._discard(key)
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        size = self._size_fn(value)
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if key in self._data:
+                self._discard(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            self._enforce_bounds()
+
+    def advance(self, key: Hashable, value: int) -> bool:
+        """Raise a counter to `value` unless it is already there; True if this call advanced it"""
+        with self._lock:
+            current = self.get(key, _MISSING)
+            if current is not _MISSING and current >= value:
+                return False
+            self.set(key, value)
+            return True
+
+    def compare_and_set(self, key: Hashable, expected: Any, value: Any) -> bool:
+        """Set `value` only while the key still holds `expected`; True if this call set it"""
+        with self._lock:
+            if self.get(key, _MISSING) != expected:
+                return False
+            self.set(key, value)
+            return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            self._discard(key)
+            return item[0]
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._data.items() if now >= expires_at]
+            for key in expired:
+                self._discard(key)
+            self._expirations += len(expired)
+            return len(expired)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            return item is not _MISSING and time.monotonic() < item[1]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations
+            }
+
+    def _discard(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _enforce_bounds(self) -> None:
+        # Expired entries go first (periodic sweep), then least-recently-used ones
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self._sweep_interval
+            for key in [k for k, (_, expires_at, _) in self._data.items() if now >= expires_at]:
+                self._discard(key)
+                self._expirations += 1
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            self._discard(next(iter(self._data)))
+            self._evictions += 1
@@ -0,0 +1,181 @@
+import re
+import time
+from typing import Dict, Any, Optional
+
+# Routes out of the "turn_router" graph node
+ROUTE_FAST_PATH = "fast_path"
+ROUTE_ANALYST = "analyst"
+
+# Any of these means the turn carries real emotional signal -> always run the analyst
+DISTRESS_PATTERN = re.compile(
+    r"\b(sad|depress\w*|anxi\w*|stress\w*|tension|panic\w*|scared|afraid|lonely|alone|cry\w*|hurt\w*|"
+    r"hopeless|worthless|tired of|exhaust\w*|overwhelm\w*|can'?t (sleep|cope|focus|study)|fail\w*|"
+    r"suicid\w*|kill|die|dying|self[- ]?harm|cut(ting)? myself|end it|give up|"
+    r"pressure|exam\w*|boards?|parents?|fight|breakup|broke up|"
+    r"udaas|pareshan|dukhi|dar|akela|rona|mar(na|jana)|thak gaya|thak gayi|bura lag)\b",
+    re.IGNORECASE
+)
+
+# Narrow subsets for incremental analysis: DISTRESS_PATTERN also matches everyday topic words
+# (exams, parents, pressure) that most messages from students contain
+RISK_PATTERN = re.compile(
+    r"\b(suicid\w*|kill (my ?self|me)|want to die|wanna die|end (it all|my life)|no reason to live|"
+    r"self[- ]?harm\w*|(cut|cutting|hurt|hurting|harm|harming) myself|better off dead|"
+    r"mar (jana|jaun|jaunga|jaungi)|marna (hai|chahta|chahti)|jeena nahi|zindagi khatam)\b",
+    re.IGNORECASE
+)
+EMOTIONAL_DISTRESS_PATTERN = re.compile(
+    r"\b(sad|depress\w*|anxi\w*|panic\w*|scared|afraid|lonely|cry\w*|hurt\w*|hopeless|worthless|"
+    r"tired of|exhaust\w*|overwhelm\w*|can'?t (sleep|cope)|udaas|pareshan|dukhi|akela|rona|bura lag)\b",
+    re.IGNORECASE
+)
+
+GREETING_PATTERN = re.compile(
+    r"^(hi+|hello+|hey+|hii+|yo|namaste|namaskar|good (morning|afternoon|evening|night)|gm|gn|sup|what'?s up|kaise ho|kya haal( hai)?)$"
+)
+GRATITUDE_PATTERN = re.compile(
+    r"^((thanks?|thank you|thanku|thx|ty)( (so much|a lot|yaar|bhai|mindmate))?|shukriya|dhanyavaad|dhanyawad)$"
+)
+ACKNOWLEDGEMENT_PATTERN = re.compile(
+    r"^(ok+|okay|k+|kk|cool|nice|great|sure|fine|alright|got it|hmm+|hm+|haan|han|acha+|accha+|theek hai|thik hai|bye|see you|lol|yes|no|nahi)$"
+)
+TRIVIAL_QUESTION_PATTERN = re.compile(
+    r"^(what is |what's |whats )?\d+(\.\d+)? ?[-+*/x] ?\d+(\.\d+)?( \?| =)?$"
+)
+
+# Negation, asking for help, or harm by/to someone: never low-signal, however short ("not good", "he hit me")
+CONCERN_PATTERN = re.compile(
+    r"\b(not|never|nobody|no ?one|nothing|\w+n'?t|help|hit|hits|hitting|beat|beats|beating|hurt\w*|harm\w*|"
+    r"abuse\w*|unsafe|hate|bad|worse|worst|nahi (hai|hoon|hu|ho|lag\w*)|mat|maar\w*|bachao|madad)\b",
+    re.IGNORECASE
+)
+
+_NORMALIZE_PATTERN = re.compile(r"[^\w\s'+\-*/=.?]")
+
+
+# Allow-list for turns with nothing to analyse: the fast path in classify_turn, reuse in plan_analysis_update
+LOW_SIGNAL_PATTERNS = (
+    ("greeting", GREETING_PATTERN),
+    ("gratitude", GRATITUDE_PATTERN),
+    ("acknowledgement", ACKNOWLEDGEMENT_PATTERN),
+    ("trivial_question", TRIVIAL_QUESTION_PATTERN)
+)
+
+
+def _normalize(message: str) -> str:
+    text = _NORMALIZE_PATTERN.sub(" ", message.lower())
+    return " ".join(text.split()).rstrip(" ?!.")
+
+
+def low_signal_kind(user_message: str) -> Optional[str]:
+    """Which allow-listed low-signal form the whole message is ("ok", "thanks yaar", "hi"), else None"""
+    normalized = _normalize(user_message)
+    return next((kind for kind, pattern in LOW_SIGNAL_PATTERNS if pattern.match(normalized)), None)
+
+
+def classify_turn(
+    user_message: str,
+    previous_analysis: Optional[Dict[str, Any]] = None,
+    voice_analysis: Optional[Dict[str, Any]] = None,
+    risk_level: Optional[str] = None
+) -> Dict[str, Any]:
+    """Cheap local routing decision: skip the analyst for greetings, thanks, acks and trivial questions.
+
+    `risk_level` is the turn's risk triage level (risk_triage.py); anything but "none" goes to the analyst.
+    """
+    start = time.perf_counter()
+    previous_analysis = previous_analysis or {}
+    voice_analysis = voice_analysis or {}
+
+    normalized = _normalize(user_message)
+    words = normalized.split()
+    has_distress = bool(DISTRESS_PATTERN.search(user_message))
+    previous_priority = str(previous_analysis.get("intervention_priority", "")).lower()
+    voice_stress = str(voice_analysis.get("stress_level", "")).lower()
+    low_signal = low_signal_kind(user_message)
+
+    if risk_level and risk_level != "none":
+        route, reason = ROUTE_ANALYST, f"risk_{risk_level}"
+    elif has_distress:
+        route, reason = ROUTE_ANALYST, "distress_terms"
+    elif CONCERN_PATTERN.search(user_message):
+        route, reason = ROUTE_ANALYST, "concern_terms"
+    elif previous_priority.startswith("immediate"):
+        route, reason = ROUTE_ANALYST, "previous_priority_immediate"
+    elif voice_stress in ("high", "very high", "severe"):
+        route, reason = ROUTE_ANALYST, "voice_stress_high"
+    elif low_signal:
+        route, reason = ROUTE_FAST_PATH, low_signal
+    else:
+        route, reason = ROUTE_ANALYST, "substantive"
+
+    return {
+        "route": route,
+        "reason": reason,
+        "features": {
+            "chars": len(user_message),
+            "words": len(words),
+            "has_distress_terms": has_distress,
+            "has_previous_analysis": bool(previous_analysis),
+            "previous_priority": previous_priority or None,
+            "voice_stress": voice_stress or None,
+            "risk_level": risk_level or None
+        },
+        "elapsed_us": round((time.perf_counter() - start) * 1_000_000, 1)
+    }
+
+
+# Analysis modes for psychological_analyst on follow-up turns
+ANALYSIS_FULL = "full"
+ANALYSIS_DELTA = "delta"
+ANALYSIS_REUSED = "reused"
+
+# Force a full re-analysis after this many delta/reused turns so stable fields don't go stale
+ANALYSIS_FULL_REFRESH_TURNS = 6
+
+STRESS_TOPIC_PATTERNS = {
+    "Academic": re.compile(r"\b(exam\w*|boards?|marks|grades?|study\w*|padhai|college|school|jee|neet|cuet|coaching|result\w*|assignment\w*|syllabus)\b", re.IGNORECASE),
+    "Family": re.compile(r"\b(mom|mum|mummy|mother|maa|dad|papa|father|parents?|family|ghar|brother|sister|bhai|didi|relatives?|shaadi|marriage)\b", re.IGNORECASE),
+    "Social": re.compile(r"\b(friends?|dost\w*|lonely|alone|bully\w*|girlfriend|boyfriend|crush|breakup|broke up|relationship|social media|instagram)\b", re.IGNORECASE),
+    "Career": re.compile(r"\b(job|career|placement\w*|internship|interview\w*|salary|future|naukri|startup|office|boss)\b", re.IGNORECASE),
+    "Identity": re.compile(r"\b(identity|who i am|gay|lesbian|queer|trans|religion|caste|body|looks|ugly|fat)\b", re.IGNORECASE),
+    "Emotional": re.compile(r"\b(sad|happy|angry|gussa|anxious|nervous|guilt\w*|ashamed|jealous|numb|empty|cry\w*|upset|frustrat\w*|mood)\b", re.IGNORECASE),
+}
+
+
+def detect_stress_topics(user_message: str) -> set:
+    """Stress categories mentioned in the message (keyword level, no LLM)"""
+    return {category for category, pattern in STRESS_TOPIC_PATTERNS.items() if pattern.search(user_message)}
+
+
+def plan_analysis_update(
+    user_message: str,
+    previous_analysis: Optional[Dict[str, Any]],
+    turns_since_full: int,
+    voice_analysis: Optional[Dict[str, Any]] = None,
+    risk_level: Optional[str] = None
+) -> Dict[str, Any]:
+    """Decide whether Agent 1 needs a full analysis, a delta over the cached one, or none at all"""
+    if not previous_analysis:
+        return {"mode": ANALYSIS_FULL, "reason": "no_cached_analysis"}
+    if turns_since_full >= ANALYSIS_FULL_REFRESH_TURNS:
+        return {"mode": ANALYSIS_FULL, "reason": "periodic_refresh"}
+
+    voice_analysis = voice_analysis or {}
+    previous_priority = str(previous_analysis.get("intervention_priority", "")).lower()
+    known_categories = {str(c).lower() for c in previous_analysis.get("stress_categories", [])}
+    topics = detect_stress_topics(user_message)
+    new_topics = sorted(t for t in topics if not any(t.lower() in c for c in known_categories))
+
+    if (risk_level and risk_level != "none") or RISK_PATTERN.search(user_message) or previous_priority.startswith("immediate"):
+        return {"mode": ANALYSIS_DELTA, "reason": "risk_signal"}
+    if str(voice_analysis.get("stress_level", "")).lower() in ("high", "very high", "severe"):
+        return {"mode": ANALYSIS_DELTA, "reason": "voice_stress_high"}
+    if new_topics:
+        return {"mode": ANALYSIS_DELTA, "reason": "new_topics", "new_topics": new_topics}
+    if EMOTIONAL_DISTRESS_PATTERN.search(user_message):
+        return {"mode": ANALYSIS_DELTA, "reason": "distress_terms"}
+    # Length is no evidence of "nothing new": only the fast path's allow-list reuses the analysis outright
+    if low_signal_kind(user_message):
+        return {"mode": ANALYSIS_REUSED, "reason": "no_new_signal"}
+    return {"mode": ANALYSIS_DELTA, "reason": "follow_up"}
@@ -0,0 +1,490 @@
+"""Server-side prosodic voice features, computed incrementally from streamed audio.
+
+Audio (a WAV file or raw 16-bit little-endian PCM) is fed in arbitrary byte
+chunks as it arrives. Samples are framed (40 ms frames, 10 ms hop) in batches
+of ~0.5 s and every per-frame quantity is computed with NumPy over the whole
+batch: RMS energy, and pitch from an FFT autocorrelation. Only running sums
+and a few frames of context are kept between batches, so memory does not
+grow with recording length.
+
+The features are mapped onto the ``voice_analysis`` keys the workflow already
+reads (``emotional_tone``, ``stress_level``, ``speech_pace``, ...). The
+mapping thresholds are heuristics for phone/laptop microphones, not a
+calibrated emotion model; ``acoustic_features`` carries the raw numbers.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+# Uploads longer than this are rejected (a voice note, not a recording session)
+VOICE_MAX_SECONDS = float(os.getenv("MINDMATE_VOICE_MAX_SECONDS", "300"))
+
+# Multiples of this rate (32/48 kHz) are averaged down to it first; other rates are analysed as-is
+ANALYSIS_RATE = 16000
+FRAME_SECONDS = 0.04
+HOP_SECONDS = 0.01
+BATCH_SECONDS = 0.5
+
+PITCH_MIN_HZ = 75.0
+PITCH_MAX_HZ = 400.0
+# Normalized autocorrelation at the pitch lag above which a frame counts as voiced
+VOICING_THRESHOLD = 0.45
+# A frame is speech if louder than this many dB below the loudest frame so far (and above the floor)
+SPEECH_RANGE_DB = 30.0
+SILENCE_FLOOR_DB = -50.0
+LONG_PAUSE_SECONDS = 0.3
+# A syllable nucleus is a voiced energy peak that is the maximum within +-70 ms and stands out by 2 dB
+SYLLABLE_RADIUS_FRAMES = 7
+SYLLABLE_PROMINENCE_DB = 2.0
+# Frame-to-frame pitch jumps above this are octave/tracking errors, not jitter
+MAX_PITCH_STEP = 0.3
+MIN_SPEECH_SECONDS = 0.5
+
+# voice_analysis mapping
+PACE_SLOW_RATE = 3.0  # syllables per second of speech
+PACE_FAST_RATE = 5.5
+ENERGY_LOW_DB = -32.0  # mean dBFS of speech frames
+ENERGY_HIGH_DB = -16.0
+PITCH_FLAT_SEMITONES = 1.5
+PITCH_WIDE_SEMITONES = 4.0
+JITTER_SHAKY = 0.04
+PAUSE_PRESSURED_RATIO = 0.1
+
+
+class VoiceInputError(ValueError):
+    """Malformed or unsupported audio; answer 400"""
+
+
+class VoiceTooLong(VoiceInputError):
+    """Upload exceeded VOICE_MAX_SECONDS; answer 413"""
+
+
+class ProsodyExtractor:
+    """Incremental energy / pitch / pause / syllable statistics over mono float samples"""
+
+    def __init__(self, sample_rate: int):
+        if not 8000 <= sample_rate <= 48000:
+            raise VoiceInputError(f"Unsupported sample rate {sample_rate} (8000-48000 Hz)")
+        self.input_rate = sample_rate
+        self.decimation = sample_rate // ANALYSIS_RATE if sample_rate % ANALYSIS_RATE == 0 else 1
+        self.rate = sample_rate // self.decimation
+        self.frame_len = int(round(FRAME_SECONDS * self.rate))
+        self.hop = int(round(HOP_SECONDS * self.rate))
+        self.nfft = 1 << (2 * self.frame_len - 1).bit_length()
+        self.lag_min = int(self.rate / PITCH_MAX_HZ)
+        self.lag_max = min(int(self.rate / PITCH_MIN_HZ), self.frame_len - 2)
+        self.window = np.hanning(self.frame_len)
+        # Autocorrelation of the window itself: dividing by it removes the taper's bias towards short lags
+        window_ac = np.fft.irfft(np.abs(np.fft.rfft(self.window, self.nfft)) ** 2, self.nfft)[: self.lag_max + 2]
+        self.window_ac = window_ac / window_ac[0]
+        self.batch_samples = int(BATCH_SECONDS * self.rate)
+
+        self._pending: List[np.ndarray] = []
+        self._pending_samples = 0
+        self._decimation_rest = np.zeros(0)
+        self._tail = np.zeros(0)
+        self.input_samples = 0
+
+        self._frames = 0
+        self._peak_db = -np.inf
+        self._speech_frames = 0
+        self._first_speech: Optional[int] = None
+        self._last_speech: Optional[int] = None
+        self._energy_sum = 0.0
+        self._energy_sq = 0.0
+        self._voiced = 0
+        self._semitone_sum = 0.0
+        self._semitone_sq = 0.0
+        self._jitter_sum = 0.0
+        self._jitter_n = 0
+        self._shimmer_sum = 0.0
+        self._shimmer_n = 0
+        self._last_f0 = np.nan
+        self._last_voiced_db = np.nan
+        self._pause_run = 0
+        self._long_pauses = 0
+        self._syllables = 0
+        # Smoothed energy / voicing of frames whose syllable-peak test still needs right context
+        self._env_db = np.zeros(0)
+        self._env_voiced = np.zeros(0, dtype=bool)
+        self._env_evaluated = 0
+
+    def feed(self, samples: np.ndarray) -> None:
+        """Append mono samples in [-1, 1]; work happens once ~BATCH_SECONDS is buffered"""
+        if not len(samples):
+            return
+        self.input_samples += len(samples)
+        if self.decimation > 1:
+            samples = np.concatenate([self._decimation_rest, samples])
+            usable = len(samples) - len(samples) % self.decimation
+            self._decimation_rest = samples[usable:]
+            samples = samples[:usable].reshape(-1, self.decimation).mean(axis=1)
+        self._pending.append(samples)
+        self._pending_samples += len(samples)
+        if self._pending_samples >= self.batch_samples:
+            self._flush()
+
+    def features(self) -> Dict[str, Any]:
+        """Flush buffered audio and summarize; further feeding continues from the same state"""
+        self._flush()
+        self._evaluate_syllables(final=True)
+        hop_seconds = self.hop / self.rate
+        speech_seconds = self._speech_frames * hop_seconds
+        span = (self._last_speech - self._first_speech + 1) if self._first_speech is not None else 0
+        energy_mean = self._energy_sum / self._speech_frames if self._speech_frames else None
+        semitone_mean = self._semitone_sum / self._voiced if self._voiced else None
+        return {
+            "duration_seconds": round(self.input_samples / self.input_rate, 3),
+            "speech_seconds": round(speech_seconds, 3),
+            "voiced_ratio": round(self._voiced / self._speech_frames, 3) if self._speech_frames else 0.0,
+            "pause_ratio": round(1 - self._speech_frames / span, 3) if span else None,
+            "long_pauses": self._long_pauses,
+            "energy_db_mean": round(energy_mean, 2) if energy_mean is not None else None,
+            "energy_db_std": _std(self._energy_sum, self._energy_sq, self._speech_frames),
+            "pitch_hz_mean": round(100 * 2 ** (semitone_mean / 12), 1) if semitone_mean is not None else None,
+            "pitch_semitone_std": _std(self._semitone_sum, self._semitone_sq, self._voiced),
+            "jitter": round(self._jitter_sum / self._jitter_n, 4) if self._jitter_n else None,
+            "shimmer_db": round(self._shimmer_sum / self._shimmer_n, 3) if self._shimmer_n else None,
+            "syllables": self._syllables,
+            "speaking_rate": round(self._syllables / (span * hop_seconds), 2) if span else None,
+            "articulation_rate": round(self._syllables / speech_seconds, 2) if speech_seconds else None
+        }
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        samples = np.concatenate([self._tail, *self._pending])
+        self._pending, self._pending_samples = [], 0
+        if len(samples) < self.frame_len:
+            self._tail = samples
+            return
+        frames = sliding_window_view(samples, self.frame_len)[:: self.hop]
+        self._tail = samples[len(frames) * self.hop:]
+        self._process(frames)
+
+    def _process(self, frames: np.ndarray) -> None:
+        count = len(frames)
+        rows = np.arange(count)
+        db = 10 * np.log10(np.maximum(np.mean(frames ** 2, axis=1), 1e-12))
+        self._peak_db = max(self._peak_db, float(db.max()))
+        speech = db > max(SILENCE_FLOOR_DB, self._peak_db - SPEECH_RANGE_DB)
+
+        # Pitch: autocorrelation of every frame at once via one batched FFT
+        tapered = (frames - frames.mean(axis=1, keepdims=True)) * self.window
+        spectrum = np.fft.rfft(tapered, self.nfft, axis=1)
+        ac = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, self.nfft, axis=1)[:, : self.lag_max + 2]
+        ac /= self.window_ac
+        energy = np.maximum(ac[:, 0], 1e-12)
+        search = ac[:, self.lag_min: self.lag_max + 1]
+        strongest = search.max(axis=1)
+        # Shortest lag close to the best one, then climb to its local peak (avoids picking sub-octaves)
+        first = np.argmax(search >= 0.85 * strongest[:, None], axis=1)
+        reach = max(self.lag_min // 2, 2)
+        climb = np.minimum(first[:, None] + np.arange(reach), search.shape[1] - 1)
+        best = np.take_along_axis(climb, np.argmax(np.take_along_axis(search, climb, axis=1), axis=1)[:, None], axis=1)[:, 0]
+        lag = best + self.lag_min
+        peak = ac[rows, lag]
+        left, right = ac[rows, lag - 1], ac[rows, lag + 1]
+        curvature = left - 2 * peak + right
+        offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0.0)
+        f0 = self.rate / (lag + np.clip(offset, -0.5, 0.5))
+        voiced = speech & (peak / energy > VOICING_THRESHOLD)
+
+        start = self._frames
+        self._frames += count
+        speech_idx = np.flatnonzero(speech)
+        if len(speech_idx):
+            if self._first_speech is None:
+                self._first_speech = start + int(speech_idx[0])
+            self._last_speech = start + int(speech_idx[-1])
+        self._speech_frames += len(speech_idx)
+        speech_db = db[speech]
+        self._energy_sum += float(speech_db.sum())
+        self._energy_sq += float(np.square(speech_db).sum())
+
+        semitones = 12 * np.log2(f0[voiced] / 100)
+        self._voiced += int(voiced.sum())
+        self._semitone_sum += float(semitones.sum())
+        self._semitone_sq += float(np.square(semitones).sum())
+
+        # Frame-to-frame pitch (jitter) and level (shimmer) changes between consecutive voiced frames
+        track = np.concatenate([[self._last_f0], np.where(voiced, f0, np.nan)])
+        steps = np.abs(np.diff(track)) / ((track[1:] + track[:-1]) / 2)
+        steps = steps[steps <= MAX_PITCH_STEP]
+        self._jitter_sum += float(steps.sum())
+        self._jitter_n += len(steps)
+        level = np.concatenate([[self._last_voiced_db], np.where(voiced, db, np.nan)])
+        level_steps = np.abs(np.diff(level))
+        level_steps = level_steps[~np.isnan(level_steps)]
+        self._shimmer_sum += float(level_steps.sum())
+        self._shimmer_n += len(level_steps)
+        self._last_f0 = track[-1]
+        self._last_voiced_db = level[-1]
+
+        self._count_pauses(speech)
+        self._env_db = np.concatenate([self._env_db, db])
+        self._env_voiced = np.concatenate([self._env_voiced, voiced])
+        self._evaluate_syllables()
+
+    def _count_pauses(self, speech: np.ndarray) -> None:
+        """Silent runs of at least LONG_PAUSE_SECONDS between two speech frames (leading/trailing silence excluded)"""
+        long_frames = int(LONG_PAUSE_SECONDS / HOP_SECONDS)
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], speech, [False]]).astype(np.int8)))
+        position = 0
+        for onset, offset in zip(edges[::2], edges[1::2]):
+            # Silence before this speech run closes the open pause, if speech came before it
+            silence = self._pause_run + (onset - position)
+            if silence >= long_frames and self._first_speech is not None and self._first_speech < self._frames - len(speech) + onset:
+                self._long_pauses += 1
+            self._pause_run = 0
+            position = offset
+        self._pause_run += len(speech) - position
+
+    def _evaluate_syllables(self, final: bool = False) -> None:
+        radius = SYLLABLE_RADIUS_FRAMES
+        db, voiced = self._env_db, self._env_voiced
+        if final:
+            db = np.concatenate([db, np.full(radius, -np.inf)])
+            voiced = np.concatenate([voiced, np.zeros(radius, dtype=bool)])
+        # Peaks need `radius` frames on both sides; frames before the first evaluable one stay as left context
+        end = len(db) - radius
+        begin = max(self._env_evaluated, radius)
+        if end > begin:
+            smooth = np.convolve(db, np.ones(3) / 3, mode="same")
+            smooth[~np.isfinite(smooth)] = -np.inf
+            windows = sliding_window_view(smooth, 2 * radius + 1)[begin - radius: end - radius]
+            centre = smooth[begin:end]
+            finite = np.where(np.isfinite(windows), windows, np.inf)
+            peaks = (
+                (centre >= windows.max(axis=1))
+                & (centre > smooth[begin - 1: end - 1])
+                & (centre - finite.min(axis=1) >= SYLLABLE_PROMINENCE_DB)
+                & voiced[begin:end]
+            )
+            self._syllables += int(peaks.sum())
+            self._env_evaluated = end
+        if final:
+            self._env_db, self._env_voiced, self._env_evaluated = np.zeros(0), np.zeros(0, dtype=bool), 0
+            return
+        # Keep the left context (and the +-1 frame the smoothing reads) for the next batch
+        keep = min(len(self._env_db), len(self._env_db) - self._env_evaluated + radius + 1)
+        drop = len(self._env_db) - keep
+        self._env_db, self._env_voiced = self._env_db[drop:], self._env_voiced[drop:]
+        self._env_evaluated -= drop
+
+
+def _std(total: float, squares: float, count: int) -> Optional[float]:
+    if count < 2:
+        return None
+    variance = max(squares / count - (total / count) ** 2, 0.0)
+    return round(variance ** 0.5, 3)
+
+
+class _WavHeader:
+    """Incremental RIFF/WAVE header parser: buffers bytes until the `data` chunk starts"""
+
+    def __init__(self):
+        self._buffer = b""
+        self.sample_rate = 0
+        self.channels = 0
+        self.sample_format = ""
+        self.done = False
+
+    def feed(self, data: bytes) -> bytes:
+        """Consume header bytes; returns audio payload bytes once the header is complete"""
+        self._buffer += data
+        if len(self._buffer) < 12:
+            return b""
+        if self._buffer[:4] != b"RIFF" or self._buffer[8:12] != b"WAVE":
+            raise VoiceInputError("Not a RIFF/WAVE file")
+        position = 12
+        while position + 8 <= len(self._buffer):
+            chunk_id = self._buffer[position: position + 4]
+            size = int.from_bytes(self._buffer[position + 4: position + 8], "little")
+            body = position + 8
+            if chunk_id == b"data":
+                if not self.channels:
+                    raise VoiceInputError("WAV data chunk before fmt chunk")
+                self.done = True
+                payload, self._buffer = self._buffer[body:], b""
+                return payload
+            if body + size > len(self._buffer):
+                break
+            if chunk_id == b"fmt ":
+                self._parse_format(self._buffer[body: body + size])
+            position = body + size + (size & 1)
+        if len(self._buffer) > 1 << 16:
+            raise VoiceInputError("WAV header too large or missing data chunk")
+        return b""
+
+    def _parse_format(self, fmt: bytes) -> None:
+        if len(fmt) < 16:
+            raise VoiceInputError("Truncated WAV fmt chunk")
+        tag = int.from_bytes(fmt[0:2], "little")
+        self.channels = int.from_bytes(fmt[2:4], "little")
+        self.sample_rate = int.from_bytes(fmt[4:8], "little")
+        bits = int.from_bytes(fmt[14:16], "little")
+        if tag == 0xFFFE and len(fmt) >= 26:
+            # WAVE_FORMAT_EXTENSIBLE: the real format tag leads the sub-format GUID
+            tag = int.from_bytes(fmt[24:26], "little")
+        if tag == 1 and bits == 16:
+            self.sample_format = "pcm16"
+        elif tag == 3 and bits == 32:
+            self.sample_format = "float32"
+        else:
+            raise VoiceInputError(f"Unsupported WAV encoding (format {tag}, {bits}-bit); send 16-bit PCM or 32-bit float")
+        if not 1 <= self.channels <= 8:
+            raise VoiceInputError(f"Unsupported channel count {self.channels}")
+
+
+class VoiceAnalysisStream:
+    """Bytes in (WAV, or raw 16-bit LE PCM at ``sample_rate``), voice_analysis out.
+
+    The container is detected from the first bytes. Only a partial sample and,
+    for WAV, the header are buffered outside the extractor.
+    """
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, max_seconds: float = VOICE_MAX_SECONDS):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = "pcm16"
+        self.max_seconds = max_seconds
+        self.extractor: Optional[ProsodyExtractor] = None
+        self.processing_seconds = 0.0
+        self._header: Optional[_WavHeader] = None
+        self._sniff = b""
+        self._remainder = b""
+
+    def feed(self, data: bytes) -> None:
+        started = time.perf_counter()
+        try:
+            self._feed(data)
+        finally:
+            self.processing_seconds += time.perf_counter() - started
+
+    def _feed(self, data: bytes) -> None:
+        if self.extractor is None:
+            data = self._start(data)
+            if self.extractor is None:
+                return
+        data = self._remainder + data
+        width = (2 if self.sample_format == "pcm16" else 4) * self.channels
+        usable = len(data) - len(data) % width
+        self._remainder = data[usable:]
+        if not usable:
+            return
+        if self.sample_format == "pcm16":
+            samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float64) / 32768.0
+        else:
+            samples = np.frombuffer(data[:usable], dtype="<f4").astype(np.float64)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        if (self.extractor.input_samples + len(samples)) / self.sample_rate > self.max_seconds:
+            raise VoiceTooLong(f"Audio longer than {self.max_seconds:.0f}s")
+        self.extractor.feed(samples)
+
+    def _start(self, data: bytes) -> bytes:
+        """Detect WAV vs raw PCM from the first 4 bytes, then create the extractor"""
+        if self._header is None:
+            self._sniff += data
+            if len(self._sniff) < 4:
+                return b""
+            data, self._sniff = self._sniff, b""
+            if data[:4] != b"RIFF":
+                self.extractor = ProsodyExtractor(self.sample_rate)
+                return data
+            self._header = _WavHeader()
+        data = self._header.feed(data)
+        if not self._header.done:
+            return b""
+        self.sample_rate, self.channels = self._header.sample_rate, self._header.channels
+        self.sample_format = self._header.sample_format
+        self.extractor = ProsodyExtractor(self.sample_rate)
+        return data
+
+    def finish(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        if self.extractor is None:
+            raise VoiceInputError("No audio received" if self._header is None else "WAV file has no data chunk")
+        features = self.extractor.features()
+        self.processing_seconds += time.perf_counter() - started
+        audio_seconds = features["duration_seconds"]
+        voice_analysis = voice_analysis_from_features(features)
+        result = {
+            "voice_analysis": voice_analysis,
+            "features": features,
+            "audio_seconds": audio_seconds,
+            "processing_ms": round(self.processing_seconds * 1000, 2),
+            "realtime_factor": round(audio_seconds / self.processing_seconds, 1) if self.processing_seconds else None
+        }
+        log_event(logger, "voice.analyzed", audio_seconds=audio_seconds, sample_rate=self.sample_rate,
+                  speech_seconds=features["speech_seconds"], processing_ms=result["processing_ms"],
+                  realtime_factor=result["realtime_factor"], tone=voice_analysis.get("emotional_tone"),
+                  stress=voice_analysis.get("stress_level"))
+        return result
+
+
+def voice_analysis_from_features(features: Dict[str, Any]) -> Dict[str, Any]:
+    """Map acoustic features onto the voice_analysis fields the workflow already reads"""
+    speech_seconds = features["speech_seconds"]
+    if speech_seconds < MIN_SPEECH_SECONDS:
+        return {"source": "acoustic", "confidence_score": 0.0, "acoustic_features": features}
+
+    rate = features["articulation_rate"] or 0.0
+    pace = "slow" if rate < PACE_SLOW_RATE else ("fast" if rate > PACE_FAST_RATE else "normal")
+    energy_db = features["energy_db_mean"]
+    energy = "low" if energy_db < ENERGY_LOW_DB else ("high" if energy_db > ENERGY_HIGH_DB else "moderate")
+    spread = features["pitch_semitone_std"]
+    pitch = None if spread is None else (
+        "flat" if spread < PITCH_FLAT_SEMITONES else ("wide" if spread > PITCH_WIDE_SEMITONES else "normal")
+    )
+    jitter = features["jitter"]
+    steadiness = None if jitter is None else ("shaky" if jitter > JITTER_SHAKY else "steady")
+    pause_ratio = features["pause_ratio"]
+
+    stress = (
+        (1.0 if pace == "fast" else 0.0)
+        + (1.0 if steadiness == "shaky" else 0.0)
+        + (0.5 if pitch == "wide" else 0.0)
+        + (0.5 if energy == "high" else 0.0)
+        + (0.5 if pause_ratio is not None and pause_ratio < PAUSE_PRESSURED_RATIO and speech_seconds > 3 else 0.0)
+    )
+    stress_level = "high" if stress >= 2 else ("medium" if stress >= 1 else "low")
+
+    if energy == "low" and (pace == "slow" or pitch == "flat"):
+        tone = "sad"
+    elif stress_level == "high" and energy != "high":
+        tone = "anxious"
+    elif energy == "high" and stress_level != "low" and pitch != "wide":
+        tone = "frustrated"
+    elif energy == "high" and pitch == "wide":
+        tone = "excited"
+    elif stress_level == "low":
+        tone = "calm"
+    else:
+        tone = "neutral"
+
+    # More speech and more voiced frames -> more trustworthy estimates
+    confidence = min(0.3 + 0.08 * speech_seconds, 0.85) * (0.5 + 0.5 * min(features["voiced_ratio"] / 0.5, 1.0))
+    return {
+        "emotional_tone": tone,
+        "stress_level": stress_level,
+        "speech_pace": pace,
+        "confidence_score": round(confidence, 2),
+        "vocal_energy": energy,
+        "pitch_variability": pitch,
+        "voice_steadiness": steadiness,
+        "pause_ratio": pause_ratio,
+        "speaking_rate": features["speaking_rate"],
+        "source": "acoustic",
+        "acoustic_features": features
+    }
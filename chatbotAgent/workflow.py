@@ -1,23 +1,193 @@
 import os
 import json
 import time
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 import threading
-from typing import Dict, Any, Optional, List
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, AsyncIterator, Callable, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
-from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
+from analysis_cache import AnalysisCache, context_fingerprint
+from activity_analytics import ActivityAnalytics
+from memory_index import MemoryIndex
+from risk_triage import RiskTriage, DEFAULT_RULES_PATH, RISK_NONE, RISK_CRITICAL
+from context_planner import (
+    ContextPlanner, compact_fields, estimate_tokens,
+    PRIORITY_CRITICAL, PRIORITY_HIGH, PRIORITY_MEDIUM, PRIORITY_LOW, KEEP_FIRST, KEEP_NEWEST
+)
+from state_backend import create_state_backend
+from summarization_scheduler import SummarizationScheduler, JOB_REJECTED, JOB_SKIPPED
+from session_store import SQLiteSessionStore
+from streaming import StreamingResponseCleaner
+from micro_batcher import MicroBatcher
+from admission import AdmissionController, AdmissionRejected, turn_priority
+from llm_client import LLMClient, LLMUnavailable, DeadlineExceeded, node_deadline
+import metrics
+from metrics import (
+    REGISTRY, NODE_SECONDS, NODE_ERRORS, TURNS, TURN_SECONDS, STRUCTURED_OUTPUT_FAILURES, FALLBACKS,
+    RISK_TRIAGE_SECONDS, RISK_FLAGS
+)
+from tracing import tracer, create_span_exporter
+from structured_logging import configure_logging, log_event, sampled_turn
+from turn_router import (
+    classify_turn, plan_analysis_update,
+    ROUTE_FAST_PATH, ROUTE_ANALYST, ANALYSIS_FULL, ANALYSIS_DELTA, ANALYSIS_REUSED
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    # LangGraph, the Gemini SDK and the fake model pull in most of langchain_core/langsmith (~1s of
+    # imports); they are imported when the workflow is built, so importing this module stays cheap
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langgraph.graph import StateGraph
 
-# Load environment variables
+# Load environment variables (before configure_logging, which reads the MINDMATE_LOG_* settings)
 load_dotenv()
 
+# Configure logging (hot-path events go through log_event: sampled, redacted, written off-thread)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Graph nodes whose LLM output is the user-facing reply (streamed token by token)
+STREAMED_RESPONSE_NODES = {"companion_counselor_response", "light_companion_response"}
+
+# Workflow modes: "two_agent" (analyst then counselor) or "fused" (one structured call for both)
+WORKFLOW_MODES = ("two_agent", "fused")
+DEFAULT_WORKFLOW_MODE = os.getenv("MINDMATE_WORKFLOW_MODE", "two_agent")
+
+# Local router that sends greetings/thanks/acks straight to a lightweight reply (skips Agent 1)
+FAST_PATH_ROUTER_ENABLED = os.getenv("MINDMATE_FAST_PATH_ROUTER", "true").lower() == "true"
+
+# Similarity-keyed cache of full analyses (only analyses are reused, never replies)
+ANALYSIS_CACHE_ENABLED = os.getenv("MINDMATE_ANALYSIS_CACHE", "true").lower() == "true"
+ANALYSIS_CACHE_SIMILARITY = float(os.getenv("MINDMATE_ANALYSIS_CACHE_SIMILARITY", "0.9"))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("MINDMATE_ANALYSIS_CACHE_TTL_SECONDS", "3600"))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("MINDMATE_ANALYSIS_CACHE_MAX_ENTRIES", "2048"))
+
+# Per-user activity-history statistics fed to the analyst as user_patterns (activity_analytics.py)
+ACTIVITY_ANALYTICS_ENABLED = os.getenv("MINDMATE_ACTIVITY_ANALYTICS", "true").lower() == "true"
+ACTIVITY_ANALYTICS_MAX_USERS = int(os.getenv("MINDMATE_ACTIVITY_ANALYTICS_MAX_USERS", "2048"))
+ACTIVITY_ANALYTICS_HISTORY = int(os.getenv("MINDMATE_ACTIVITY_ANALYTICS_HISTORY", "128"))
+ACTIVITY_ANALYTICS_TTL_SECONDS = float(os.getenv("MINDMATE_ACTIVITY_ANALYTICS_TTL_SECONDS", "86400"))
+
+# Per-user retrieval index over past messages and summary insights (memory_index.py): the turns most
+# similar to the current message are added to both agents' prompts, beyond the recent-message window
+MEMORY_INDEX_ENABLED = os.getenv("MINDMATE_MEMORY_INDEX", "true").lower() == "true"
+MEMORY_INDEX_DIMS = int(os.getenv("MINDMATE_MEMORY_INDEX_DIMS", "256"))
+MEMORY_INDEX_MAX_ROWS_PER_USER = int(os.getenv("MINDMATE_MEMORY_INDEX_MAX_ROWS_PER_USER", "20000"))
+MEMORY_INDEX_MAX_TOTAL_ROWS = int(os.getenv("MINDMATE_MEMORY_INDEX_MAX_TOTAL_ROWS", "200000"))
+MEMORY_INDEX_TOP_K = int(os.getenv("MINDMATE_MEMORY_INDEX_TOP_K", "4"))
+MEMORY_INDEX_MIN_SIMILARITY = float(os.getenv("MINDMATE_MEMORY_INDEX_MIN_SIMILARITY", "0.2"))
+
+# Local risk-phrase triage before admission and any model call (risk_triage.py); rules hot-reload from JSON
+RISK_TRIAGE_ENABLED = os.getenv("MINDMATE_RISK_TRIAGE", "true").lower() == "true"
+RISK_RULES_PATH = os.getenv("MINDMATE_RISK_RULES_PATH", "") or DEFAULT_RULES_PATH
+RISK_RULES_RELOAD_SECONDS = float(os.getenv("MINDMATE_RISK_RULES_RELOAD_SECONDS", "5"))
+
+# Per-worker memory bounds for the background summary cache and per-user/session tracking
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("MINDMATE_SUMMARY_CACHE_MAX_ENTRIES", "10000"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("MINDMATE_SUMMARY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("MINDMATE_SUMMARY_CACHE_TTL_SECONDS", "3600"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("MINDMATE_SESSION_CACHE_MAX_ENTRIES", "20000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("MINDMATE_SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("MINDMATE_SESSION_CACHE_TTL_SECONDS", str(6 * 3600)))
+
+# Background summarization pool: fixed workers + bounded per-user-coalesced queue
+SUMMARY_WORKERS = int(os.getenv("MINDMATE_SUMMARY_WORKERS", "2"))
+SUMMARY_QUEUE_SIZE = int(os.getenv("MINDMATE_SUMMARY_QUEUE_SIZE", "256"))
+SUMMARY_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("MINDMATE_SUMMARY_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+
+# Rolling summarization: per-pass input cap, periodic compaction and summary size cap
+SUMMARY_MAX_NEW_MESSAGES = int(os.getenv("MINDMATE_SUMMARY_MAX_NEW_MESSAGES", "30"))
+SUMMARY_COMPACTION_EVERY = int(os.getenv("MINDMATE_SUMMARY_COMPACTION_EVERY", "5"))
+SUMMARY_FIELD_MAX_CHARS = int(os.getenv("MINDMATE_SUMMARY_FIELD_MAX_CHARS", "400"))
+SUMMARY_MAX_INSIGHTS = 8
+SUMMARY_MAX_CHARS = 7 * SUMMARY_FIELD_MAX_CHARS + SUMMARY_MAX_INSIGHTS * SUMMARY_FIELD_MAX_CHARS // 2
+
+# Optional server-side conversation store (SQLite file); clients then only send the new user_message
+SESSION_STORE_PATH = os.getenv("MINDMATE_SESSION_STORE_PATH", "")
+SESSION_STORE_WINDOW = int(os.getenv("MINDMATE_SESSION_STORE_WINDOW", "20"))
+
+# Optional micro-batching of structured analyst/summarizer calls across concurrent requests
+LLM_BATCHING_ENABLED = os.getenv("MINDMATE_LLM_BATCHING", "false").lower() == "true"
+LLM_BATCH_MAX_SIZE = int(os.getenv("MINDMATE_LLM_BATCH_MAX_SIZE", "8"))
+LLM_BATCH_MAX_WAIT_MS = float(os.getenv("MINDMATE_LLM_BATCH_MAX_WAIT_MS", "5"))
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("MINDMATE_LLM_BATCH_MAX_CONCURRENCY", "4"))
+
+# Startup warmup once the workflow is built at app startup (main.py), before /ready turns true:
+# none | local (router, context packing, cleanup code paths) | llm (local + one short call per model client)
+WARMUP_MODE = os.getenv("MINDMATE_WARMUP", "local")
+
+# Tracing: none | memory | jsonl (spans appended to MINDMATE_TRACE_FILE)
+TRACE_EXPORTER = os.getenv("MINDMATE_TRACE_EXPORTER", "none")
+TRACE_FILE_PATH = os.getenv("MINDMATE_TRACE_FILE", "traces.jsonl")
+
+# Model backend: "gemini" (default) or "fake" for offline runs and benchmarks (see fake_llm.py)
+LLM_BACKEND = os.getenv("MINDMATE_LLM_BACKEND", "gemini")
+FAKE_LLM_LATENCY = os.getenv("MINDMATE_FAKE_LLM_LATENCY", "fixed:0")
+FAKE_LLM_FAILURE_RATE = float(os.getenv("MINDMATE_FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_NONE_RATE = float(os.getenv("MINDMATE_FAKE_LLM_NONE_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("MINDMATE_FAKE_LLM_SEED", "0"))
+
+# Outbound LLM client: provider quota (0 = unlimited), per-call timeout, circuit breaker, hedging
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("MINDMATE_LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("MINDMATE_LLM_TOKENS_PER_MINUTE", "0"))
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("MINDMATE_LLM_CALL_TIMEOUT_SECONDS", "30"))
+LLM_CIRCUIT_FAILURES = int(os.getenv("MINDMATE_LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("MINDMATE_LLM_CIRCUIT_RESET_SECONDS", "30"))
+# Send a second attempt once a structured call outlives this latency percentile (0 disables hedging)
+LLM_HEDGE_PERCENTILE = float(os.getenv("MINDMATE_LLM_HEDGE_PERCENTILE", "0.95"))
+# Whole-turn deadline; Agent 1 gets ANALYST_DEADLINE_SHARE of it, the reply node whatever is left
+TURN_DEADLINE_SECONDS = float(os.getenv("MINDMATE_TURN_DEADLINE_SECONDS", "25"))
+ANALYST_DEADLINE_SHARE = float(os.getenv("MINDMATE_ANALYST_DEADLINE_SHARE", "0.45"))
+
+# Admission control in front of the workflow (MINDMATE_ADMISSION_MAX_IN_FLIGHT=0 disables it)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("MINDMATE_ADMISSION_MAX_IN_FLIGHT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("MINDMATE_ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_DEGRADE_QUEUE_DEPTH = int(os.getenv("MINDMATE_ADMISSION_DEGRADE_QUEUE_DEPTH", "16"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("MINDMATE_ADMISSION_QUEUE_TIMEOUT_SECONDS", "20"))
+
+# Where summaries, summarization counters and session analyses live: "memory" (per worker) or
+# "sqlite" (one WAL file shared by every worker on the host). With affinity on, a user's
+# background summaries are only scheduled by the worker holding that user's lease.
+STATE_BACKEND = os.getenv("MINDMATE_STATE_BACKEND", "memory")
+STATE_DB_PATH = os.getenv("MINDMATE_STATE_DB_PATH", "mindmate_state.db")
+SUMMARY_AFFINITY_ENABLED = os.getenv("MINDMATE_SUMMARY_AFFINITY", "false").lower() == "true"
+SUMMARY_AFFINITY_LEASE_SECONDS = float(os.getenv("MINDMATE_SUMMARY_AFFINITY_LEASE_SECONDS", "300"))
+
+# Per-stage prompt context budgets in estimated tokens; MINDMATE_CONTEXT_BUDGET_SCALE moves them all at once
+CONTEXT_BUDGET_SCALE = float(os.getenv("MINDMATE_CONTEXT_BUDGET_SCALE", "1.0"))
+CONTEXT_BUDGETS = {
+    stage: int(int(os.getenv(f"MINDMATE_CONTEXT_BUDGET_{stage.upper()}", default)) * CONTEXT_BUDGET_SCALE)
+    for stage, default in (
+        ("analyst", "300"), ("analyst_delta", "200"), ("response", "400"), ("light", "120"), ("fused", "500")
+    )
+}
+# Newest messages / activities offered to the planner; the budget decides how many actually fit
+CONTEXT_CANDIDATE_MESSAGES = 12
+CONTEXT_CANDIDATE_ACTIVITIES = 5
+
+# Compact `label=value` renderings, most important fields first (trailing fields are dropped first)
+ANALYSIS_LABELS = {
+    "emotional_state": "emotion", "intervention_priority": "priority", "stress_categories": "stress",
+    "therapeutic_approach": "approach", "psychological_insights": "insights", "coping_assessment": "coping",
+    "cultural_pressures": "culture", "language_style": "language", "activity_recommendations": "activities"
+}
+VOICE_LABELS = {
+    "emotional_tone": "tone", "stress_level": "stress", "speech_pace": "pace",
+    # Acoustic fields from /voice/analyze (voice_features.py)
+    "vocal_energy": "energy", "pitch_variability": "pitch", "voice_steadiness": "steadiness",
+    "pause_ratio": "pauses", "speaking_rate": "syll/s",
+    "cultural_context": "culture", "insights": "insights"
+}
+SUMMARY_LABELS = {
+    "therapeutic_progress": "Progress", "emotional_patterns": "Patterns", "cultural_context": "Culture",
+    "stress_evolution": "Stress", "key_insights": "Insights", "intervention_history": "Interventions",
+    "language_preferences": "Language"
+}
+
 # Pydantic models for psychology-focused 2-agent architecture
 class PsychologicalAnalysis(BaseModel):
     """Psychology-focused analysis for Indian youth mental wellness"""
@@ -31,6 +201,14 @@ class PsychologicalAnalysis(BaseModel):
     intervention_priority: str = Field(description="Immediate/supportive/long-term intervention needs")
     activity_recommendations: List[str] = Field(description="Psychology-based instant and long-term activities")
 
+class PsychologicalAnalysisDelta(BaseModel):
+    """Turn-to-turn update of the fast-changing PsychologicalAnalysis fields"""
+    emotional_state: str = Field(description="Current emotional condition with psychological markers")
+    stress_categories: List[str] = Field(description="Academic/Family/Social/Emotional/Identity/Career/Miscellaneous stress types")
+    psychological_insights: List[str] = Field(description="2-3 key psychology-based observations")
+    coping_assessment: str = Field(description="Current coping mechanisms and psychological resilience")
+    intervention_priority: str = Field(description="Immediate/supportive/long-term intervention needs")
+
 class ConversationSummary(BaseModel):
     """Contextual conversation summarization preserving therapeutic progress"""
     therapeutic_progress: str = Field(description="Therapeutic journey and breakthrough moments")
@@ -41,46 +219,226 @@ class ConversationSummary(BaseModel):
     stress_evolution: str = Field(description="How stress categories and levels have changed")
     intervention_history: str = Field(description="Therapeutic approaches used and their effectiveness")
 
+# PSYCHOLOGY + COMPANION STYLE SYSTEM PROMPT for Indian youth (Agent 2 and fused mode)
+COMPANION_SYSTEM_PROMPT = """You are MindMate, a culturally-aware AI therapeutic companion specialized in Indian youth mental wellness (ages 16-25). Generate a response that combines professional psychology expertise with warm, companion-style delivery.
+
+COMPANION COUNSELOR RESPONSE GUIDELINES:
+
+PSYCHOLOGY EXPERTISE:
+- Apply CBT techniques: cognitive restructuring, thought challenging, behavioral activation
+- Use ACT principles: values clarification, psychological flexibility, mindful awareness
+- Employ MBCT approaches: emotional regulation, present-moment awareness, self-compassion
+- Address stress categories identified in analysis (academic/family/social/emotional/identity/career)
+
+CULTURAL SENSITIVITY (Indian Youth Context):
+- Understand academic pressure (board exams, competitive exams, parental expectations)
+- Acknowledge family dynamics (joint family, traditional vs modern values, generation gap)
+- Respect cultural nuances (festivals affecting mood, arranged marriage discussions, career path pressures)
+- Be sensitive to mental health stigma and family involvement considerations
+
+COMPANION DELIVERY STYLE:
+- Use warm, friend-like tone while maintaining professional boundaries
+- Match user's language comfort level (if they use "yaar/bhai", mirror appropriately)
+- Be empathetic and non-judgmental, like talking to a caring friend who understands psychology
+- Validate cultural struggles without dismissing traditional values
+- Ask thoughtful questions (if needed) that promote self-exploration 
+- Provide practical coping strategies suitable for Indian family/social context
+
+IMPORTANT: Generate ONLY the natural conversation response. Do NOT include:
+- Numbered annotations (1., 2., 3.)
+- Technique labels in parentheses (CBT), (ACT), (MBCT)
+- Structural annotations (validation), (reframe), (strategy)
+- Any meta-commentary about the response structure
+
+Don't be rigid in response structure - blend elements naturally.
+ Keep responses conversational and appropriately sized for the context. 
+For normal chats keep it concise for 2-way communication, but provide deeper responses when user needs more support.
+"""
+
+# Short system prompt for fast-path turns (greetings, thanks, acknowledgements, trivial questions)
+LIGHT_COMPANION_SYSTEM_PROMPT = """You are MindMate, a warm, culturally-aware companion for Indian youth (ages 16-25).
+The user sent a short, low-signal message (greeting, thanks, acknowledgement or a simple question).
+Reply in 1-2 natural sentences, mirror their language style (English/Hinglish), answer simple questions directly,
+and if it fits, gently invite them to share how they are doing. No labels, annotations or meta-commentary."""
+
+# Added to Agent 1 / fused prompts when local risk triage flags the message
+RISK_ANALYSIS_GUIDANCE = {
+    "critical": "RISK SCREEN: the message matched suicide/self-harm intent phrases. Set intervention priority to immediate unless the context clearly rules it out (e.g. quoting a song or film).",
+    "high": "RISK SCREEN: the message matched self-harm, passive death wish or danger phrases. Assess risk explicitly; use immediate priority if it is plausible.",
+    "elevated": "RISK SCREEN: the message contains hopelessness/burden phrases. Check for underlying risk before choosing the priority."
+}
+
+# Added to Agent 2 / fused replies for critical and high triage levels
+RISK_SAFETY_RESPONSE = """SAFETY: the user may be at risk of harming themselves. Respond calmly and take it seriously; do not lecture or panic.
+Acknowledge their pain, ask gently and directly whether they are safe right now, and encourage them to reach out to someone they trust.
+Share Tele-MANAS (free, 24x7): 14416 or 1-800-891-4416, and 112 if they are in immediate danger. Stay with them in the conversation."""
+RISK_RESPONSE_GUIDANCE = {"critical": RISK_SAFETY_RESPONSE, "high": RISK_SAFETY_RESPONSE}
+
+# session_insights for fast-path turns when the session has no earlier analysis yet
+LIGHT_TURN_ANALYSIS = {
+    "emotional_state": "Not assessed (light conversational turn)",
+    "stress_categories": [],
+    "therapeutic_approach": "Person-centered",
+    "cultural_pressures": "",
+    "language_style": "",
+    "psychological_insights": [],
+    "coping_assessment": "",
+    "intervention_priority": "supportive",
+    "activity_recommendations": []
+}
+
+class FusedCompanionTurn(PsychologicalAnalysis):
+    """Single-pass output: the psychological analysis plus the companion reply it informs"""
+    response: str = Field(description="Natural, conversational MindMate reply to the user's current message, guided by the analysis above")
+
 class MindMateWorkflow:
     """Psychology-focused 2-agent workflow with background summarization"""
     
     def __init__(self):
         logger.info("🧠 [WORKFLOW] Initializing MindMate Psychology Workflow...")
+        # Per-phase build time (ms), incl. the deferred model SDK / LangGraph imports; reported by /ready
+        self.build_timings = {}
+        started = time.perf_counter()
         self.llm = self._initialize_llm()
         # Psychology-focused structured LLMs
         try:
             self.analyst_llm = self.llm.with_structured_output(PsychologicalAnalysis)
+            self.analyst_delta_llm = self.llm.with_structured_output(PsychologicalAnalysisDelta)
             self.summarizer_llm = self.llm.with_structured_output(ConversationSummary)
+            # Fused mode returns analysis + reply in one call, so it needs a larger output budget
+            self.fused_llm = self._initialize_llm(max_tokens=700).with_structured_output(FusedCompanionTurn)
             logger.info("✅ [WORKFLOW] Psychology-focused 2-agent + background summarizer LLMs initialized successfully")
+            self.batchers = {}
+            if LLM_BATCHING_ENABLED:
+                # Same invoke/ainvoke surface, so call sites do not change
+                self.analyst_llm = self._batched("analyst", self.analyst_llm)
+                self.analyst_delta_llm = self._batched("analyst_delta", self.analyst_delta_llm)
+                self.summarizer_llm = self._batched("summarizer", self.summarizer_llm)
+                logger.info(f"📦 [WORKFLOW] LLM micro-batching enabled (max {LLM_BATCH_MAX_SIZE}, {LLM_BATCH_MAX_WAIT_MS}ms)")
+            # Every model call goes through one client so quota, deadlines and the breaker are shared
+            self.llm_client = LLMClient(
+                requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                default_timeout_seconds=LLM_CALL_TIMEOUT_SECONDS,
+                failure_threshold=LLM_CIRCUIT_FAILURES,
+                reset_seconds=LLM_CIRCUIT_RESET_SECONDS,
+                hedge_percentile=LLM_HEDGE_PERCENTILE or None
+            )
+            # The reply is streamed token by token, so a hedge would emit duplicate text
+            self.llm = self.llm_client.wrap(self.llm, "companion", max_output_tokens=300, hedge=False)
+            self.analyst_llm = self.llm_client.wrap(self.analyst_llm, "analyst")
+            self.analyst_delta_llm = self.llm_client.wrap(self.analyst_delta_llm, "analyst_delta")
+            self.summarizer_llm = self.llm_client.wrap(self.summarizer_llm, "summarizer")
+            self.fused_llm = self.llm_client.wrap(self.fused_llm, "fused", max_output_tokens=700)
+            self.build_timings["llm_clients"] = round((time.perf_counter() - started) * 1000, 1)
         except Exception as e:
             logger.error(f"❌ [WORKFLOW] Failed to initialize psychology LLMs: {e}")
             raise e
-        self.workflow = self._create_workflow()
         
-        # Background summarization tracking
-        self._summarization_cache = {}
+        if DEFAULT_WORKFLOW_MODE not in WORKFLOW_MODES:
+            raise ValueError(f"MINDMATE_WORKFLOW_MODE must be one of {WORKFLOW_MODES}, got '{DEFAULT_WORKFLOW_MODE}'")
+        self.default_mode = DEFAULT_WORKFLOW_MODE
+        started = time.perf_counter()
+        self.workflows = {mode: self._create_workflow(mode) for mode in WORKFLOW_MODES}
+        self.build_timings["graphs"] = round((time.perf_counter() - started) * 1000, 1)
+        self.workflow = self.workflows[self.default_mode]
+        logger.info(f"🔀 [WORKFLOW] Default workflow mode: {self.default_mode}")
+        
+        # Background summarization tracking (bounded so long-running workers stay flat in memory)
+        self.state_backend = create_state_backend(STATE_BACKEND, STATE_DB_PATH)
+        self._summarization_cache = self.state_backend.cache(
+            "summaries", SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_MAX_BYTES, SUMMARY_CACHE_TTL_SECONDS
+        )
+        self._last_summarization_count = self.state_backend.cache(
+            "summarization_counts", SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_MAX_BYTES, SESSION_CACHE_TTL_SECONDS
+        )
+        # Last psychological analysis per session (fast-path router + incremental analysis)
+        self._session_analyses = self.state_backend.cache(
+            "session_analyses", SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_MAX_BYTES, SESSION_CACHE_TTL_SECONDS
+        )
+        if self.state_backend.name != "memory":
+            logger.info(f"🗄️ [WORKFLOW] Shared state backend: {self.state_backend.name} ({STATE_DB_PATH})")
+        self.session_store = SQLiteSessionStore(SESSION_STORE_PATH) if SESSION_STORE_PATH else None
+        if self.session_store:
+            logger.info(f"🗄️ [WORKFLOW] Server-side session store enabled at {SESSION_STORE_PATH}")
+        self.summarization_scheduler = SummarizationScheduler(
+            self._run_summarization_job,
+            workers=SUMMARY_WORKERS,
+            max_pending=SUMMARY_QUEUE_SIZE
+        )
+        self.admission = AdmissionController(
+            max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+            max_queue=ADMISSION_MAX_QUEUE,
+            degrade_queue_depth=ADMISSION_DEGRADE_QUEUE_DEPTH,
+            queue_timeout_seconds=ADMISSION_QUEUE_TIMEOUT_SECONDS
+        ) if ADMISSION_MAX_IN_FLIGHT > 0 else None
+        self.analysis_cache = AnalysisCache(
+            max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+            ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+            similarity_threshold=ANALYSIS_CACHE_SIMILARITY
+        ) if ANALYSIS_CACHE_ENABLED else None
+        self.activity_analytics = ActivityAnalytics(
+            max_users=ACTIVITY_ANALYTICS_MAX_USERS,
+            history_per_game=ACTIVITY_ANALYTICS_HISTORY,
+            ttl_seconds=ACTIVITY_ANALYTICS_TTL_SECONDS
+        ) if ACTIVITY_ANALYTICS_ENABLED else None
+        self.memory_index = MemoryIndex(
+            dims=MEMORY_INDEX_DIMS,
+            max_rows_per_user=MEMORY_INDEX_MAX_ROWS_PER_USER,
+            max_total_rows=MEMORY_INDEX_MAX_TOTAL_ROWS,
+            min_similarity=MEMORY_INDEX_MIN_SIMILARITY
+        ) if MEMORY_INDEX_ENABLED else None
+        self.risk_triage = RiskTriage(RISK_RULES_PATH, RISK_RULES_RELOAD_SECONDS) if RISK_TRIAGE_ENABLED else None
+        if self.risk_triage:
+            logger.info(f"🛟 [WORKFLOW] Risk triage rules {self.risk_triage.matcher.version} loaded from {RISK_RULES_PATH}")
+        # Queue/cache/circuit gauges are read from the stats() methods at scrape time
+        REGISTRY.register_collector("workflow", self._metric_families)
+        tracer.set_exporter(create_span_exporter(TRACE_EXPORTER, TRACE_FILE_PATH))
         logger.info("✅ [WORKFLOW] MindMate Workflow fully initialized and ready for voice-enhanced therapy")
-        self._last_summarization_count = {}
     
-    def _initialize_llm(self) -> ChatGoogleGenerativeAI:
+    def _initialize_llm(self, max_tokens: int = 300) -> "BaseChatModel":
+        if LLM_BACKEND == "fake":
+            from fake_llm import create_fake_llm
+            return create_fake_llm(max_tokens, FAKE_LLM_LATENCY, FAKE_LLM_FAILURE_RATE, FAKE_LLM_NONE_RATE, FAKE_LLM_SEED)
+        if LLM_BACKEND != "gemini":
+            raise ValueError(f"MINDMATE_LLM_BACKEND must be 'gemini' or 'fake', got '{LLM_BACKEND}'")
+        
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
         
+        from langchain_google_genai import ChatGoogleGenerativeAI
         return ChatGoogleGenerativeAI(
             model="gemini-1.5-flash",
             google_api_key=api_key,
-            timeout=30,
-            max_tokens=300,  # Reduced for faster responses
+            timeout=LLM_CALL_TIMEOUT_SECONDS,
+            max_tokens=max_tokens,  # Reduced for faster responses
             temperature=0.3,
             top_p=0.8,
             max_retries=1
         )
     
-    def _should_trigger_background_summarization(self, user_id: str, recent_messages: List) -> bool:
+    def _batched(self, name: str, runnable: Any) -> MicroBatcher:
+        batcher = MicroBatcher(
+            runnable, name,
+            max_batch=LLM_BATCH_MAX_SIZE,
+            max_wait_ms=LLM_BATCH_MAX_WAIT_MS,
+            max_concurrency=LLM_BATCH_MAX_CONCURRENCY
+        )
+        self.batchers[name] = batcher
+        return batcher
+    
+    def _should_trigger_background_summarization(self, user_id: str, recent_messages: List, history_stats: Optional[Dict] = None) -> bool:
         """Check if background summarization should be triggered (much stricter criteria)"""
-        current_count = len(recent_messages)
-        last_count = self._last_summarization_count.get(user_id, 0)
+        counter_key = self._summary_key(user_id, history_stats)
+        if history_stats:
+            # Server-side store keeps rolling counters, so this is O(1) regardless of history length
+            current_count = history_stats["message_count"]
+            total_length = history_stats["total_chars"]
+        else:
+            current_count = len(recent_messages)
+            total_length = sum(len(msg.get("content", "")) for msg in recent_messages)
+        last_count = self._last_summarization_count.get(counter_key, 0)
         
         # Only trigger summarization if:
         # 1. Messages increased by 10+ since last summarization, AND
@@ -88,7 +446,6 @@ class MindMateWorkflow:
         # 3. Total conversation length > 3000 characters
         
         message_increase = current_count - last_count
-        total_length = sum(len(msg.get("content", "")) for msg in recent_messages)
         
         should_summarize = (
             message_increase >= 10 and current_count > 15
@@ -97,127 +454,396 @@ class MindMateWorkflow:
         )
         
         if should_summarize:
-            logger.info(f"🔄 Background summarization triggered for user {user_id}: {current_count} messages (+{message_increase}), {total_length} chars")
-            self._last_summarization_count[user_id] = current_count
+            log_event(logger, "summarization.triggered", user_id=user_id, messages=current_count,
+                      new_messages=message_increase, chars=total_length)
         
         return should_summarize
     
-    def _background_summarization(self, user_id: str, recent_messages: List, conversation_summary: Dict, psychological_analysis: Dict):
-        """Run summarization in background thread (non-blocking)"""
+    def _schedule_background_summarization(self, final_state: Dict[str, Any]) -> str:
+        """Hand the finished turn to the summarization pool (non-blocking)"""
+        user_id = final_state.get("user_id", "anonymous")
+        recent_messages = final_state.get("recent_messages", [])
+        history_stats = final_state.get("history_stats")
+        counter_key = self._summary_key(user_id, history_stats)
+        current_count = history_stats["message_count"] if history_stats else len(recent_messages)
+        
+        if SUMMARY_AFFINITY_ENABLED and not self.state_backend.acquire_lease(f"summary:{user_id}", SUMMARY_AFFINITY_LEASE_SECONDS):
+            return JOB_SKIPPED
+        # Claim the counter first so that, with shared state, only one worker schedules this pass
+        previous_count = self._last_summarization_count.get(counter_key, 0)
+        if not self._last_summarization_count.advance(counter_key, current_count):
+            return JOB_SKIPPED
+        
+        status = self.summarization_scheduler.submit(counter_key, {
+            "user_id": user_id,
+            "recent_messages": recent_messages,
+            "conversation_summary": final_state.get("conversation_summary", {}),
+            "psychological_analysis": final_state.get("psychological_analysis", {}),
+            "history_stats": history_stats,
+            # The job runs on a worker thread, outside this turn's span context
+            "trace_context": tracer.context()
+        })
+        if status == JOB_REJECTED:
+            # Hand the claim back so a later turn retries once the queue has room; compare-and-set,
+            # so a count another worker advanced past ours in the meantime is left alone
+            self._last_summarization_count.compare_and_set(counter_key, current_count, previous_count)
+            log_event(logger, "summarization.rejected", logging.WARNING, user_id=user_id, reason="queue_full")
+        return status
+    
+    async def _shared_state(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call into the state backend from a graph node; SQLite reads and writes run in a thread
+        so they never block the event loop (in-memory caches are called directly)"""
+        if self.state_backend.name == "memory":
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+    
+    def _summary_key(self, user_id: str, history_stats: Optional[Dict] = None) -> str:
+        """Key for the summary, its pass counter and compaction state: the session when history is
+        server-side (each session has its own log), else the user (the client window is per user)"""
+        return history_stats["session_id"] if history_stats else user_id
+    
+    def _run_summarization_job(self, job: Dict[str, Any]) -> None:
+        """Scheduler entry point: run the job as a child span of the turn that queued it"""
+        trace_context = job.pop("trace_context", None)
+        with tracer.span("background_summarization", parent=trace_context, user_id=job["user_id"]):
+            self._background_summarization(**job)
+    
+    def _background_summarization(
+        self,
+        user_id: str,
+        recent_messages: List,
+        conversation_summary: Dict,
+        psychological_analysis: Dict,
+        history_stats: Optional[Dict] = None
+    ):
+        """Run rolling summarization in background thread: old summary + only the messages added since"""
         try:
-            logger.info(f"📝 Background summarizer: Processing {len(recent_messages)} messages for user {user_id}")
+            summary_key = self._summary_key(user_id, history_stats)
+            cached = self._summarization_cache.get(summary_key) or {}
+            existing_summary = cached.get('summary') or conversation_summary or {}
+            summarized_count = cached.get('message_count', 0)
+            passes_since_compaction = cached.get('passes_since_compaction', 0)
             
-            # Format all messages for comprehensive summarization
-            conversation_text = self._format_messages_for_summarization(recent_messages)
+            if history_stats and self.session_store:
+                # Full history lives in the store: read only what was added since the last summary
+                session_id = history_stats["session_id"]
+                summarized_count = history_stats.get("summarized_count", 0)
+                summarized_count, new_messages = self.session_store.messages_since(
+                    session_id, summarized_count, SUMMARY_MAX_NEW_MESSAGES
+                )
+                # The read includes the turn appended after history_stats was taken: record the offset
+                # actually reached so the next pass starts after it instead of re-reading that turn
+                total_count = summarized_count + len(new_messages)
+            else:
+                total_count = len(recent_messages)
+                if summarized_count > len(recent_messages):
+                    # Client window shrank/reset: we can't line counts up, so treat the tail as new
+                    summarized_count = max(len(recent_messages) - SUMMARY_MAX_NEW_MESSAGES, 0)
+                new_messages = recent_messages[summarized_count:]
+                if len(new_messages) > SUMMARY_MAX_NEW_MESSAGES:
+                    # Bound per-pass input; older unsummarized turns only survive via the analysis/summary
+                    summarized_count = len(recent_messages) - SUMMARY_MAX_NEW_MESSAGES
+                    new_messages = recent_messages[summarized_count:]
+            
+            compact = bool(existing_summary) and (
+                passes_since_compaction + 1 >= SUMMARY_COMPACTION_EVERY
+                or self._summary_size(existing_summary) > SUMMARY_MAX_CHARS
+            )
+            mode = "compaction" if compact else ("incremental" if existing_summary else "initial")
+            tracer.annotate(mode=mode, new_messages=len(new_messages), total_messages=total_count)
+            
+            conversation_text = self._format_messages_for_summarization(new_messages, start_index=summarized_count + 1)
+            analysis_text = ", ".join(
+                f"{key}={psychological_analysis[key]}"
+                for key in ("emotional_state", "stress_categories", "therapeutic_approach", "intervention_priority")
+                if psychological_analysis.get(key)
+            ) or "None"
+            size_rule = f"Keep each field under {SUMMARY_FIELD_MAX_CHARS} characters and at most {SUMMARY_MAX_INSIGHTS} key insights."
+            
+            if compact:
+                instructions = f"""COMPACTION PASS: Rewrite the existing summary into a tighter version.
+- Merge duplicates, drop stale or superseded details, keep breakthroughs and what worked/didn't
+- Fold in the new messages below
+- {size_rule}"""
+            else:
+                instructions = f"""ROLLING UPDATE: Update the existing summary with ONLY the new messages below.
+- Keep everything from the existing summary that is still relevant
+- Add new therapeutic progress, emotional patterns, cultural context, language preferences
+- Record approaches that worked/didn't work and stress/coping changes
+- {size_rule}"""
             
             # COMBINED PROMPT for structured output (Gemini works better with single comprehensive prompt)
-            combined_prompt = f"""Create a comprehensive therapeutic summary for Indian youth mental wellness continuation.
+            combined_prompt = f"""Maintain a therapeutic conversation summary for Indian youth mental wellness continuation.
 
-COMPREHENSIVE SUMMARIZATION GUIDELINES:
-- Preserve ALL therapeutic progress and breakthrough moments
-- Track emotional patterns and psychological developments over time
-- Maintain cultural context (family dynamics, academic pressures, Indian youth challenges)
-- Document language preferences and communication evolution
-- Record therapeutic approaches that worked/didn't work
-- Identify stress pattern changes and coping mechanism development
-- Preserve important personal details for therapeutic continuity
+{instructions}
 
 EXISTING SUMMARY:
-{json.dumps(conversation_summary, indent=1) if conversation_summary else 'No previous summary'}
+{json.dumps(existing_summary, ensure_ascii=False, separators=(',', ':')) if existing_summary else 'No previous summary'}
 
-FULL CONVERSATION TO SUMMARIZE:
+NEW MESSAGES SINCE LAST SUMMARY:
 {conversation_text}
 
-LATEST PSYCHOLOGICAL ANALYSIS:
-{json.dumps(psychological_analysis, indent=1)}
-
-Create a rich summary that enables seamless therapeutic conversation continuation."""
+LATEST PSYCHOLOGICAL ANALYSIS: {analysis_text}"""
 
             # Generate summary in background (single HumanMessage for better Gemini compatibility)
+            tracer.annotate(prompt_chars=len(combined_prompt))
             summary = self.summarizer_llm.invoke([HumanMessage(content=combined_prompt)])
             
+            if not summary:
+                STRUCTURED_OUTPUT_FAILURES.labels("summarizer").inc()
             if summary:
                 # Cache the summary for future use
-                self._summarization_cache[user_id] = {
-                    'summary': summary.dict(),
-                    'timestamp': datetime.now(),
-                    'message_count': len(recent_messages)
-                }
-                logger.info(f"✅ Background summarization completed for user {user_id}")
+                capped_summary = self._cap_summary(summary.dict())
+                self._summarization_cache.set(summary_key, {
+                    'summary': capped_summary,
+                    'timestamp': datetime.now().isoformat(),
+                    'message_count': total_count,
+                    'passes_since_compaction': 0 if compact else passes_since_compaction + 1,
+                    'mode': mode
+                })
+                if history_stats and self.session_store:
+                    self.session_store.save_summary(history_stats["session_id"], capped_summary, total_count)
+                if self.memory_index and user_id != "anonymous":
+                    # Insights outlive compaction passes that drop them from the summary itself
+                    self.memory_index.add(user_id, [
+                        {"text": insight, "role": "summary", "kind": "insight"} for insight in capped_summary.get("key_insights", [])
+                    ])
+                log_event(logger, "summarization.completed", user_id=user_id, mode=mode,
+                          new_messages=len(new_messages), total_messages=total_count, prompt_chars=len(combined_prompt))
             else:
-                logger.warning(f"⚠️ Background summarization failed for user {user_id}")
+                log_event(logger, "summarization.failed", logging.WARNING, user_id=user_id, mode=mode, reason="no_structured_result")
                 
         except Exception as e:
-            logger.error(f"❌ Background summarization error for user {user_id}: {e}")
+            tracer.annotate(error=f"{type(e).__name__}: {e}"[:500])
+            log_event(logger, "summarization.failed", logging.ERROR, user_id=user_id, error=f"{type(e).__name__}: {e}")
+    
+    def _summary_size(self, summary: Dict) -> int:
+        return len(json.dumps(summary, ensure_ascii=False, separators=(',', ':')))
     
-    def _get_effective_conversation_summary(self, user_id: str, conversation_summary: Dict) -> Dict:
+    def _cap_summary(self, summary: Dict) -> Dict:
+        """Hard cap on summary size so it can't grow with session length"""
+        capped = {}
+        for key, value in summary.items():
+            if isinstance(value, str):
+                capped[key] = value[:SUMMARY_FIELD_MAX_CHARS]
+            elif isinstance(value, list):
+                capped[key] = [str(item)[:SUMMARY_FIELD_MAX_CHARS // 2] for item in value[:SUMMARY_MAX_INSIGHTS]]
+            else:
+                capped[key] = value
+        return capped
+    
+    def _get_effective_conversation_summary(self, summary_key: str, conversation_summary: Dict) -> Dict:
         """Get the most up-to-date summary (from cache or provided)"""
-        cached_summary = self._summarization_cache.get(user_id)
+        # Entries expire after SUMMARY_CACHE_TTL_SECONDS, so anything returned is fresh
+        cached_summary = self._summarization_cache.get(summary_key)
         
         if cached_summary:
-            cached_timestamp = cached_summary['timestamp']
-            # Use cached summary if it's recent (within last hour)
-            if (datetime.now() - cached_timestamp).seconds < 3600:
-                logger.info(f"📋 Using cached summary for user {user_id}")
-                return cached_summary['summary']
+            return cached_summary['summary']
         
         # Use provided summary or empty dict
         return conversation_summary or {}
     
-    def psychological_analyst(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Agent 1: Psychology-focused analysis for Indian youth mental wellness"""
-        logger.info("🧠 Psychology Agent 1: Indian youth mental wellness analysis starting...")
+    def _session_key(self, state: Dict[str, Any]) -> str:
+        """Per-conversation key: session_id when the client sends one, else user_id"""
+        return state.get("session_id") or state.get("user_id", "anonymous")
+    
+    async def turn_router(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Entry node: local, sub-millisecond classification of the turn (no LLM call)"""
+        decision = classify_turn(
+            state["user_message"],
+            await self._shared_state(self._previous_analysis, state),
+            state.get("voice_analysis", {}),
+            self._risk_level(state)
+        )
+        state["route_decision"] = decision
+        tracer.annotate(route=decision["route"], reason=decision["reason"])
+        log_event(logger, "router", route=decision["route"], reason=decision["reason"], elapsed_us=decision["elapsed_us"])
+        return state
+    
+    def _route_after_router(self, state: Dict[str, Any]) -> str:
+        return state.get("route_decision", {}).get("route", ROUTE_ANALYST)
+    
+    async def light_companion_response(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Fast path: brief companion reply without running the psychological analyst"""
+        context = self._prepare_response_context(state, "light", include_analysis=False)
+        immediate_context = self._format_immediate_context_for_response(context["recent_context"], state["user_message"])
+        self._record_context_usage(state, context["usage"], LIGHT_COMPANION_SYSTEM_PROMPT + immediate_context)
+        
+        with node_deadline(state.get("deadline")):
+            response = await self.llm.ainvoke([
+                SystemMessage(content=LIGHT_COMPANION_SYSTEM_PROMPT),
+                HumanMessage(content=immediate_context)
+            ])
+        
+        if not response or not response.content:
+            raise ValueError("Light companion: LLM returned empty response")
+        
+        # Keep the session's last real analysis for insights; never overwrite it with the placeholder
+        previous_analysis = await self._shared_state(self._previous_analysis, state)
+        state["psychological_analysis"] = dict(previous_analysis or LIGHT_TURN_ANALYSIS)
+        with tracer.span("clean_response"):
+            state["ai_response"] = self._clean_response(response.content)
+        state["response_generated"] = True
         
+        log_event(logger, "light_response", prompt_tokens=state["context_usage"]["light"]["prompt_tokens"],
+                  reply_chars=len(state["ai_response"]))
+        return state
+    
+    def _prepare_analysis_context(self, state: Dict[str, Any], stage: str = "analyst") -> Dict[str, Any]:
+        """Pack summary, recent turns, activities and voice data into the stage's token budget"""
+        with tracer.span("build_context", stage=stage):
+            return self._pack_analysis_context(state, stage)
+    
+    def _pack_analysis_context(self, state: Dict[str, Any], stage: str) -> Dict[str, Any]:
         user_id = state.get("user_id", "anonymous")
-        recent_messages = state.get("recent_messages", [])
-        conversation_summary = state.get("conversation_summary", {})
-        
-        # Get effective summary (cached or provided)
-        effective_summary = self._get_effective_conversation_summary(user_id, conversation_summary)
-        
-        # Trigger background summarization if needed (non-blocking)
-        if self._should_trigger_background_summarization(user_id, recent_messages):
-            psychological_analysis_placeholder = {}  # Will be filled after analysis
-            threading.Thread(
-                target=self._background_summarization,
-                args=(user_id, recent_messages, conversation_summary, psychological_analysis_placeholder),
-                daemon=True
-            ).start()
-        
-        # Use only recent messages + summary for fast analysis
-        conversation_context = self._format_minimal_conversation_context(
-            recent_messages[-5:],  # Only last 5 messages for speed
-            effective_summary
+        recent_messages = state.get("recent_messages", [])[-CONTEXT_CANDIDATE_MESSAGES:]
+        
+        # Get effective summary (cached or provided); turns resolve it in _start_turn, off the event loop
+        if "effective_summary" not in state:
+            state["effective_summary"] = self._get_effective_conversation_summary(
+                self._summary_key(user_id, state.get("history_stats")), state.get("conversation_summary", {})
+            )
+        effective_summary = state["effective_summary"]
+        
+        budget = CONTEXT_BUDGETS[stage]
+        planner = ContextPlanner(stage, budget)
+        planner.add("voice", [compact_fields(state.get("voice_analysis", {}), VOICE_LABELS)], PRIORITY_HIGH)
+        # Recent turns get at most ~60% so the summary and activities still fit
+        planner.add(
+            "recent", self._message_lines(recent_messages, "AI"), PRIORITY_HIGH, KEEP_NEWEST,
+            header="RECENT:\n", max_tokens=budget * 3 // 5
         )
-        activities_context = self._format_minimal_activities_context(
-            state.get("user_activities", [])[:2]
+        planner.add("summary", self._summary_items(effective_summary), PRIORITY_MEDIUM, KEEP_FIRST, header="SUMMARY: ", separator=" | ")
+        planner.add("memory", self._memory_items(state), PRIORITY_MEDIUM, KEEP_FIRST, header="RELEVANT EARLIER:\n", max_tokens=budget // 4)
+        planner.add("activities", self._activity_items(state), PRIORITY_LOW, KEEP_FIRST, separator=" | ")
+        packed = planner.pack()
+        sections = packed["sections"]
+        
+        conversation_context = "\n".join(part for part in (sections["summary"], sections["memory"], sections["recent"]) if part)
+        return {
+            "conversation_context": conversation_context or "New conversation",
+            "activities_context": sections["activities"] or "No recent activities",
+            "voice_context": f"\n\nVoice: {sections['voice']}" if sections["voice"] else "",
+            "usage": packed["usage"]
+        }
+    
+    def _prepare_response_context(self, state: Dict[str, Any], stage: str, include_analysis: bool = True) -> Dict[str, Any]:
+        """Pack the analysis, voice data and recent turns for a response-generating stage"""
+        with tracer.span("build_context", stage=stage):
+            return self._pack_response_context(state, stage, include_analysis)
+    
+    def _pack_response_context(self, state: Dict[str, Any], stage: str, include_analysis: bool) -> Dict[str, Any]:
+        budget = CONTEXT_BUDGETS[stage]
+        planner = ContextPlanner(stage, budget)
+        if include_analysis:
+            analysis = state.get("psychological_analysis", {})
+            planner.add("analysis", self._field_items(analysis, ANALYSIS_LABELS), PRIORITY_CRITICAL, KEEP_FIRST, separator="; ")
+            planner.add("voice", [compact_fields(state.get("voice_analysis", {}), VOICE_LABELS)], PRIORITY_HIGH)
+            planner.add("memory", self._memory_items(state), PRIORITY_MEDIUM, KEEP_FIRST, max_tokens=budget // 4)
+        recent_messages = state.get("recent_messages", [])[-CONTEXT_CANDIDATE_MESSAGES:]
+        planner.add("recent", self._message_lines(recent_messages, "MindMate"), PRIORITY_HIGH, KEEP_NEWEST, max_tokens=budget * 3 // 4)
+        packed = planner.pack()
+        return {
+            "analysis_context": packed["sections"].get("analysis", ""),
+            "voice_context": packed["sections"].get("voice", ""),
+            "memory_context": packed["sections"].get("memory", ""),
+            "recent_context": packed["sections"]["recent"],
+            "usage": packed["usage"]
+        }
+    
+    def _record_context_usage(self, state: Dict[str, Any], usage: Dict[str, Any], prompt: str) -> None:
+        """Keep per-stage token accounting on the state for performance_metrics"""
+        usage["prompt_tokens"] = estimate_tokens(prompt)
+        state.setdefault("context_usage", {})[usage["stage"]] = usage
+        tracer.annotate(**{f"{usage['stage']}_prompt_tokens": usage["prompt_tokens"],
+                           f"{usage['stage']}_dropped_items": usage["dropped_items"]})
+    
+    async def psychological_analyst(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Agent 1: Psychology-focused analysis for Indian youth mental wellness"""
+        # Follow-ups reuse or patch the session's cached analysis instead of rebuilding it
+        session_key = self._session_key(state)
+        cached = await self._shared_state(self._session_analyses.get, session_key) or {}
+        plan = plan_analysis_update(
+            state["user_message"],
+            cached.get("analysis"),
+            cached.get("turns_since_full", 0),
+            state.get("voice_analysis", {}),
+            self._risk_level(state)
         )
         
-        logger.info(f"📊 Psychology Agent 1: Processing context - {len(recent_messages[-5:])} recent messages, summary: {bool(effective_summary)}")
+        analysis = None
+        if state.get("admission", {}).get("degraded"):
+            # Shedding load: skip the Agent 1 call and answer from what we already know
+            plan = {"mode": ANALYSIS_REUSED, "reason": "degraded_overload"}
+            FALLBACKS.labels("psychological_analyst", "degraded_overload").inc()
+            tracer.annotate(fallback="degraded_overload")
+            if not cached.get("analysis"):
+                state["psychological_analysis"] = self._apply_risk_floor(state, dict(LIGHT_TURN_ANALYSIS))
+                state["analysis_plan"] = plan
+                return state
         
-        # COMBINED PROMPT for structured output (Gemini works better with single comprehensive prompt)
-        # Replace the long combined_prompt with this simplified version
+        try:
+            with node_deadline(state.get("deadline"), ANALYST_DEADLINE_SHARE):
+                if plan["mode"] == ANALYSIS_REUSED:
+                    analysis = dict(cached["analysis"])
+                elif plan["mode"] == ANALYSIS_DELTA:
+                    analysis = await self._run_delta_analysis(state, cached["analysis"])
+                    if analysis is None:
+                        plan = {"mode": ANALYSIS_FULL, "reason": "delta_failed"}
+                        FALLBACKS.labels("psychological_analyst", "delta_failed").inc()
+                if analysis is None:
+                    analysis = await self._run_full_analysis(state)
+        except DeadlineExceeded:
+            # Keep the rest of the turn's budget for the reply rather than failing the whole turn
+            log_event(logger, "analyst.deadline_exceeded", logging.WARNING, cached_analysis=bool(cached.get("analysis")))
+            plan = {"mode": ANALYSIS_REUSED, "reason": "deadline_exceeded"}
+            FALLBACKS.labels("psychological_analyst", "deadline_exceeded").inc()
+            tracer.annotate(fallback="deadline_exceeded")
+            if not cached.get("analysis"):
+                state["psychological_analysis"] = self._apply_risk_floor(state, dict(LIGHT_TURN_ANALYSIS))
+                state["analysis_plan"] = plan
+                return state
+            analysis = dict(cached["analysis"])
         
-        # Include voice analysis if available
-        voice_context = ""
-        voice_analysis = state.get("voice_analysis", {})
-        if voice_analysis:
-            voice_context = f"""
-            
-            VOICE ANALYSIS DATA:
-            - Emotional tone: {voice_analysis.get('emotional_tone', 'N/A')}
-            - Stress level: {voice_analysis.get('stress_level', 'N/A')}
-            - Speech pace: {voice_analysis.get('speech_pace', 'N/A')}
-            - Cultural context: {voice_analysis.get('cultural_context', 'N/A')}
-            - Voice insights: {voice_analysis.get('insights', [])}"""
+        tracer.annotate(analysis_mode=plan["mode"], analysis_reason=plan["reason"])
+        analysis = self._apply_risk_floor(state, analysis)
+        state["psychological_analysis"] = analysis
+        state["analysis_plan"] = plan
+        await self._shared_state(self._remember_session_analysis, session_key, analysis, plan["mode"])
         
+        usage = state.get("context_usage", {})
+        log_event(logger, "analyst", mode=plan["mode"], reason=plan["reason"],
+                  cache=state.get("analysis_cache", {}).get("match"),
+                  prompt_tokens=(usage.get("analyst") or usage.get("analyst_delta") or {}).get("prompt_tokens"))
+        return state
+    
+    async def _run_full_analysis(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Full PsychologicalAnalysis from scratch (with minimal-prompt retry), served from cache when possible"""
+        context = self._prepare_analysis_context(state)
+        
+        # Key on the message plus exactly the context the prompt is built from, including the triage level
+        # (it selects the risk guidance block), so a hit never reuses an analysis made without that guidance
+        fingerprint = context_fingerprint(
+            context['conversation_context'], context['activities_context'], context['voice_context'],
+            self._risk_level(state)
+        )
+        if self.analysis_cache:
+            hit = self.analysis_cache.lookup(state["user_message"], fingerprint)
+            if hit:
+                state["analysis_cache"] = {"match": hit["match"], "similarity": hit["similarity"]}
+                tracer.annotate(analysis_cache=hit["match"], analysis_cache_similarity=hit["similarity"])
+                return hit["analysis"]
+            state["analysis_cache"] = {"match": "miss"}
+            tracer.annotate(analysis_cache="miss")
+        
+        # COMBINED PROMPT for structured output (Gemini works better with single comprehensive prompt)
         combined_prompt = f"""Analyze this user's mental health state for Indian youth (16-25 years).
 
             User's message: "{state['user_message']}"
 
-            Recent context: {conversation_context[:500]}
+            Recent context: {context['conversation_context']}
 
-            Activities: {activities_context}{voice_context}
+            Activities: {context['activities_context']}{context['voice_context']}{self._risk_guidance(state, RISK_ANALYSIS_GUIDANCE)}
 
             Provide analysis in this exact format:
             - Emotional state: [current condition]
@@ -231,129 +857,215 @@ Create a rich summary that enables seamless therapeutic conversation continuatio
             - Activity recommendations: [specific helpful activities]
 
             Focus on practical therapeutic assessment for Indian cultural context."""
+        self._record_context_usage(state, context["usage"], combined_prompt)
         # Use structured output for psychology analysis (single HumanMessage for better Gemini compatibility)
-        analysis = None
-        analysis = self.analyst_llm.invoke([HumanMessage(content=combined_prompt)])
+        analysis = await self.analyst_llm.ainvoke([HumanMessage(content=combined_prompt)])
         if analysis is None:
-            logger.info("🔄 Trying minimal prompt for structured output...")
+            STRUCTURED_OUTPUT_FAILURES.labels("analyst").inc()
+            FALLBACKS.labels("psychological_analyst", "minimal_prompt").inc()
+            tracer.annotate(minimal_prompt_retry=True)
+            log_event(logger, "analyst.structured_output_empty", logging.WARNING, stage="analyst", retry="minimal_prompt")
             minimal_prompt = f"""Analyze: "{state['user_message']}"
 
                 Provide psychological analysis for Indian youth with these fields:
                 emotional_state, stress_categories, therapeutic_approach, cultural_pressures, language_style, psychological_insights, coping_assessment, intervention_priority, activity_recommendations"""
 
-            analysis = self.analyst_llm.invoke([HumanMessage(content=minimal_prompt)])
-    
+            analysis = await self.analyst_llm.ainvoke([HumanMessage(content=minimal_prompt)])
 
         if analysis is None:
+            STRUCTURED_OUTPUT_FAILURES.labels("analyst").inc()
             raise ValueError("Psychology Agent 1: Structured LLM returned None - possible prompt or model issue")
         
-        state["psychological_analysis"] = analysis.dict()
+        if self.analysis_cache:
+            self.analysis_cache.store(state["user_message"], fingerprint, analysis.dict())
+        return analysis.dict()
+    
+    async def _run_delta_analysis(self, state: Dict[str, Any], previous: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ask only for the fast-changing fields and merge them over the cached analysis"""
+        context = self._prepare_analysis_context(state, "analyst_delta")
         
-        # Update background summarization with analysis (if running)
-        if user_id in self._summarization_cache:
-            # Update the placeholder with actual analysis
-            pass  # Background thread will complete independently
+        delta_prompt = f"""Update the psychological analysis of this Indian youth (16-25 years) for their new message.
+
+            Stable profile (unchanged): approach={previous.get('therapeutic_approach', '')}; culture={previous.get('cultural_pressures', '')}; language={previous.get('language_style', '')}
+            Previous turn: emotional state={previous.get('emotional_state', '')}; stress={', '.join(previous.get('stress_categories', []))}; coping={previous.get('coping_assessment', '')}; priority={previous.get('intervention_priority', '')}
+
+            User's message: "{state['user_message']}"
+
+            Recent context: {context['conversation_context']}{context['voice_context']}{self._risk_guidance(state, RISK_ANALYSIS_GUIDANCE)}
+
+            Return ONLY the updated emotional state, stress categories, 2-3 psychological insights,
+            coping assessment and intervention priority (immediate/supportive/long-term)."""
+        self._record_context_usage(state, context["usage"], delta_prompt)
         
-        logger.info("✅ Psychology Agent 1: Cultural-sensitive analysis completed successfully")
-        return state
+        delta = await self.analyst_delta_llm.ainvoke([HumanMessage(content=delta_prompt)])
+        if delta is None:
+            STRUCTURED_OUTPUT_FAILURES.labels("analyst_delta").inc()
+            log_event(logger, "analyst.structured_output_empty", logging.WARNING, stage="analyst_delta", retry="full")
+            return None
+        
+        merged = dict(previous)
+        merged.update(delta.dict())
+        return merged
+    
+    def _remember_session_analysis(self, session_key: str, analysis: Dict[str, Any], mode: str) -> None:
+        """Keep the latest analysis per session and how many turns ago it was fully rebuilt"""
+        previous = self._session_analyses.get(session_key) or {}
+        self._session_analyses.set(session_key, {
+            "analysis": analysis,
+            "turns_since_full": 0 if mode == ANALYSIS_FULL else previous.get("turns_since_full", 0) + 1,
+            "updated_at": time.time()
+        })
+    
+    def _previous_analysis(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The session's most recent psychological analysis, if any"""
+        cached = self._session_analyses.get(self._session_key(state))
+        return cached["analysis"] if cached else None
+    
+    def triage(self, user_message: str) -> Dict[str, Any]:
+        """Local risk triage of one message (~10 µs); level "none" when triage is disabled"""
+        if not self.risk_triage:
+            return {"level": RISK_NONE, "categories": [], "matches": [], "rules_version": None, "elapsed_us": 0.0}
+        risk = self.risk_triage.assess(user_message)
+        RISK_TRIAGE_SECONDS.observe(risk["elapsed_us"] / 1_000_000)
+        if risk["level"] != RISK_NONE:
+            for category in risk["categories"]:
+                RISK_FLAGS.labels(risk["level"], category).inc()
+            tracer.annotate(risk_level=risk["level"], risk_categories=",".join(risk["categories"]))
+            # Matched phrases are the user's own words and WARNING is never sampled: log only their count
+            log_event(logger, "risk.flagged", logging.WARNING, risk_level=risk["level"], categories=risk["categories"],
+                      match_count=len(risk["matches"]), rules_version=risk["rules_version"], elapsed_us=risk["elapsed_us"])
+        return risk
+    
+    def _risk_level(self, state: Dict[str, Any]) -> str:
+        return (state.get("risk_triage") or {}).get("level", RISK_NONE)
+    
+    def _risk_guidance(self, state: Dict[str, Any], guidance: Dict[str, str]) -> str:
+        """Prompt block for the turn's triage level, if that level has one"""
+        note = guidance.get(self._risk_level(state))
+        return f"\n\n{note}" if note else ""
+    
+    def _apply_risk_floor(self, state: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """A critical triage match keeps intervention_priority at immediate whatever the model returned"""
+        if self._risk_level(state) != RISK_CRITICAL:
+            return analysis
+        if str(analysis.get("intervention_priority", "")).strip().lower().startswith("immediate"):
+            return analysis
+        tracer.annotate(risk_priority_floor=True)
+        return {**analysis, "intervention_priority": "immediate"}
 
-    def companion_counselor_response(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    async def companion_counselor_response(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Agent 2: Companion-style counselor with psychology expertise for Indian youth"""
-        logger.info("💬 Psychology Agent 2: Companion counselor response generation starting...")
-        
         psychological_analysis = state.get("psychological_analysis", {})
         user_message = state["user_message"]
-        voice_analysis = state.get("voice_analysis", {})
-        
-        # Get immediate context for culturally sensitive response generation
-        immediate_context = self._format_immediate_context_for_response(
-            state.get("recent_messages", [])[-3:],  # Last 3 messages for flow
-            user_message
-        )
         
         if not psychological_analysis:
             raise ValueError("Psychology Agent 2: No psychological_analysis available from Agent 1")
         
-        logger.info("📝 Psychology Agent 2: Using psychology-guided companion response generation")
-        
         # PSYCHOLOGY + COMPANION STYLE SYSTEM MESSAGE for Indian youth
-        system_message = SystemMessage(content="""You are MindMate, a culturally-aware AI therapeutic companion specialized in Indian youth mental wellness (ages 16-25). Generate a response that combines professional psychology expertise with warm, companion-style delivery.
-
-COMPANION COUNSELOR RESPONSE GUIDELINES:
-
-PSYCHOLOGY EXPERTISE:
-- Apply CBT techniques: cognitive restructuring, thought challenging, behavioral activation
-- Use ACT principles: values clarification, psychological flexibility, mindful awareness
-- Employ MBCT approaches: emotional regulation, present-moment awareness, self-compassion
-- Address stress categories identified in analysis (academic/family/social/emotional/identity/career)
-
-CULTURAL SENSITIVITY (Indian Youth Context):
-- Understand academic pressure (board exams, competitive exams, parental expectations)
-- Acknowledge family dynamics (joint family, traditional vs modern values, generation gap)
-- Respect cultural nuances (festivals affecting mood, arranged marriage discussions, career path pressures)
-- Be sensitive to mental health stigma and family involvement considerations
+        system_message = SystemMessage(content=COMPANION_SYSTEM_PROMPT)
 
-COMPANION DELIVERY STYLE:
-- Use warm, friend-like tone while maintaining professional boundaries
-- Match user's language comfort level (if they use "yaar/bhai", mirror appropriately)
-- Be empathetic and non-judgmental, like talking to a caring friend who understands psychology
-- Validate cultural struggles without dismissing traditional values
-- Ask thoughtful questions (if needed) that promote self-exploration 
-- Provide practical coping strategies suitable for Indian family/social context
-
-IMPORTANT: Generate ONLY the natural conversation response. Do NOT include:
-- Numbered annotations (1., 2., 3.)
-- Technique labels in parentheses (CBT), (ACT), (MBCT)
-- Structural annotations (validation), (reframe), (strategy)
-- Any meta-commentary about the response structure
-
-Don't be rigid in response structure - blend elements naturally.
- Keep responses conversational and appropriately sized for the context. 
-For normal chats keep it concise for 2-way communication, but provide deeper responses when user needs more support.
-""")
-
-        # USER MESSAGE with analysis and context
+        # USER MESSAGE with analysis and context, packed into the response budget
+        context = self._prepare_response_context(state, "response")
+        immediate_context = self._format_immediate_context_for_response(context["recent_context"], user_message)
         voice_context_for_response = ""
-        if voice_analysis:
+        if context["voice_context"]:
             voice_context_for_response = f"""
-VOICE ANALYSIS INSIGHTS:
-{json.dumps(voice_analysis, indent=1)}
-"""
 
-        user_content = f"""PSYCHOLOGICAL ANALYSIS:
-{json.dumps(psychological_analysis, indent=1)}
+VOICE ANALYSIS INSIGHTS: {context['voice_context']}"""
+        memory_context_for_response = ""
+        if context["memory_context"]:
+            memory_context_for_response = f"""
+
+RELEVANT EARLIER CONVERSATION (refer back naturally if it helps; don't ask again what they already told you):
+{context['memory_context']}"""
+
+        user_content = f"""PSYCHOLOGICAL ANALYSIS: {context['analysis_context']}
 
 CONVERSATION CONTEXT:
-{immediate_context}{voice_context_for_response}
+{immediate_context}{voice_context_for_response}{memory_context_for_response}{self._risk_guidance(state, RISK_RESPONSE_GUIDANCE)}
 
 USER'S CURRENT MESSAGE: "{user_message}"
 
 Generate a completely natural, conversational response as MindMate."""
+        self._record_context_usage(state, context["usage"], COMPANION_SYSTEM_PROMPT + user_content)
 
         human_message = HumanMessage(content=user_content)
 
         # Generate direct response using base LLM (not structured output)
-        response = self.llm.invoke([system_message, human_message])
+        with node_deadline(state.get("deadline")):
+            response = await self.llm.ainvoke([system_message, human_message])
         
         if not response or not response.content:
             raise ValueError("Psychology Agent 2: LLM returned empty response")
         
         # Clean up the response and store it
-        final_response = self._clean_response(response.content)
+        with tracer.span("clean_response"):
+            final_response = self._clean_response(response.content)
         state["ai_response"] = final_response
         state["response_generated"] = True
         
-        logger.info("✅ Psychology Agent 2: Companion counselor response completed successfully")
+        log_event(logger, "response", prompt_tokens=state["context_usage"]["response"]["prompt_tokens"],
+                  reply_chars=len(final_response))
+        return state
+    
+    async def fused_companion_turn(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Fused mode: analysis and companion reply from a single structured LLM call"""
+        context = self._prepare_analysis_context(state, "fused")
+        
+        # Single HumanMessage (Gemini structured output works best without a separate system message)
+        fused_prompt = f"""{COMPANION_SYSTEM_PROMPT}
+TASK:
+1. Assess this user's mental health state for Indian youth (16-25 years): fill every analysis field
+   (emotional state, stress categories, CBT/ACT/MBCT approach, cultural pressures, language style,
+   2-3 psychological insights, coping assessment, immediate/supportive/long-term priority, activities).
+2. Then write `response`: your natural reply as MindMate, guided by that assessment.
+
+Recent context: {context['conversation_context']}
+
+Activities: {context['activities_context']}{context['voice_context']}{self._risk_guidance(state, RISK_ANALYSIS_GUIDANCE)}{self._risk_guidance(state, RISK_RESPONSE_GUIDANCE)}
+
+USER'S CURRENT MESSAGE: "{state['user_message']}"
+
+Fill the analysis fields, then the natural MindMate response."""
+        self._record_context_usage(state, context["usage"], fused_prompt)
+        
+        # Same split as two_agent mode: a timed-out fused call still leaves time for the fallback path
+        fallback_reason = "no_structured_result"
+        try:
+            with node_deadline(state.get("deadline"), ANALYST_DEADLINE_SHARE):
+                result = await self.fused_llm.ainvoke([HumanMessage(content=fused_prompt)])
+        except DeadlineExceeded:
+            result = None
+            fallback_reason = "deadline_exceeded"
+        
+        if result is None or not (result.response or "").strip():
+            # Leave response_generated False so the graph falls back to the two-agent path
+            if fallback_reason == "no_structured_result":
+                STRUCTURED_OUTPUT_FAILURES.labels("fused").inc()
+            FALLBACKS.labels("fused_companion_turn", fallback_reason).inc()
+            tracer.annotate(fallback=fallback_reason)
+            log_event(logger, "fused.fallback", logging.WARNING, reason=fallback_reason, fallback="two_agent")
+            return state
         
+        turn = result.dict()
+        with tracer.span("clean_response"):
+            state["ai_response"] = self._clean_response(turn.pop("response"))
+        turn = self._apply_risk_floor(state, turn)
+        state["psychological_analysis"] = turn
+        await self._shared_state(self._remember_session_analysis, self._session_key(state), turn, ANALYSIS_FULL)
+        state["response_generated"] = True
+        
+        log_event(logger, "fused", prompt_tokens=state["context_usage"]["fused"]["prompt_tokens"],
+                  reply_chars=len(state["ai_response"]))
         return state
     
-    def _format_messages_for_summarization(self, messages: List[Dict]) -> str:
-        """Format ALL messages for comprehensive summarization"""
+    def _format_messages_for_summarization(self, messages: List[Dict], start_index: int = 1) -> str:
+        """Format messages for summarization (numbered from their position in the conversation)"""
         if not messages:
             return "No conversation to summarize"
         
         formatted_messages = []
-        for i, msg in enumerate(messages, 1):
+        for i, msg in enumerate(messages, start_index):
             role = "User" if msg.get('role') == 'user' else "MindMate"
             content = msg.get('content', '')
             timestamp = msg.get('timestamp', '')[:16] if msg.get('timestamp') else f"Message {i}"
@@ -361,57 +1073,65 @@ Generate a completely natural, conversational response as MindMate."""
         
         return "\n".join(formatted_messages)
     
-    def _format_minimal_conversation_context(self, recent_messages: List, conversation_summary: Dict) -> str:
-        """MINIMAL context formatting for faster processing"""
-        context_parts = []
-        
-        # Include summary if it exists
-        if conversation_summary:
-            therapeutic_progress = conversation_summary.get('therapeutic_progress', '')
-            emotional_patterns = conversation_summary.get('emotional_patterns', '')
-            cultural_context = conversation_summary.get('cultural_context', '')
-            
-            summary_text = f"Progress: {therapeutic_progress[:100]}... | Patterns: {emotional_patterns[:100]}... | Culture: {cultural_context[:100]}..."
-            context_parts.append(f"SUMMARY: {summary_text}")
-        
-        # Only recent messages, truncated
-        if recent_messages:
-            context_parts.append("RECENT:")
-            for msg in recent_messages:
-                role = "User" if msg.get('role') == 'user' else "AI"
-                content = msg.get('content', '')[:80]  # Truncated for speed
-                context_parts.append(f"{role}: {content}")
-        
-        return "\n".join(context_parts) if context_parts else "New conversation"
-    
-    def _format_minimal_activities_context(self, activities: List) -> str:
-        """MINIMAL activity formatting for faster processing"""
-        if not activities:
-            return "No recent activities"
-        
-        # Only most recent activities with minimal info
-        context_parts = []
-        for activity in activities[:2]:
-            name = activity.get('activity_type', 'Unknown').replace('_', ' ')
-            score = activity.get('score', 'N/A')
-            context_parts.append(f"{name}: {score}")
-        
-        return " | ".join(context_parts)
-    
-    def _format_immediate_context_for_response(self, last_messages: List, current_message: str) -> str:
+    def _message_lines(self, messages: List, assistant_label: str) -> List[str]:
+        """One `Role: content` line per message, oldest first"""
+        return [
+            f"{'User' if msg.get('role') == 'user' else assistant_label}: {' '.join(msg.get('content', '').split())}"
+            for msg in messages
+        ]
+    
+    def _summary_items(self, conversation_summary: Dict) -> List[str]:
+        """Summary fields as separate items so the planner can drop the less important ones"""
+        return self._field_items(conversation_summary or {}, SUMMARY_LABELS, separator=": ")
+    
+    def _field_items(self, data: Dict[str, Any], labels: Dict[str, str], separator: str = "=") -> List[str]:
+        items = []
+        for key, label in labels.items():
+            value = compact_fields({key: data.get(key)}, {key: label})
+            if value:
+                items.append(value.replace("=", separator, 1))
+        return items
+    
+    def _activity_items(self, state: Dict[str, Any]) -> List[str]:
+        """Activity-history summary lines, or the most recent activities as `name: score` items"""
+        summary_lines = state.get("user_patterns", {}).get("summary_lines")
+        if summary_lines:
+            return list(summary_lines)
+        activities = state.get("user_activities", [])
+        return [
+            f"{activity.get('activity_type', 'Unknown').replace('_', ' ')}: {activity.get('score', 'N/A')}"
+            for activity in activities[:CONTEXT_CANDIDATE_ACTIVITIES]
+        ]
+    
+    def _memory_items(self, state: Dict[str, Any]) -> List[str]:
+        """Past messages/insights most similar to the current message, outside the recent window (searched once per turn)"""
+        if "memory_hits" not in state:
+            user_id = state.get("user_id", "anonymous")
+            hits = []
+            if self.memory_index and user_id != "anonymous":
+                with tracer.span("memory_search"):
+                    hits = self.memory_index.search(
+                        user_id, state["user_message"], MEMORY_INDEX_TOP_K,
+                        exclude=self._memory_chunks(state.get("recent_messages", [])[-CONTEXT_CANDIDATE_MESSAGES:])
+                    )
+                tracer.annotate(memory_hits=len(hits))
+            state["memory_hits"] = hits
+        labels = {"user": "User", "assistant": "MindMate", "summary": "Insight"}
+        return [f"{labels.get(hit['role'], 'User')}: {hit['text']}" for hit in state["memory_hits"]]
+    
+    def _memory_chunks(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Client/store messages as memory index items (any non-user role is the assistant)"""
+        return [
+            {"text": msg.get("content", ""), "role": "user" if msg.get("role") == "user" else "assistant",
+             "timestamp": msg.get("timestamp") or msg.get("created_at")}
+            for msg in messages if msg.get("content")
+        ]
+    
+    def _format_immediate_context_for_response(self, recent_context: str, current_message: str) -> str:
         """Format immediate context for response generation"""
-        if not last_messages:
+        if not recent_context:
             return f"User's message: '{current_message}' (New conversation)"
-        
-        context_parts = []
-        for msg in last_messages:
-            role = "User" if msg.get('role') == 'user' else "MindMate"
-            content = msg.get('content', '')[:100]  # Truncate for efficiency
-            context_parts.append(f"{role}: {content}")
-        
-        context_parts.append(f"User (current): {current_message}")
-        
-        return "\n".join(context_parts)
+        return f"{recent_context}\nUser (current): {current_message}"
     
     def _clean_response(self, response: str) -> str:
         """Clean response of any artifacts"""
@@ -434,22 +1154,225 @@ Generate a completely natural, conversational response as MindMate."""
         
         return response.strip()
     
-    def _create_workflow(self) -> StateGraph:
-        """Create psychology-focused 2-agent workflow (no sequential summarization)"""
+    def summarization_stats(self) -> Dict[str, Any]:
+        """Queue depth, coalescing/rejection counters and job latency of the summarization pool"""
+        return self.summarization_scheduler.stats()
+    
+    def shutdown(self, timeout: float = SUMMARY_SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        """Drain pending background summaries before the worker exits"""
+        logger.info("🛑 [WORKFLOW] Draining background summarization jobs...")
+        drained = self.summarization_scheduler.shutdown(drain=True, timeout=timeout)
+        logger.info(f"✅ [WORKFLOW] Summarization pool stopped ({'drained' if drained else 'timed out'})")
+        # After the summarizer drains, so its last batched calls still go out
+        for batcher in self.batchers.values():
+            batcher.shutdown()
+    
+    async def warmup(self, mode: str = WARMUP_MODE) -> Dict[str, Any]:
+        """Pay first-turn costs before traffic arrives; model call failures are reported, not raised"""
+        if mode not in ("none", "local", "llm"):
+            raise ValueError(f"MINDMATE_WARMUP must be 'none', 'local' or 'llm', got '{mode}'")
+        report: Dict[str, Any] = {"mode": mode}
+        if mode == "none":
+            return report
+        
+        started = time.perf_counter()
+        probe = self._build_initial_state(
+            "Warmup: exams are next week and I can't focus, ghar pe bhi pressure hai", [], {}, [], {},
+            {"emotional_tone": "anxious", "stress_level": "high"}, "warmup", None
+        )
+        probe["risk_triage"] = self.triage(probe["user_message"])
+        classify_turn(probe["user_message"], None, probe["voice_analysis"], probe["risk_triage"]["level"])
+        plan_analysis_update(probe["user_message"], None, 0, probe["voice_analysis"], probe["risk_triage"]["level"])
+        self._pack_analysis_context(probe, "analyst")
+        probe["psychological_analysis"] = dict(LIGHT_TURN_ANALYSIS)
+        self._pack_response_context(probe, "response", include_analysis=True)
+        self._clean_response('"Warmup reply"')
+        report["local_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        if mode == "llm":
+            # Opens the provider connections (TLS, channel setup); the structured wrappers share these clients
+            clients = {"companion": self.llm}
+            if self.default_mode == "fused":
+                clients["fused"] = self.fused_llm
+            report["calls"] = {}
+            for name, llm in clients.items():
+                started = time.perf_counter()
+                try:
+                    with metrics.stage("warmup"):
+                        await llm.ainvoke([HumanMessage(content="Reply with the single word: ready")])
+                    outcome = "ok"
+                except Exception as e:
+                    outcome = f"{type(e).__name__}: {e}"[:200]
+                report["calls"][name] = {"outcome": outcome, "ms": round((time.perf_counter() - started) * 1000, 1)}
+        return report
+    
+    def turn_priority(
+        self, user_id: str, session_id: Optional[str], voice_analysis: Optional[Dict], risk_level: Optional[str] = None
+    ) -> int:
+        """Admission priority from the session's last analysis, the current voice stress level and risk triage"""
+        cached = self._session_analyses.get(session_id or user_id)
+        return turn_priority(cached["analysis"] if cached else None, voice_analysis, risk_level)
+    
+    async def aturn_priority(
+        self, user_id: str, session_id: Optional[str], voice_analysis: Optional[Dict], risk_level: Optional[str] = None
+    ) -> int:
+        """turn_priority for async callers (the session lookup runs in a thread with the SQLite backend)"""
+        return await self._shared_state(self.turn_priority, user_id, session_id, voice_analysis, risk_level)
+    
+    def llm_stats(self) -> Dict[str, Any]:
+        """Circuit state, quota waits, hedges and latency per wrapped model"""
+        return self.llm_client.stats()
+    
+    def admission_stats(self) -> Dict[str, Any]:
+        """In-flight/queued turns, degraded and shed counts, queue wait per priority"""
+        return self.admission.stats() if self.admission else {"enabled": False}
+    
+    def risk_stats(self) -> Dict[str, Any]:
+        """Risk triage: turns checked and flagged, rules version, reloads and reload failures"""
+        return self.risk_triage.stats() if self.risk_triage else {"enabled": False}
+    
+    def batching_stats(self) -> Dict[str, Any]:
+        """Batch-size histograms, queue wait and batch latency per micro-batched LLM"""
+        return {
+            "enabled": LLM_BATCHING_ENABLED,
+            "batchers": {name: batcher.stats() for name, batcher in self.batchers.items()}
+        }
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Introspection for the caches (entries, bytes, hits, evictions, expirations)"""
+        return {
+            "summaries": self._summarization_cache.stats(),
+            "summarization_counts": self._last_summarization_count.stats(),
+            "session_analyses": self._session_analyses.stats(),
+            "analysis_cache": self.analysis_cache.stats() if self.analysis_cache else None,
+            "activity_analytics": self.activity_analytics.stats() if self.activity_analytics else None,
+            "memory_index": self.memory_index.stats() if self.memory_index else None,
+            "session_store": self.session_store.stats() if self.session_store else None,
+            "state_backend": self.state_backend.stats()
+        }
+    
+    def _metric_families(self) -> List[metrics.Family]:
+        """Scrape-time gauges/counters for /metrics from the existing stats() methods"""
+        families = []
+        summarization = self.summarization_stats()
+        families.append(("mindmate_summarization_queue_depth", "gauge", "Queued background summarization jobs",
+                         metrics.samples(summarization, ["queue_depth"], {})))
+        families.append(("mindmate_summarization_running", "gauge", "Background summarization jobs in progress",
+                         metrics.samples(summarization, ["running"], {})))
+        families.append(("mindmate_summarization_jobs_total", "counter", "Summarization jobs by result",
+                         [({"result": key}, value) for key, value in summarization.items()
+                          if key in ("submitted", "coalesced", "rejected", "completed", "failed")]))
+        
+        caches = {name: stats for name, stats in self.cache_stats().items() if stats and "entries" in stats}
+        for field, kind, documentation in (
+            ("entries", "gauge", "Entries held per cache"),
+            ("bytes", "gauge", "Estimated bytes held per cache"),
+            ("hits", "counter", "Cache hits"),
+            ("misses", "counter", "Cache misses"),
+            ("evictions", "counter", "Entries evicted to stay within bounds")
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            families.append((f"mindmate_cache_{field}{suffix}", kind, documentation, [
+                sample for name, stats in caches.items() for sample in metrics.samples(stats, [field], {"cache": name})
+            ]))
+        
+        if self.admission:
+            admission = self.admission_stats()
+            families.append(("mindmate_admission_in_flight", "gauge", "Turns holding an admission slot",
+                             metrics.samples(admission, ["in_flight"], {})))
+            families.append(("mindmate_admission_queue_depth", "gauge", "Turns waiting for an admission slot",
+                             metrics.samples(admission, ["queue_depth"], {})))
+            families.append(("mindmate_admission_events_total", "counter", "Admission decisions by kind", [
+                ({"event": key}, admission[key])
+                for key in ("admitted", "queued", "degraded", "rejected_queue_full", "rejected_timeout", "evicted")
+            ]))
+        
+        llm = self.llm_stats()
+        families.append(("mindmate_llm_circuit_open", "gauge", "1 while the model circuit breaker is open or half-open",
+                         [({}, 0 if llm["circuit"] == "closed" else 1)]))
+        families.append(("mindmate_llm_hedged_total", "counter", "Hedged (duplicate) model attempts",
+                         [sample for name, stats in llm["models"].items() for sample in metrics.samples(stats, ["hedged"], {"model": name})]))
+        families.append(("mindmate_llm_quota_wait_seconds_total", "counter", "Time spent waiting for provider quota",
+                         [({"model": name}, stats["quota_wait_ms"] / 1000) for name, stats in llm["models"].items()]))
+        if self.risk_triage:
+            risk = self.risk_stats()
+            families.append(("mindmate_risk_rules_reloads_total", "counter", "Risk rules file reloads by result", [
+                ({"result": "ok"}, risk["reloads"]), ({"result": "failed"}, risk["reload_failures"])
+            ]))
+        if self.batchers:
+            families.append(("mindmate_batcher_queue_depth", "gauge", "Calls waiting for a micro-batch", [
+                ({"batcher": name}, batcher.stats()["queue_depth"]) for name, batcher in self.batchers.items()
+            ]))
+        return families
+    
+    def _create_workflow(self, mode: str = "two_agent") -> "StateGraph":
+        """Create psychology-focused workflow for the given mode (no sequential summarization)"""
+        from langgraph.graph import StateGraph, END
         
         workflow = StateGraph(dict)
         
         # Add only the 2 main agents (summarization happens in background)
-        workflow.add_node("psychological_analyst", self.psychological_analyst)
-        workflow.add_node("companion_counselor_response", self.companion_counselor_response)
+        workflow.add_node("psychological_analyst", self._timed_node("psychological_analyst", self.psychological_analyst))
+        workflow.add_node("companion_counselor_response", self._timed_node("companion_counselor_response", self.companion_counselor_response))
+        
+        if mode == "fused":
+            # One structured call; the 2-agent path only runs if it produced no reply
+            workflow.add_node("fused_companion_turn", self._timed_node("fused_companion_turn", self.fused_companion_turn))
+            workflow.add_conditional_edges(
+                "fused_companion_turn",
+                lambda state: END if state.get("response_generated") else "psychological_analyst",
+                ["psychological_analyst", END]
+            )
+            analysis_entry = "fused_companion_turn"
+        else:
+            # Define the TRUE 2-agent workflow sequence
+            analysis_entry = "psychological_analyst"
+        
+        if FAST_PATH_ROUTER_ENABLED:
+            # Local router decides between the lightweight reply and full analysis
+            workflow.add_node("turn_router", self._timed_node("turn_router", self.turn_router))
+            workflow.add_node("light_companion_response", self._timed_node("light_companion_response", self.light_companion_response))
+            workflow.set_entry_point("turn_router")
+            workflow.add_conditional_edges(
+                "turn_router",
+                self._route_after_router,
+                {ROUTE_FAST_PATH: "light_companion_response", ROUTE_ANALYST: analysis_entry}
+            )
+            workflow.add_edge("light_companion_response", END)
+        else:
+            workflow.set_entry_point(analysis_entry)
         
-        # Define the TRUE 2-agent workflow sequence
-        workflow.set_entry_point("psychological_analyst")
         workflow.add_edge("psychological_analyst", "companion_counselor_response")
         workflow.add_edge("companion_counselor_response", END)
         
         return workflow.compile()
     
+    def _timed_node(self, name: str, node):
+        """Wrap a graph node: wall time (ms) lands in state["node_timings"] and the node histogram"""
+        histogram = NODE_SECONDS.labels(name)
+        errors = NODE_ERRORS.labels(name)
+        
+        async def run(state: Dict[str, Any]) -> Dict[str, Any]:
+            started = time.perf_counter()
+            try:
+                with metrics.stage(name), tracer.span(name):
+                    return await node(state)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                histogram.observe(elapsed)
+                state.setdefault("node_timings", {})[name] = round(elapsed * 1000, 2)
+        return run
+    
+    def _resolve_workflow(self, workflow_mode: Optional[str]):
+        """Pick the compiled graph for a per-request mode override (or the deployment default)"""
+        mode = workflow_mode or self.default_mode
+        if mode not in self.workflows:
+            raise ValueError(f"Unknown workflow_mode '{mode}', expected one of {WORKFLOW_MODES}")
+        return mode, self.workflows[mode]
+    
     def process_chat(
         self, 
         user_message: str, 
@@ -459,99 +1382,354 @@ Generate a completely natural, conversational response as MindMate."""
         user_patterns: Optional[Dict] = None,
         voice_analysis: Optional[Dict] = None,  # Add voice analysis parameter
         user_id: str = "anonymous",
-        session_id: str = None
+        session_id: str = None,
+        workflow_mode: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Synchronous wrapper around aprocess_chat for callers without an event loop"""
+        return asyncio.run(self.aprocess_chat(
+            user_message, recent_messages, conversation_summary,
+            user_activities, user_patterns, voice_analysis, user_id, session_id, workflow_mode
+        ))
+    
+    async def aprocess_chat(
+        self, 
+        user_message: str, 
+        recent_messages: Optional[List] = None,
+        conversation_summary: Optional[Dict] = None,
+        user_activities: Optional[List] = None,
+        user_patterns: Optional[Dict] = None,
+        voice_analysis: Optional[Dict] = None,
+        user_id: str = "anonymous",
+        session_id: str = None,
+        workflow_mode: Optional[str] = None,
+        admission: Optional[Dict[str, Any]] = None,
+        risk_triage: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Process chat with psychology-focused 2-agent workflow + voice analysis + background summarization"""
         
-        # Initialize with defaults
-        recent_messages = recent_messages or []
-        user_activities = user_activities or []
-        conversation_summary = conversation_summary or {}
-        user_patterns = user_patterns or {}
-        voice_analysis = voice_analysis or {}  # Default to empty dict
+        initial_state = self._build_initial_state(
+            user_message, recent_messages, conversation_summary,
+            user_activities, user_patterns, voice_analysis, user_id, session_id
+        )
+        mode, workflow = self._resolve_workflow(workflow_mode)
+        initial_state["workflow_mode"] = mode
+        initial_state["admission"] = admission or {}
+        # Entry points triage before admission (it sets the priority); direct callers get it here
+        initial_state["risk_triage"] = risk_triage or self.triage(initial_state["user_message"])
+        initial_state["deadline"] = time.monotonic() + TURN_DEADLINE_SECONDS
+        
+        # Failures are logged once per turn by the entry point (turn.failed)
+        start_time = datetime.now()
+        
+        will_summarize = await self._start_turn(initial_state)
+        
+        # Execute the TRUE 2-agent workflow (summarization happens in background if needed)
+        # Nodes await the LLM calls, so the event loop stays free for other requests
+        final_state = await workflow.ainvoke(initial_state)
+        await self._finish_turn(final_state, will_summarize)
+        
+        processing_time = (datetime.now() - start_time).total_seconds()
+        return self._build_chat_result(final_state, will_summarize, processing_time)
+    
+    async def astream_chat(
+        self, 
+        user_message: str, 
+        recent_messages: Optional[List] = None,
+        conversation_summary: Optional[Dict] = None,
+        user_activities: Optional[List] = None,
+        user_patterns: Optional[Dict] = None,
+        voice_analysis: Optional[Dict] = None,
+        user_id: str = "anonymous",
+        session_id: str = None,
+        workflow_mode: Optional[str] = None,
+        admission: Optional[Dict[str, Any]] = None,
+        risk_triage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Run the workflow and yield ("token", ...) events for Agent 2 output, then a final ("done", ...) event"""
+        
+        initial_state = self._build_initial_state(
+            user_message, recent_messages, conversation_summary,
+            user_activities, user_patterns, voice_analysis, user_id, session_id
+        )
+        mode, workflow = self._resolve_workflow(workflow_mode)
+        initial_state["workflow_mode"] = mode
+        initial_state["admission"] = admission or {}
+        # Entry points triage before admission (it sets the priority); direct callers get it here
+        initial_state["risk_triage"] = risk_triage or self.triage(initial_state["user_message"])
+        initial_state["deadline"] = time.monotonic() + TURN_DEADLINE_SECONDS
+        
+        start_time = time.perf_counter()
+        first_token_time = None
+        
+        will_summarize = await self._start_turn(initial_state)
+        
+        cleaner = StreamingResponseCleaner(self._clean_response)
+        final_state = initial_state
+        
+        # "messages" mode surfaces LLM tokens from inside graph nodes; "values" carries the final state
+        async for stream_mode, payload in workflow.astream(initial_state, stream_mode=["messages", "values"]):
+            if stream_mode == "values":
+                final_state = payload
+                continue
+            
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") not in STREAMED_RESPONSE_NODES:
+                continue
+            
+            text = cleaner.feed(chunk.content if isinstance(chunk.content, str) else "")
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - start_time
+                yield "token", {"text": text}
+        
+        await self._finish_turn(final_state, will_summarize)
+        
+        # Flush anything the cleaner held back (trailing quote/whitespace, buffered JSON replies)
+        tail = cleaner.finish()
+        if first_token_time is None and not tail:
+            # Reply came from a non-streamed node (e.g. fused structured output): send it whole
+            tail = final_state.get("ai_response", "")
+        if tail:
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start_time
+            yield "token", {"text": tail}
+        
+        processing_time = time.perf_counter() - start_time
+        result = self._build_chat_result(final_state, will_summarize, processing_time)
+        result["time_to_first_token"] = round(first_token_time, 3) if first_token_time is not None else None
+        yield "done", result
+    
+    async def _start_turn(self, state: Dict[str, Any]) -> bool:
+        """Fill history from the session store if the client sent none; decide on background summarization"""
+        session_id = state.get("session_id")
+        if self.session_store and session_id and not state["recent_messages"]:
+            with tracer.span("session_store.load", session_id=session_id):
+                stored = await asyncio.to_thread(self.session_store.load_context, session_id, SESSION_STORE_WINDOW)
+            state["recent_messages"] = stored["recent_messages"]
+            state["conversation_summary"] = state["conversation_summary"] or stored["summary"]
+            state["history_stats"] = {
+                "session_id": session_id,
+                "message_count": stored["message_count"],
+                "total_chars": stored["total_chars"],
+                "summarized_count": stored["summarized_count"]
+            }
+        
+        if self.memory_index and state["user_id"] != "anonymous" and state["recent_messages"]:
+            # Already-indexed messages are skipped by content key, so resending the window is cheap
+            self.memory_index.add(state["user_id"], self._memory_chunks(state["recent_messages"]))
+        
+        state["effective_summary"] = await self._shared_state(
+            self._get_effective_conversation_summary,
+            self._summary_key(state["user_id"], state.get("history_stats")), state["conversation_summary"]
+        )
         
-        # Log voice analysis if available
-        if voice_analysis:
-            logger.info(f"🎤 Voice analysis received: {voice_analysis.get('emotional_tone', 'unknown')} tone, {voice_analysis.get('stress_level', 'unknown')} stress")
+        # Check if background summarization will be triggered
+        will_summarize = await self._shared_state(
+            self._should_trigger_background_summarization,
+            state["user_id"], state["recent_messages"], state.get("history_stats")
+        )
+        return will_summarize
+    
+    async def _finish_turn(self, final_state: Dict[str, Any], will_summarize: bool) -> None:
+        """Queue background summarization and append the turn to the session store"""
+        if will_summarize:
+            final_state["summarization_job"] = await self._shared_state(self._schedule_background_summarization, final_state)
+        
+        user_id = final_state.get("user_id", "anonymous")
+        final_state["cached_summary_available"] = await self._shared_state(
+            self._summarization_cache.__contains__, self._summary_key(user_id, final_state.get("history_stats"))
+        )
+        if self.memory_index and user_id != "anonymous" and final_state.get("ai_response"):
+            self.memory_index.add(user_id, [
+                {"text": final_state["user_message"], "role": "user"},
+                {"text": final_state["ai_response"], "role": "assistant"}
+            ])
+        
+        session_id = final_state.get("session_id")
+        if self.session_store and session_id and final_state.get("ai_response"):
+            now = datetime.now().isoformat()
+            with tracer.span("session_store.append", session_id=session_id):
+                await asyncio.to_thread(
+                    self.session_store.append_messages, session_id, final_state.get("user_id", "anonymous"),
+                    [
+                        {"role": "user", "content": final_state["user_message"], "created_at": now},
+                        {"role": "assistant", "content": final_state["ai_response"], "created_at": now}
+                    ]
+                )
+    
+    def _build_initial_state(
+        self,
+        user_message: str,
+        recent_messages: Optional[List],
+        conversation_summary: Optional[Dict],
+        user_activities: Optional[List],
+        user_patterns: Optional[Dict],
+        voice_analysis: Optional[Dict],
+        user_id: str,
+        session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """Create initial state for psychology-focused workflow"""
+        voice_analysis = voice_analysis or {}
+        patterns = self.activity_analytics.patterns(
+            None if user_id == "anonymous" else user_id, user_activities or []
+        ) if self.activity_analytics else {}
         
-        # Create initial state for psychology-focused workflow
-        initial_state = {
+        return {
             "user_id": user_id,
             "session_id": session_id,
             "user_message": user_message.strip(),
-            "recent_messages": recent_messages,
-            "conversation_summary": conversation_summary,
-            "user_activities": user_activities,
-            "user_patterns": user_patterns,
+            "recent_messages": recent_messages or [],
+            "conversation_summary": conversation_summary or {},
+            "user_activities": user_activities or [],
+            # Client-supplied patterns win over the computed activity statistics
+            "user_patterns": {**patterns, **(user_patterns or {})},
+            "voice_analysis": voice_analysis,
             "psychological_analysis": {},
             "ai_response": "",
             "response_generated": False
         }
+    
+    def _build_chat_result(self, final_state: Dict[str, Any], will_summarize: bool, processing_time: float) -> Dict[str, Any]:
+        """Shape the final workflow state into the /chat response"""
+        # Extract results from psychology workflow
+        response = final_state.get("ai_response", "")
+        if not response.strip():
+            raise ValueError("Psychology workflow completed but no ai_response generated")
         
-        try:
-            logger.info(f"🚀 Starting psychology-focused 2-agent workflow for user: {user_id}")
-            start_time = datetime.now()
-            
-            # Check if background summarization will be triggered
-            will_summarize = self._should_trigger_background_summarization(user_id, recent_messages)
-            logger.info(f"📊 Context: {len(recent_messages)} messages, Background summarization: {will_summarize}")
-            
-            # Execute the TRUE 2-agent workflow (summarization happens in background if needed)
-            final_state = self.workflow.invoke(initial_state)
-            
-            processing_time = (datetime.now() - start_time).total_seconds()
-            logger.info(f"✅ Psychology-focused 2-agent workflow completed in {processing_time:.2f} seconds")
-            
-            # Extract results from psychology workflow
-            response = final_state.get("ai_response", "")
-            if not response.strip():
-                raise ValueError("Psychology workflow completed but no ai_response generated")
-            
-            # Determine therapeutic approach from psychological analysis
-            psychological_analysis = final_state.get("psychological_analysis", {})
-            therapeutic_approach = psychological_analysis.get("therapeutic_approach", "Person-centered")
-            
-            logger.info(f"🧠 Psychology response ready - Approach: {therapeutic_approach}, Background summarization: {'Active' if will_summarize else 'Not needed'}")
-            
-            return {
-                "message": response,
-                "modality": therapeutic_approach,
-                "confidence": 0.9,
-                "processing_time": processing_time,
-                "session_insights": {
-                    "emotional_state": psychological_analysis.get("emotional_state", ""),
-                    "stress_categories": psychological_analysis.get("stress_categories", []),
-                    "therapeutic_approach": psychological_analysis.get("therapeutic_approach", ""),
-                    "cultural_pressures": psychological_analysis.get("cultural_pressures", ""),
-                    "language_style": psychological_analysis.get("language_style", ""),
-                    "psychological_insights": psychological_analysis.get("psychological_insights", []),
-                    "coping_assessment": psychological_analysis.get("coping_assessment", ""),
-                    "intervention_priority": psychological_analysis.get("intervention_priority", ""),
-                    "activity_recommendations": psychological_analysis.get("activity_recommendations", []),
-                    "performance_metrics": {
-                        "context_messages": len(recent_messages),
-                        "context_activities": len(user_activities),
-                        "has_summary": bool(conversation_summary),
-                        "background_summarization": will_summarize,
-                        "cached_summary_available": user_id in self._summarization_cache
-                    }
+        # Determine therapeutic approach from psychological analysis
+        psychological_analysis = final_state.get("psychological_analysis", {})
+        therapeutic_approach = psychological_analysis.get("therapeutic_approach", "Person-centered")
+        
+        return {
+            "message": response,
+            "modality": therapeutic_approach,
+            "confidence": 0.9,
+            "processing_time": processing_time,
+            "session_insights": {
+                "emotional_state": psychological_analysis.get("emotional_state", ""),
+                "stress_categories": psychological_analysis.get("stress_categories", []),
+                "therapeutic_approach": psychological_analysis.get("therapeutic_approach", ""),
+                "cultural_pressures": psychological_analysis.get("cultural_pressures", ""),
+                "language_style": psychological_analysis.get("language_style", ""),
+                "psychological_insights": psychological_analysis.get("psychological_insights", []),
+                "coping_assessment": psychological_analysis.get("coping_assessment", ""),
+                "intervention_priority": psychological_analysis.get("intervention_priority", ""),
+                "activity_recommendations": psychological_analysis.get("activity_recommendations", []),
+                "risk_level": final_state.get("risk_triage", {}).get("level", RISK_NONE),
+                "performance_metrics": {
+                    "context_messages": len(final_state.get("recent_messages", [])),
+                    "history_source": "store" if final_state.get("history_stats") else "client",
+                    "context_activities": len(final_state.get("user_activities", [])),
+                    "has_summary": bool(final_state.get("conversation_summary")),
+                    "workflow_mode": final_state.get("workflow_mode", self.default_mode),
+                    "background_summarization": will_summarize,
+                    "summarization_job": final_state.get("summarization_job"),
+                    "cached_summary_available": final_state.get("cached_summary_available", False),
+                    "router": final_state.get("route_decision"),
+                    "analysis": final_state.get("analysis_plan"),
+                    "analysis_cache": final_state.get("analysis_cache"),
+                    "memory_hits": [
+                        {"role": hit["role"], "score": hit["score"]} for hit in final_state.get("memory_hits", [])
+                    ],
+                    "admission": final_state.get("admission") or None,
+                    "risk_triage": final_state.get("risk_triage"),
+                    "input_tokens": {
+                        stage: usage["prompt_tokens"] for stage, usage in final_state.get("context_usage", {}).items()
+                    },
+                    "context_usage": final_state.get("context_usage", {}),
+                    "node_timings_ms": final_state.get("node_timings", {})
                 }
             }
-            
-        except Exception as e:
-            logger.error(f"❌ Psychology-focused workflow execution failed: {e}")
-            raise e
+        }
 
 # Global workflow instance
 _workflow_instance = None
+_workflow_lock = threading.Lock()
 
 def get_workflow_instance() -> MindMateWorkflow:
-    """Get or create psychology-focused workflow instance"""
+    """Get or create psychology-focused workflow instance (built once, even under concurrent first calls)"""
     global _workflow_instance
     if _workflow_instance is None:
-        _workflow_instance = MindMateWorkflow()
+        with _workflow_lock:
+            if _workflow_instance is None:
+                _workflow_instance = MindMateWorkflow()
     return _workflow_instance
 
+async def aget_workflow_instance() -> MindMateWorkflow:
+    """get_workflow_instance for async callers: a first build runs in a thread, off the event loop"""
+    if _workflow_instance is not None:
+        return _workflow_instance
+    return await asyncio.to_thread(get_workflow_instance)
+
+@asynccontextmanager
+async def _admitted(
+    workflow: MindMateWorkflow, user_id: str, session_id: Optional[str], voice_analysis: Optional[Dict], risk_level: str
+):
+    """Hold an admission slot for one turn (no-op when admission control is disabled)"""
+    if workflow.admission is None:
+        yield None
+        return
+    priority = await workflow.aturn_priority(user_id, session_id, voice_analysis, risk_level)
+    async with workflow.admission.admit(user_id, priority) as ticket:
+        # Time spent queued behind other turns, on the turn's root span
+        tracer.annotate(admission_priority=ticket["priority"], queue_wait_ms=ticket["queue_wait_ms"], degraded=ticket["degraded"])
+        yield ticket
+
+def _turn_outcome(error: Exception) -> str:
+    if isinstance(error, AdmissionRejected):
+        return "shed"
+    if isinstance(error, LLMUnavailable):
+        return "unavailable"
+    return "error"
+
+def _record_turn(entry: str, outcome: str, seconds: float) -> None:
+    TURNS.labels(entry, outcome).inc()
+    if outcome == "ok":
+        # Shed/failed turns return early and would only pull the latency percentiles down
+        TURN_SECONDS.labels(entry).observe(seconds)
+
+def _log_turn(entry: str, user_message: str, voice_analysis: Optional[Dict], result: Dict[str, Any]) -> None:
+    """One summary event per completed turn (replaces the per-field entry/exit dumps)"""
+    perf = result.get("session_insights", {}).get("performance_metrics", {})
+    voice_analysis = voice_analysis or {}
+    log_event(
+        logger, "turn.completed",
+        entry=entry,
+        user_id=result.get("user_id"),
+        mode=perf.get("workflow_mode"),
+        route=(perf.get("router") or {}).get("route"),
+        analysis_mode=(perf.get("analysis") or {}).get("mode"),
+        risk_level=result.get("session_insights", {}).get("risk_level"),
+        duration_ms=round(result.get("processing_time", 0) * 1000),
+        ttft_ms=round(result["time_to_first_token"] * 1000) if result.get("time_to_first_token") is not None else None,
+        node_ms=perf.get("node_timings_ms"),
+        input_tokens=perf.get("input_tokens"),
+        context_messages=perf.get("context_messages"),
+        history_source=perf.get("history_source"),
+        summarization=perf.get("summarization_job"),
+        voice_tone=voice_analysis.get("emotional_tone"),
+        voice_stress=voice_analysis.get("stress_level"),
+        message=user_message,
+        reply=result.get("message", ""),
+        trace_id=result.get("trace_id")
+    )
+
+def _log_turn_failure(entry: str, user_id: str, error: Exception, seconds: float) -> None:
+    outcome = _turn_outcome(error)
+    log_event(
+        logger, "turn.failed", logging.WARNING if outcome != "error" else logging.ERROR,
+        entry=entry, user_id=user_id, outcome=outcome, duration_ms=round(seconds * 1000),
+        error=f"{type(error).__name__}: {error}"[:500]
+    )
+
+def shutdown_workflow_instance() -> None:
+    """Gracefully stop the workflow's background work, if it was ever created"""
+    # Taking the lock waits for a build still running on the startup thread, so its pools are stopped too
+    with _workflow_lock:
+        instance = _workflow_instance
+    if instance is not None:
+        instance.shutdown()
+
 def process_user_chat(
     user_message: str, 
     recent_messages: Optional[List] = None,
@@ -560,47 +1738,88 @@ def process_user_chat(
     user_patterns: Optional[Dict] = None,
     voice_analysis: Optional[Dict] = None,  # Add voice analysis parameter
     user_id: str = "anonymous",
-    session_id: str = None
+    session_id: str = None,
+    workflow_mode: Optional[str] = None
+) -> Dict[str, Any]:
+    """Synchronous entry point (thin wrapper around aprocess_user_chat)"""
+    return asyncio.run(aprocess_user_chat(
+        user_message, recent_messages, conversation_summary,
+        user_activities, user_patterns, voice_analysis, user_id, session_id, workflow_mode
+    ))
+
+async def aprocess_user_chat(
+    user_message: str, 
+    recent_messages: Optional[List] = None,
+    conversation_summary: Optional[Dict] = None,
+    user_activities: Optional[List] = None,
+    user_patterns: Optional[Dict] = None,
+    voice_analysis: Optional[Dict] = None,
+    user_id: str = "anonymous",
+    session_id: str = None,
+    workflow_mode: Optional[str] = None
 ) -> Dict[str, Any]:
     """Main entry point for psychology-focused 2-agent chat processing with voice analysis"""
-    
-    logger.info("🚀 [ENTRY] MindMate chat processing initiated")
-    logger.info(f"📝 [ENTRY] Message preview: '{user_message[:50]}{'...' if len(user_message) > 50 else ''}'")
-    logger.info(f"👤 [ENTRY] User ID: {user_id}")
-    logger.info(f"🔗 [ENTRY] Session ID: {session_id}")
-    logger.info(f"🎤 [ENTRY] Voice analysis: {'✅ PROVIDED' if voice_analysis else '❌ NOT PROVIDED'}")
-    
-    if voice_analysis:
-        logger.info(f"🔍 [ENTRY] Voice analysis details:")
-        logger.info(f"   - Emotional tone: {voice_analysis.get('emotional_tone', 'unknown')}")
-        logger.info(f"   - Stress level: {voice_analysis.get('stress_level', 'unknown')}")
-        logger.info(f"   - Speech pace: {voice_analysis.get('speech_pace', 'unknown')}")
-        logger.info(f"   - Cultural context keys: {list(voice_analysis.get('cultural_context', {}).keys())}")
-        logger.info(f"   - Psychological markers: {list(voice_analysis.get('psychological_markers', {}).keys())}")
-    
     start_time = time.time()
     
     try:
-        workflow = get_workflow_instance()
-        result = workflow.process_chat(
-            user_message, recent_messages, conversation_summary,
-            user_activities, user_patterns, voice_analysis, user_id, session_id
-        )
-        
-        processing_time = time.time() - start_time
-        result["processing_time"] = round(processing_time, 2)
-        result["voice_aware"] = bool(voice_analysis)  # Flag to indicate voice was considered
-        
-        logger.info(f"✅ [ENTRY] Processing completed successfully in {processing_time:.2f}s")
-        logger.info(f"📊 [ENTRY] Response metrics:")
-        logger.info(f"   - Message length: {len(result.get('message', ''))} characters")
-        logger.info(f"   - Modality: {result.get('modality', 'unknown')}")
-        logger.info(f"   - Voice-aware: {result.get('voice_aware', False)}")
+        workflow = await aget_workflow_instance()
+        with sampled_turn(), tracer.span("chat_turn", entry="chat", user_id=user_id, session_id=session_id, workflow_mode=workflow_mode):
+            # Before admission: a message at risk jumps the queue and is never degraded
+            risk = workflow.triage(user_message.strip())
+            async with _admitted(workflow, user_id, session_id, voice_analysis, risk["level"]) as ticket:
+                result = await workflow.aprocess_chat(
+                    user_message, recent_messages, conversation_summary,
+                    user_activities, user_patterns, voice_analysis, user_id, session_id, workflow_mode, ticket, risk
+                )
+            result["trace_id"] = tracer.current_trace_id()
+            
+            processing_time = time.time() - start_time
+            _record_turn("chat", "ok", processing_time)
+            result["processing_time"] = round(processing_time, 2)
+            result["voice_aware"] = bool(voice_analysis)  # Flag to indicate voice was considered
+            _log_turn("chat", user_message, voice_analysis, {**result, "user_id": user_id})
         
         return result
         
     except Exception as e:
         processing_time = time.time() - start_time
-        logger.error(f"❌ [ENTRY] Processing failed after {processing_time:.2f}s")
-        logger.error(f"❌ [ENTRY] Error details: {str(e)}")
-        raise e
\ No newline at end of file
+        _record_turn("chat", _turn_outcome(e), processing_time)
+        _log_turn_failure("chat", user_id, e, processing_time)
+        raise e
+
+async def astream_user_chat(
+    user_message: str, 
+    recent_messages: Optional[List] = None,
+    conversation_summary: Optional[Dict] = None,
+    user_activities: Optional[List] = None,
+    user_patterns: Optional[Dict] = None,
+    voice_analysis: Optional[Dict] = None,
+    user_id: str = "anonymous",
+    session_id: str = None,
+    workflow_mode: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Streaming entry point: yields ("token", {...}) events followed by one ("done", {...}) event"""
+    start_time = time.time()
+    
+    try:
+        workflow = await aget_workflow_instance()
+        with sampled_turn() as keep_logs, tracer.span("chat_turn", entry="stream", user_id=user_id, session_id=session_id, workflow_mode=workflow_mode):
+            risk = workflow.triage(user_message.strip())
+            async with _admitted(workflow, user_id, session_id, voice_analysis, risk["level"]) as ticket:
+                async for event, data in workflow.astream_chat(
+                    user_message, recent_messages, conversation_summary,
+                    user_activities, user_patterns, voice_analysis, user_id, session_id, workflow_mode, ticket, risk
+                ):
+                    if event == "done":
+                        data["processing_time"] = round(time.time() - start_time, 2)
+                        data["voice_aware"] = bool(voice_analysis)
+                        data["trace_id"] = tracer.current_trace_id()
+                        _record_turn("stream", "ok", time.time() - start_time)
+                        # The generator may resume in another context (e.g. the SSE response task): re-apply the decision
+                        with sampled_turn(1.0 if keep_logs else 0.0):
+                            _log_turn("stream", user_message, voice_analysis, {**data, "user_id": user_id})
+                    yield event, data
+    except Exception as e:
+        _record_turn("stream", _turn_outcome(e), time.time() - start_time)
+        _log_turn_failure("stream", user_id, e, time.time() - start_time)
+        raise
@@ -133,7 +133,7 @@ serve(async (req) => {
         .order('created_at', { ascending: false })
         .limit(1),
       
-      // Load user activities
+      // Load user activities (the workflow accumulates per-user game statistics from rows newer than it has seen)
       supabase
         .from('user_activities')
         .select('id, activity_type, score, accuracy_percentage, completed_at')